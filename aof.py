@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+
+from interfaces import ChangeListener, DataBaseAbstractClass
+from layer import Layer
+from snapshot import save_snapshot
+
+# кадр записи: длина тела, crc32 тела, тело; тело начинается с типа операции
+_FRAME = struct.Struct("<II")
+_LEN = struct.Struct("<I")
+_DEADLINE = struct.Struct("<d")
+OP_SET = b"S"
+OP_UNSET = b"U"
+# момент истечения ключа по часам time.time и снятие времени жизни
+OP_EXPIRE = b"E"
+OP_PERSIST = b"P"
+OP_BATCH = b"B"
+OP_CLEAR = b"C"
+# как часто фоновый поток передает накопленные записи в ОС, секунды
+WRITE_INTERVAL = 0.01
+
+
+def parse_fsync_policy(policy: str) -> int | None:
+    if policy == "always":
+        return 0
+    if policy == "never":
+        return None
+    ms = int(policy)
+    if ms <= 0:
+        raise ValueError("Интервал fsync должен быть положительным числом миллисекунд.")
+    return ms
+
+
+def encode_set(k: str, v: str) -> bytes:
+    kb = k.encode()
+    vb = v.encode()
+    return OP_SET + _LEN.pack(len(kb)) + kb + _LEN.pack(len(vb)) + vb
+
+
+def encode_unset(k: str) -> bytes:
+    kb = k.encode()
+    return OP_UNSET + _LEN.pack(len(kb)) + kb
+
+
+def encode_expire(k: str, deadline: float | None) -> bytes:
+    kb = k.encode()
+    if deadline is None:
+        return OP_PERSIST + _LEN.pack(len(kb)) + kb
+    return OP_EXPIRE + _LEN.pack(len(kb)) + kb + _DEADLINE.pack(deadline)
+
+
+def frame(body: bytes) -> bytes:
+    return _FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_ops(body: bytes) -> Iterator[tuple[bytes, str, str | float | None]]:
+    pos = 0
+    while pos < len(body):
+        op = body[pos:pos + 1]
+        pos += 1
+        if op == OP_BATCH or op == OP_CLEAR:
+            yield op, "", None
+            continue
+        (size,) = _LEN.unpack_from(body, pos)
+        pos += _LEN.size
+        k = body[pos:pos + size].decode()
+        pos += size
+        if op == OP_UNSET or op == OP_PERSIST:
+            yield op, k, None
+            continue
+        if op == OP_EXPIRE:
+            (deadline,) = _DEADLINE.unpack_from(body, pos)
+            pos += _DEADLINE.size
+            yield op, k, deadline
+            continue
+        if op != OP_SET:
+            raise ValueError(f"Неизвестная операция журнала: {op!r}")
+        (size,) = _LEN.unpack_from(body, pos)
+        pos += _LEN.size
+        yield op, k, body[pos:pos + size].decode()
+        pos += size
+
+
+def iter_log(path: str) -> Iterator[tuple[int, bytes]]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos + _FRAME.size <= len(mm):
+                size, crc = _FRAME.unpack_from(mm, pos)
+                start = pos + _FRAME.size
+                body = mm[start:start + size]
+                if len(body) != size or zlib.crc32(body) != crc:
+                    # оборванная при сбое последняя запись
+                    return
+                pos = start + size
+                yield pos, body
+
+
+def apply_record(body: bytes, database: DataBaseAbstractClass) -> None:
+    ops = decode_ops(body)
+    op, k, v = next(ops)
+    if op == OP_SET:
+        database.set(k, v)
+    elif op == OP_UNSET:
+        database.unset(k)
+    elif op == OP_EXPIRE or op == OP_PERSIST:
+        database.expire_at(k, v)
+    elif op == OP_CLEAR:
+        database.load(())
+    else:
+        layer = Layer()
+        # сроки в записи абсолютные, поэтому применяются после слоя напрямую
+        deadlines = []
+        for op, k, v in ops:
+            if op == OP_SET:
+                layer.set(k, v)
+            elif op == OP_UNSET:
+                layer.unset(k)
+            else:
+                deadlines.append((k, v))
+        database.apply(layer)
+        for k, deadline in deadlines:
+            database.expire_at(k, deadline)
+    return None
+
+
+def replay_log(path: str, database: DataBaseAbstractClass) -> int:
+    if not os.path.exists(path):
+        return 0
+    records = 0
+    good = 0
+    for good, body in iter_log(path):
+        apply_record(body, database)
+        records += 1
+    if good != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    return records
+
+
+class RecordListener(ChangeListener):
+    # превращает изменения базы в записи журнала; пачка изменений одного слоя - одна запись
+    def __init__(self):
+        self.__batch: list[bytes] | None = None
+
+    def on_set(self, k: str, v: str) -> None:
+        if self.__batch is not None:
+            self.__batch.append(encode_set(k, v))
+        else:
+            self.append(encode_set(k, v))
+        return None
+
+    def on_unset(self, k: str) -> None:
+        if self.__batch is not None:
+            self.__batch.append(encode_unset(k))
+        else:
+            self.append(encode_unset(k))
+        return None
+
+    def on_expire(self, k: str, deadline: float | None) -> None:
+        if self.__batch is not None:
+            self.__batch.append(encode_expire(k, deadline))
+        else:
+            self.append(encode_expire(k, deadline))
+        return None
+
+    def on_batch_start(self) -> None:
+        self.__batch = []
+        return None
+
+    def on_batch_end(self) -> None:
+        batch, self.__batch = self.__batch, None
+        if batch:
+            self.append(OP_BATCH + b"".join(batch))
+        return None
+
+    def append(self, body: bytes) -> None:
+        raise NotImplementedError
+
+
+class AppendOnlyLog(RecordListener):
+    def __init__(self, path: str, fsync: int | None = 1000):
+        super().__init__()
+        self.path = path
+        # 0 - fsync на каждую запись, None - без fsync, иначе интервал в миллисекундах
+        self.fsync = fsync
+        self.__file = open(path, "ab")
+        self.__cond = threading.Condition()
+        self.__io_lock = threading.Lock()
+        self.__buffer: list[bytes] = []
+        self.__appended = 0
+        self.__durable = 0
+        self.__last_sync = time.monotonic()
+        self.__unsynced = False
+        self.__closed = False
+        self.__writer = threading.Thread(target=self.__run, name="aof-writer", daemon=True)
+        self.__writer.start()
+
+    def on_load(self, database: DataBaseAbstractClass) -> None:
+        self.rewrite(database)
+        return None
+
+    def append(self, body: bytes) -> None:
+        data = frame(body)
+        with self.__cond:
+            self.__buffer.append(data)
+            self.__appended += 1
+            if self.fsync == 0:
+                # group commit: ждем, пока фоновый поток сбросит на диск пачку с нашей записью
+                seq = self.__appended
+                self.__cond.notify_all()
+                while self.__durable < seq and not self.__closed:
+                    self.__cond.wait()
+        return None
+
+    def rewrite(self, database: DataBaseAbstractClass) -> None:
+        tmp = f"{self.path}.tmp"
+        with self.__io_lock:
+            with self.__cond:
+                self.__buffer.clear()
+            with open(tmp, "wb", buffering=1 << 20) as f:
+                f.write(frame(OP_CLEAR))
+                for k, v in database.items():
+                    f.write(frame(encode_set(k, v)))
+                for k, deadline in database.expirations():
+                    f.write(frame(encode_expire(k, deadline)))
+                f.flush()
+                os.fsync(f.fileno())
+            self.__file.close()
+            os.replace(tmp, self.path)
+            self.__file = open(self.path, "ab")
+        return None
+
+    def compact(self, database: DataBaseAbstractClass, snapshot_path: str) -> None:
+        with self.__io_lock:
+            with self.__cond:
+                self.__buffer.clear()
+            save_snapshot(database.items(), snapshot_path, database.expirations())
+            self.__file.truncate(0)
+            self.__file.seek(0)
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+        return None
+
+    def close(self) -> None:
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+        self.__writer.join()
+        self.__file.close()
+        return None
+
+    def __run(self) -> None:
+        while True:
+            with self.__cond:
+                if not self.__buffer and not self.__closed:
+                    self.__cond.wait(None if self.fsync == 0 else WRITE_INTERVAL)
+            # буфер забирается под io_lock, чтобы compact/rewrite не пропустили его мимо файла
+            with self.__io_lock:
+                with self.__cond:
+                    chunk, self.__buffer = self.__buffer, []
+                    seq = self.__appended
+                    closing = self.__closed
+                if chunk:
+                    self.__file.write(b"".join(chunk))
+                    self.__file.flush()
+                    self.__unsynced = True
+                if self.__unsynced and self.__sync_due(closing):
+                    os.fsync(self.__file.fileno())
+                    self.__unsynced = False
+                    self.__last_sync = time.monotonic()
+            with self.__cond:
+                self.__durable = seq
+                self.__cond.notify_all()
+            if closing:
+                return
+
+    def __sync_due(self, closing: bool) -> bool:
+        if self.fsync is None:
+            return False
+        if self.fsync == 0 or closing:
+            return True
+        return (time.monotonic() - self.__last_sync) * 1000 >= self.fsync
@@ -1,12 +1,98 @@
+import argparse
+import os
+import sys
+from collections.abc import Iterator
+
 from database import RAMDatabase
+from interfaces import DataBaseAbstractClass
 from processor import CommandHandler
 from transaction_wrapper import WrappedDatabase
 
+# сколько результатов пакетный режим накапливает перед записью в stdout
+OUTPUT_BATCH = 10_000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="RAMdatabase - база данных в оперативной памяти.")
+    parser.add_argument("--server", action="store_true", help="запустить TCP-сервер вместо интерактивного режима")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес сервера (по умолчанию 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=6380, help="порт сервера (по умолчанию 6380)")
+    parser.add_argument("--snapshot", help="файл снимка: загружается при старте, используется SAVE/LOAD по умолчанию")
+    parser.add_argument("--aof", help="журнал изменений: проигрывается при старте и дополняется каждой фиксацией")
+    parser.add_argument(
+        "--replicas",
+        type=int,
+        default=0,
+        help="число процессов-реплик только для чтения на портах port+1..port+N (в режиме сервера)",
+    )
+    parser.add_argument(
+        "--mvcc",
+        action="store_true",
+        help="изоляция снимками: транзакция читает состояние на момент BEGIN, COMMIT проверяет конфликты записи",
+    )
+    parser.add_argument(
+        "--fsync",
+        default="1000",
+        help="политика fsync журнала: always, never или интервал в миллисекундах (по умолчанию 1000)",
+    )
+    parser.add_argument("--maxkeys", type=int, help="максимальное число ключей, лишние вытесняются политикой --eviction")
+    parser.add_argument(
+        "--maxmemory",
+        help="предел оценки занятой памяти в байтах (допускаются суффиксы kb, mb, gb)",
+    )
+    parser.add_argument(
+        "--eviction",
+        default="lru",
+        choices=["lru", "lfu", "random"],
+        help="политика вытеснения при достижении предела (по умолчанию lru)",
+    )
+    parser.add_argument(
+        "--ordered-index",
+        action="store_true",
+        help="поддерживать упорядоченный индекс ключей для SCAN/KEYS/RANGE",
+    )
+    parser.add_argument(
+        "--numeric-index",
+        action="store_true",
+        help="поддерживать отсортированный индекс числовых значений для COUNTRANGE/FINDRANGE",
+    )
+    parser.add_argument(
+        "--script",
+        metavar="PATH",
+        help="выполнить команды из файла (- для stdin) пакетами и выйти, результаты печатаются без приглашений",
+    )
+    parser.add_argument("--import", dest="import_path", metavar="PATH", help="загрузить пары ключ-значение из CSV/TSV при старте")
+    parser.add_argument(
+        "--import-format",
+        choices=["csv", "tsv"],
+        help="формат файла --import (по умолчанию по расширению: .tsv - TSV, иначе CSV)",
+    )
+    parser.add_argument(
+        "--tx-mode",
+        default="layers",
+        choices=["layers", "savepoint"],
+        help="движок транзакций: слои (по умолчанию) или журнал отката с точками сохранения",
+    )
+    parser.add_argument("--no-metrics", action="store_true", help="не замерять команды (INFO без статистики команд, SLOWLOG выключен)")
+    parser.add_argument(
+        "--slowlog-threshold",
+        type=int,
+        default=10_000,
+        help="порог журнала медленных команд в микросекундах, отрицательный выключает журнал (по умолчанию 10000)",
+    )
+    parser.add_argument("--slowlog-max-len", type=int, default=128, help="сколько медленных команд хранить (по умолчанию 128)")
+    parser.add_argument(
+        "--metrics-sample",
+        type=int,
+        default=16,
+        help="замерять время каждой N-й команды, 1 - каждой (по умолчанию 16); счетчики вызовов точные всегда",
+    )
+    return parser.parse_args(argv)
 
-def main():
-    database = RAMDatabase()
-    wrapped_database = WrappedDatabase(database)
-    processor = CommandHandler(wrapped_database)
+
+def repl(database: DataBaseAbstractClass, transactions=WrappedDatabase, **handler_options):
+    wrapped_database = transactions(database)
+    processor = CommandHandler(wrapped_database, **handler_options)
 
     print("Добро пожаловать. Введите HELP для справки.")
     while True:
@@ -16,17 +102,126 @@ def main():
             print("EOF. Работа завершена, бд очищена.")
             break
         user_input_split = user_input.split()
+        if not user_input_split:
+            continue
         command = user_input_split[0]
         args = user_input_split[1:]
-        result = processor.execute(command, args)
+        result = processor.execute_stream(command, args)
 
         if result == "END":
             print("Работа завершена, бд очищена.")
             break
 
-        if result != None:
+        if isinstance(result, Iterator):
+            # длинный FIND печатается кусками по мере обхода ключей
+            for chunk in result:
+                sys.stdout.write(chunk)
+            sys.stdout.write("\n")
+        elif result != None:
             print(result)
 
 
+def run_script(path: str, database: DataBaseAbstractClass, transactions=WrappedDatabase, **handler_options):
+    from bulk import read_commands
+
+    processor = CommandHandler(transactions(database), **handler_options)
+    try:
+        stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    except OSError as e:
+        raise SystemExit(f"Не удалось открыть {path}: {e}")
+    # результаты копятся и пишутся в stdout пачками, END завершает выполнение
+    output = []
+    try:
+        for result in processor.execute_batch(read_commands(stream)):
+            if result is None or result == "END":
+                continue
+            output.append(result if isinstance(result, str) else str(result))
+            if len(output) >= OUTPUT_BATCH:
+                output.append("")
+                sys.stdout.write("\n".join(output))
+                output.clear()
+    finally:
+        if output:
+            output.append("")
+            sys.stdout.write("\n".join(output))
+        sys.stdout.flush()
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    maxmemory = None
+    if args.maxmemory:
+        from eviction import parse_size
+
+        maxmemory = parse_size(args.maxmemory)
+    database = RAMDatabase(
+        maxkeys=args.maxkeys,
+        maxmemory=maxmemory,
+        eviction=args.eviction,
+        ordered_index=args.ordered_index,
+        numeric_index=args.numeric_index,
+    )
+    if args.snapshot and os.path.exists(args.snapshot):
+        from snapshot import load_snapshot
+
+        load_snapshot(database, args.snapshot)
+    log = None
+    if args.aof:
+        from aof import AppendOnlyLog, parse_fsync_policy, replay_log
+
+        replay_log(args.aof, database)
+        log = AppendOnlyLog(args.aof, parse_fsync_policy(args.fsync))
+        database.add_listener(log)
+    session = None
+    if args.mvcc:
+        from mvcc import VersionedStore
+
+        session = VersionedStore(database).session
+    metrics = None
+    if not args.no_metrics:
+        from metrics import Metrics
+
+        metrics = Metrics(args.slowlog_threshold, args.slowlog_max_len, args.metrics_sample)
+    replicas = None
+    try:
+        if args.import_path:
+            from bulk import import_file
+
+            try:
+                imported = import_file(database, args.import_path, args.import_format)
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                raise SystemExit(f"Не удалось загрузить {args.import_path}: {e}")
+            print(f"Загружено строк: {imported}.", file=sys.stderr)
+        if args.server and args.replicas > 0:
+            from replication import ReplicaSet
+
+            replicas = ReplicaSet(database, args.replicas)
+            ports = replicas.start(args.host, args.port + 1)
+            print(f"Реплики только для чтения: {', '.join(map(str, ports))}")
+            if metrics is not None:
+                metrics.add_section("replication", replicas.info)
+        transactions = WrappedDatabase
+        if args.tx_mode == "savepoint":
+            from savepoint import SavepointDatabase
+
+            transactions = SavepointDatabase
+        options = {"transactions": transactions, "snapshot_path": args.snapshot, "log": log, "metrics": metrics}
+        if args.server:
+            from server import run_server
+
+            run_server(database, args.host, args.port, session, **options)
+        elif args.script:
+            run_script(args.script, session() if session else database, **options)
+        else:
+            repl(session() if session else database, **options)
+    finally:
+        if replicas is not None:
+            replicas.close()
+        if log is not None:
+            log.close()
+
+
 if __name__ == "__main__":
     main()
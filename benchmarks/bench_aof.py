@@ -0,0 +1,50 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from aof import AppendOnlyLog, parse_fsync_policy
+from database import RAMDatabase
+
+
+def run_sets(db: RAMDatabase, ops: int, threads: int) -> float:
+    def worker(t: int) -> None:
+        for i in range(ops // threads):
+            db.set(f"key{t}:{i}", str(i))
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость журнала изменений при разных политиках fsync")
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--always-ops", type=int, default=2_000, help="операций для политики always")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    print(f"{'политика':>10} {'потоки':>7} {'мкс/оп':>9} {'оп/с':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for policy in ["off", "never", "1000", "10", "always"]:
+            for threads in args.threads:
+                ops = args.always_ops if policy == "always" else args.ops
+                db = RAMDatabase()
+                log = None
+                if policy != "off":
+                    path = os.path.join(tmp, f"{policy}-{threads}.aof")
+                    log = AppendOnlyLog(path, parse_fsync_policy(policy))
+                    db.add_listener(log)
+                elapsed = run_sets(db, ops, threads)
+                if log is not None:
+                    log.close()
+                print(f"{policy:>10} {threads:>7} {elapsed / ops * 1e6:>9.2f} {ops / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+from database import RAMDatabase
+
+
+def fill(db: RAMDatabase, n: int, distinct_values: int) -> None:
+    for i in range(n):
+        db.set(f"key{i}", f"v{i % distinct_values}")
+
+
+def measure(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Латентность COUNTS/FIND в зависимости от размера базы")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--distinct", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'N':>10} {'COUNTS, мкс':>14} {'FIND, мкс':>14} {'FIND rare, мкс':>16}")
+    for n in args.sizes:
+        db = RAMDatabase()
+        fill(db, n, args.distinct)
+        db.set("rare", "unique-value")
+        counts_us = measure(lambda: db.counts("v1"), args.repeat)
+        find_us = measure(lambda: db.find("v1"), args.repeat)
+        rare_us = measure(lambda: db.find("unique-value"), args.repeat)
+        print(f"{n:>10} {counts_us:>14.2f} {find_us:>14.2f} {rare_us:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import random
+import time
+
+from database import RAMDatabase
+
+
+def run(policy: str | None, ops: int, keys: int, maxkeys: int, skew: float) -> tuple[float, float, int]:
+    db = RAMDatabase() if policy is None else RAMDatabase(maxkeys=maxkeys, eviction=policy)
+    rnd = random.Random(1)
+    # обращения с перекосом: небольшая часть ключей получает большую часть запросов
+    plan = [f"key{int(keys * rnd.random() ** skew)}" for _ in range(ops)]
+    hits = 0
+    start = time.perf_counter()
+    for k in plan:
+        if db.lookup(k) is None:
+            db.set(k, "v")
+        else:
+            hits += 1
+    elapsed = time.perf_counter() - start
+    evicted = db.eviction_stats()["evicted_keys"]
+    return ops / elapsed, hits / ops, evicted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость учета обращений и доля попаданий при вытеснении")
+    parser.add_argument("--ops", type=int, default=500_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--maxkeys", type=int, default=10_000)
+    parser.add_argument("--skew", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'политика':>9} {'оп/с':>10} {'попадания':>10} {'вытеснено':>10}")
+    for policy in [None, "lru", "lfu", "random"]:
+        rate, hit_rate, evicted = run(policy, args.ops, args.keys, args.maxkeys, args.skew)
+        print(f"{policy or 'без лимита':>9} {rate:>10.0f} {hit_rate:>10.1%} {evicted:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import time
+import tracemalloc
+
+from database import RAMDatabase
+from processor import CommandHandler
+from transaction_wrapper import WrappedDatabase
+
+
+def build(keys: int) -> CommandHandler:
+    db = RAMDatabase()
+    for i in range(keys):
+        db.set(f"user:{i:08d}", "popular")
+    return CommandHandler(WrappedDatabase(db))
+
+
+def measure(fn) -> tuple[float, float, int]:
+    # время всего ответа, время до первого куска и пик памяти под tracemalloc
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, (first if first is not None else start) - start, peak
+
+
+def whole(handler: CommandHandler):
+    handler.execute("FIND", ["popular"])
+    return None
+
+
+def streamed(handler: CommandHandler):
+    first = None
+    for _ in handler.execute_stream("FIND", ["popular"]):
+        if first is None:
+            first = time.perf_counter()
+    return first
+
+
+def paged(handler: CommandHandler):
+    handler.execute("FIND", ["popular", "LIMIT", "100"])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FIND по популярному значению: целиком, потоком и страницей")
+    parser.add_argument("--keys", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'N':>10} {'режим':>14} {'время, мс':>10} {'первый кусок, мс':>17} {'пик памяти, КБ':>15}")
+    for n in args.keys:
+        handler = build(n)
+        for name, fn in [("целиком", whole), ("поток", streamed), ("LIMIT 100", paged)]:
+            elapsed, first, peak = measure(lambda: fn(handler))
+            first_ms = f"{first * 1e3:.2f}" if fn is streamed else "-"
+            print(f"{n:>10} {name:>14} {elapsed * 1e3:>10.1f} {first_ms:>17} {peak / 1024:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
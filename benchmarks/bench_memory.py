@@ -0,0 +1,41 @@
+import argparse
+import gc
+import time
+import tracemalloc
+
+from compact import CompactDatabase
+from database import RAMDatabase
+
+
+def measure(factory, keys: int, values: int) -> tuple[float, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    db = factory()
+    for i in range(keys):
+        # значения создаются заново, как после разбора команды
+        db.set(f"key{i}", f"value{i % values}")
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del db
+    return size / keys, keys / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на ключ: RAMDatabase против CompactDatabase")
+    parser.add_argument("--keys", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--values", type=int, nargs="+", default=[10, 1000, 0], help="число различных значений, 0 - все разные")
+    args = parser.parse_args()
+
+    print(f"{'ключи':>9} {'значения':>9} {'RAM, байт/ключ':>15} {'compact, байт/ключ':>19} {'RAM SET/с':>10} {'compact SET/с':>14}")
+    for keys in args.keys:
+        for values in args.values:
+            values = values or keys
+            ram, ram_rate = measure(RAMDatabase, keys, values)
+            compact, compact_rate = measure(CompactDatabase, keys, values)
+            print(f"{keys:>9} {values:>9} {ram:>15.1f} {compact:>19.1f} {ram_rate:>10.0f} {compact_rate:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import time
+
+from benchmarks.bench_pipeline import generate
+from database import RAMDatabase
+from metrics import Metrics
+from processor import CommandHandler
+from server import Server, read_reply
+from transaction_wrapper import WrappedDatabase
+
+
+def handler(metrics: Metrics | None) -> CommandHandler:
+    return CommandHandler(WrappedDatabase(RAMDatabase()), metrics=metrics)
+
+
+def run_execute(lines: list[list[str]], metrics: Metrics | None) -> float:
+    h = handler(metrics)
+    start = time.perf_counter()
+    for parts in lines:
+        h.execute(parts[0], parts[1:])
+    return len(lines) / (time.perf_counter() - start)
+
+
+def run_batch(lines: list[list[str]], metrics: Metrics | None) -> float:
+    h = handler(metrics)
+    start = time.perf_counter()
+    for _ in h.execute_batch(lines):
+        pass
+    return len(lines) / (time.perf_counter() - start)
+
+
+def run_server(lines: list[list[str]], metrics: Metrics | None) -> float:
+    requests = [(" ".join(parts) + "\n").encode() for parts in lines]
+
+    async def main() -> float:
+        server = Server(RAMDatabase(), metrics=metrics)
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        start = time.perf_counter()
+        # одна команда на запрос: путь как у обычного клиента без конвейера
+        for request in requests:
+            writer.write(request)
+            await read_reply(reader)
+        elapsed = time.perf_counter() - start
+        writer.close()
+        await writer.wait_closed()
+        listener.close()
+        await listener.wait_closed()
+        return len(lines) / elapsed
+
+    return asyncio.run(main())
+
+
+def compare(run, lines: list[list[str]], repeat: int, sample: int) -> tuple[float, float]:
+    # режимы чередуются, чтобы дрейф скорости машины делился поровну; берется лучший прогон
+    plain, measured = 0.0, 0.0
+    for _ in range(repeat):
+        plain = max(plain, run(lines, None))
+        measured = max(measured, run(lines, Metrics(sample=sample)))
+    return plain, measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость замеров команд: с метриками и без")
+    parser.add_argument("--commands", type=int, default=300_000)
+    parser.add_argument("--server-commands", type=int, default=20_000)
+    parser.add_argument("--write-ratio", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--samples", type=int, nargs="+", default=[16, 1], help="периоды замеров для сравнения")
+    args = parser.parse_args()
+
+    print(f"{'путь':>14} {'период':>7} {'без метрик, ком/с':>18} {'с метриками, ком/с':>19} {'накладные':>10}")
+    for name, run, count in [
+        ("execute", run_execute, args.commands),
+        ("execute_batch", run_batch, args.commands),
+        ("сервер", run_server, args.server_commands),
+    ]:
+        lines = [line.split() for line in generate(count, 10_000, args.write_ratio)]
+        for sample in args.samples:
+            plain, measured = compare(run, lines, args.repeat, sample)
+            print(f"{name:>14} {sample:>7} {plain:>18.0f} {measured:>19.0f} {1 - measured / plain:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
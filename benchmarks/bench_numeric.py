@@ -0,0 +1,45 @@
+import argparse
+import random
+import time
+
+from database import RAMDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="COUNTRANGE/FINDRANGE: числовой индекс против обхода базы")
+    parser.add_argument("--keys", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--scan-queries", type=int, default=3, help="запросов для варианта без индекса")
+    args = parser.parse_args()
+
+    print(f"{'ключи':>10} {'индекс':>7} {'загрузка, с':>12} {'SET, мкс':>9} {'COUNTRANGE, мкс':>16} {'FINDRANGE 0.1%, мкс':>20}")
+    for keys in args.keys:
+        for numeric_index in (True, False):
+            rnd = random.Random(1)
+            db = RAMDatabase(numeric_index=numeric_index)
+            start = time.perf_counter()
+            db.load((f"key{i}", str(rnd.randrange(1_000_000))) for i in range(keys))
+            loaded = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(10_000):
+                db.set(f"key{i}", str(rnd.randrange(1_000_000)))
+            write = (time.perf_counter() - start) / 10_000 * 1e6
+
+            count = args.queries if numeric_index else args.scan_queries
+            start = time.perf_counter()
+            for _ in range(count):
+                lo = rnd.randrange(1_000_000)
+                db.count_range(lo, lo + rnd.randrange(500_000))
+            counts = (time.perf_counter() - start) / count * 1e6
+            start = time.perf_counter()
+            for _ in range(count):
+                lo = rnd.randrange(1_000_000)
+                db.find_range(lo, lo + 1000)
+            finds = (time.perf_counter() - start) / count * 1e6
+            print(f"{keys:>10} {'да' if numeric_index else 'нет':>7} {loaded:>12.2f} {write:>9.2f} {counts:>16.1f} {finds:>20.1f}")
+            del db
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import random
+import time
+
+from database import RAMDatabase
+from processor import CommandHandler
+from transaction_wrapper import WrappedDatabase
+
+
+def generate(n: int, keys: int, write_ratio: float, seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    lines = []
+    for _ in range(n):
+        k = f"key{rnd.randrange(keys)}"
+        r = rnd.random()
+        if r < write_ratio * 0.9:
+            lines.append(f"SET {k} v{rnd.randrange(100)}")
+        elif r < write_ratio:
+            lines.append(f"UNSET {k}")
+        elif r < write_ratio + (1 - write_ratio) * 0.8:
+            lines.append(f"GET {k}")
+        else:
+            lines.append(f"COUNTS v{rnd.randrange(100)}")
+    return lines
+
+
+def run_loop(lines: list[str]) -> float:
+    handler = CommandHandler(WrappedDatabase(RAMDatabase()))
+    start = time.perf_counter()
+    for line in lines:
+        parts = line.split()
+        handler.execute(parts[0], parts[1:])
+    return time.perf_counter() - start
+
+
+def run_batch(lines: list[str]) -> float:
+    handler = CommandHandler(WrappedDatabase(RAMDatabase()))
+    start = time.perf_counter()
+    for _ in handler.execute_batch(lines):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность execute и execute_batch")
+    parser.add_argument("--commands", type=int, default=1_000_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--write-ratios", type=float, nargs="+", default=[1.0, 0.9, 0.5, 0.1])
+    args = parser.parse_args()
+
+    print(f"{'доля записей':>14} {'execute, ком/с':>16} {'execute_batch, ком/с':>22} {'ускорение':>10}")
+    for ratio in args.write_ratios:
+        lines = generate(args.commands, args.keys, ratio)
+        loop = args.commands / run_loop(lines)
+        batch = args.commands / run_batch(lines)
+        print(f"{ratio:>14.2f} {loop:>16.0f} {batch:>22.0f} {batch / loop:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import random
+import time
+
+from database import RAMDatabase
+from processor import CommandHandler
+from transaction_wrapper import WrappedDatabase
+
+
+def build(keys: int, ordered_index: bool) -> tuple[CommandHandler, float]:
+    db = RAMDatabase(ordered_index=ordered_index)
+    start = time.perf_counter()
+    db.load((f"user:{i // 10}:f{i % 10}", "v") for i in range(keys))
+    return CommandHandler(WrappedDatabase(db)), time.perf_counter() - start
+
+
+def query(handler: CommandHandler, commands: list[str]) -> float:
+    start = time.perf_counter()
+    for command in commands:
+        parts = command.split()
+        handler.execute(parts[0], parts[1:])
+    return (time.perf_counter() - start) / len(commands) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Префиксные запросы: упорядоченный индекс против полного обхода")
+    parser.add_argument("--keys", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=3, help="запросов для варианта без индекса")
+    args = parser.parse_args()
+
+    print(f"{'ключи':>10} {'индекс':>7} {'загрузка, с':>12} {'KEYS prefix, мс':>16} {'SCAN COUNT 100, мс':>19}")
+    for keys in args.keys:
+        rnd = random.Random(1)
+        users = keys // 10
+        for ordered_index in (True, False):
+            handler, loaded = build(keys, ordered_index)
+            count = args.queries if ordered_index else args.scan_queries
+            prefixes = [f"KEYS user:{rnd.randrange(users)}:" for _ in range(count)]
+            scans = [f"SCAN 0 MATCH user:{rnd.randrange(users)} COUNT 100" for _ in range(count)]
+            print(
+                f"{keys:>10} {'да' if ordered_index else 'нет':>7} {loaded:>12.2f}"
+                f" {query(handler, prefixes):>16.3f} {query(handler, scans):>19.3f}"
+            )
+            del handler
+
+
+if __name__ == "__main__":
+    main()
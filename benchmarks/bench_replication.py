@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+
+from database import RAMDatabase
+from replication import ReplicaSet
+from server import read_reply
+
+
+async def _client(port: int, ops: int, keys: int, pipeline: int) -> None:
+    rnd = random.Random(port)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(ops // pipeline):
+        writer.write("".join(f"GET key{rnd.randrange(keys)}\n" for _ in range(pipeline)).encode())
+        for _ in range(pipeline):
+            await read_reply(reader)
+    writer.close()
+
+
+def client_process(port: int, ops: int, keys: int, pipeline: int, start, done) -> None:
+    start.wait()
+    asyncio.run(_client(port, ops, keys, pipeline))
+    done.put(ops // pipeline * pipeline)
+
+
+def measure_reads(ports: list[int], clients_per_replica: int, ops: int, keys: int, pipeline: int) -> float:
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    done = ctx.Queue()
+    procs = [
+        ctx.Process(target=client_process, args=(port, ops, keys, pipeline, start, done))
+        for port in ports
+        for _ in range(clients_per_replica)
+    ]
+    for p in procs:
+        p.start()
+    time.sleep(1.0)
+    t0 = time.perf_counter()
+    start.set()
+    total = sum(done.get() for _ in procs)
+    elapsed = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+    return total / elapsed
+
+
+def measure_lag(replicas: ReplicaSet, database: RAMDatabase, writes: int) -> tuple[int, float]:
+    worst = 0
+    start = time.perf_counter()
+    for i in range(writes):
+        database.set(f"hot{i % 1000}", str(i))
+        if i % 500 == 0:
+            worst = max(worst, max(replicas.lag()))
+    replicas.wait_caught_up()
+    return worst, writes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Чтение с реплик в зависимости от числа процессов-реплик")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=100_000, help="чтений на клиента")
+    parser.add_argument("--clients", type=int, default=1, help="клиентских процессов на реплику")
+    parser.add_argument("--pipeline", type=int, default=100)
+    parser.add_argument("--writes", type=int, default=50_000, help="записей для замера отставания")
+    args = parser.parse_args()
+
+    print(f"{'реплики':>8} {'чтений/с':>10} {'записей/с':>10} {'макс. отставание, записей':>26}")
+    for workers in args.workers:
+        database = RAMDatabase()
+        for i in range(args.keys):
+            database.set(f"key{i}", str(i))
+        replicas = ReplicaSet(database, workers)
+        try:
+            ports = replicas.start()
+            replicas.wait_caught_up()
+            reads = measure_reads(ports, args.clients, args.ops, args.keys, args.pipeline)
+            lag, writes = measure_lag(replicas, database, args.writes)
+        finally:
+            replicas.close()
+        print(f"{workers:>8} {reads:>10.0f} {writes:>10.0f} {lag:>26}")
+
+
+if __name__ == "__main__":
+    main()
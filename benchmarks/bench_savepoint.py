@@ -0,0 +1,87 @@
+import argparse
+import time
+
+from database import RAMDatabase
+from savepoint import SavepointDatabase
+from transaction_wrapper import WrappedDatabase
+
+ENGINES = {"слои": WrappedDatabase, "журнал": SavepointDatabase}
+
+
+def build(engine, keys: int):
+    db = RAMDatabase()
+    for i in range(keys):
+        db.set(f"key{i}", f"v{i % 1000}")
+    return engine(db)
+
+
+def nested_commit(engine, keys: int, depth: int, writes: int) -> tuple[float, float]:
+    # depth вложенных транзакций по writes записей, затем COMMIT всех уровней изнутри наружу
+    database = build(engine, keys)
+    start = time.perf_counter()
+    for level in range(depth):
+        database.begin()
+        for i in range(writes):
+            database.set(f"L{level}:{i}", "x")
+    written = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(depth):
+        database.commit()
+    return written, time.perf_counter() - start
+
+
+def nested_rollback(engine, keys: int, depth: int, writes: int) -> float:
+    # внутренний уровень перезаписывает ключи внешних и откатывается
+    database = build(engine, keys)
+    for level in range(depth - 1):
+        database.begin()
+        for i in range(writes):
+            database.set(f"key{i}", str(level))
+    database.begin()
+    for i in range(writes):
+        database.set(f"key{i}", "top")
+    start = time.perf_counter()
+    database.rollback()
+    elapsed = time.perf_counter() - start
+    while database.depth:
+        database.rollback()
+    return elapsed
+
+
+def deep_get(engine, keys: int, depth: int, writes: int, repeat: int) -> float:
+    database = build(engine, keys)
+    for level in range(depth):
+        database.begin()
+        for i in range(writes):
+            database.set(f"L{level}:{i}", "x")
+    names = [f"L0:{i % writes}" for i in range(repeat)] + [f"key{i % keys}" for i in range(repeat)]
+    start = time.perf_counter()
+    for k in names:
+        database.get(k)
+    return (time.perf_counter() - start) / len(names) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Транзакции на слоях и на журнале отката")
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--writes", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{args.writes} записей на уровень, база {args.keys} ключей; время в мс, GET в нс")
+    header = f"{'движок':>8} {'глубина':>8} {'записи':>10} {'COMMIT всех':>12} {'ROLLBACK':>10} {'GET':>8}"
+    print(header)
+    for depth in args.depths:
+        for name, engine in ENGINES.items():
+            written, committed = nested_commit(engine, args.keys, depth, args.writes)
+            rolled_back = nested_rollback(engine, args.keys, depth, args.writes)
+            get_ns = deep_get(engine, args.keys, depth, args.writes, args.repeat)
+            print(
+                f"{name:>8} {depth:>8} {written * 1e3:>10.1f} {committed * 1e3:>12.1f}"
+                f" {rolled_back * 1e3:>10.1f} {get_ns:>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
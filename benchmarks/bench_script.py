@@ -0,0 +1,60 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import generate
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def timed(args: list[str], stdin_path: str | None = None) -> float:
+    # время работы отдельного процесса app.py, вывод отбрасывается
+    stdin = open(stdin_path, "rb") if stdin_path else subprocess.DEVNULL
+    start = time.perf_counter()
+    try:
+        command = [sys.executable, APP, "--no-metrics", *args]
+        subprocess.run(command, stdin=stdin, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    finally:
+        if stdin_path:
+            stdin.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Интерактивный режим, --script и --import на одном файле")
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--write-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        commands = os.path.join(tmp, "commands.txt")
+        sets = os.path.join(tmp, "sets.txt")
+        dump = os.path.join(tmp, "dump.csv")
+        with open(commands, "w") as f:
+            f.write("\n".join(generate(args.lines, args.keys, args.write_ratio)) + "\n")
+        with open(sets, "w") as f, open(dump, "w") as g:
+            for i in range(args.lines):
+                f.write(f"SET key{i} v{i % 100}\n")
+                g.write(f"key{i},v{i % 100}\n")
+        empty = os.path.join(tmp, "empty.txt")
+        open(empty, "w").close()
+
+        print(f"{args.lines} строк, время в секундах вместе с запуском процесса")
+        print(f"{'нагрузка':>22} {'режим':>10} {'время':>8} {'строк/с':>10}")
+        rows = [
+            ("смешанные команды", "stdin", timed([], commands)),
+            ("смешанные команды", "--script", timed(["--script", commands])),
+            ("SET всех ключей", "stdin", timed([], sets)),
+            ("SET всех ключей", "--script", timed(["--script", sets])),
+            ("CSV-дамп", "--import", timed(["--import", dump, "--script", empty])),
+        ]
+        for workload, mode, elapsed in rows:
+            print(f"{workload:>22} {mode:>10} {elapsed:>8.2f} {args.lines / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
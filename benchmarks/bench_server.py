@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from server import read_reply
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for_server(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def client(port: int, ops: int, keys: int, pipeline: int, latencies: list[float], seed: int) -> None:
+    rnd = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(ops // pipeline):
+        batch = []
+        for _ in range(pipeline):
+            k = rnd.randrange(keys)
+            if rnd.random() < 0.2:
+                batch.append(f"SET key{k} v{k % 100}\n")
+            else:
+                batch.append(f"GET key{k}\n")
+        start = time.perf_counter()
+        writer.write("".join(batch).encode())
+        for _ in range(pipeline):
+            await read_reply(reader)
+        latencies.append((time.perf_counter() - start) / pipeline)
+    writer.close()
+
+
+async def run_level(port: int, clients: int, ops: int, keys: int, pipeline: int) -> tuple[float, float, float]:
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, ops, keys, pipeline, latencies, i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return p50 * 1e6, p99 * 1e6, clients * (ops // pipeline * pipeline) / elapsed
+
+
+async def main_async(args) -> None:
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, str(ROOT / "app.py"), "--server", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        await wait_for_server(port)
+        print(f"{'клиенты':>8} {'конвейер':>9} {'p50, мкс':>10} {'p99, мкс':>10} {'оп/с':>10}")
+        for clients in args.clients:
+            p50, p99, ops = await run_level(port, clients, args.ops, args.keys, args.pipeline)
+            print(f"{clients:>8} {args.pipeline:>9} {p50:>10.1f} {p99:>10.1f} {ops:>10.0f}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест TCP-сервера")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--ops", type=int, default=5_000, help="операций на клиента")
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--pipeline", type=int, default=1, help="команд в одном пакете")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
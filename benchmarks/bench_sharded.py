@@ -0,0 +1,67 @@
+import argparse
+import random
+import sys
+import threading
+import time
+
+from database import RAMDatabase
+from sharded import ShardedDatabase
+
+
+class GlobalLockDatabase:
+    def __init__(self):
+        self.database = RAMDatabase()
+        self.lock = threading.Lock()
+
+    def set(self, k: str, v: str) -> None:
+        with self.lock:
+            self.database.set(k, v)
+
+    def get(self, k: str) -> str:
+        with self.lock:
+            return self.database.get(k)
+
+
+def run(db, threads: int, ops: int, keys: int, write_ratio: float) -> float:
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(seed: int) -> None:
+        rnd = random.Random(seed)
+        plan = [(rnd.random() < write_ratio, f"key{rnd.randrange(keys)}") for _ in range(ops // threads)]
+        barrier.wait()
+        for write, k in plan:
+            if write:
+                db.set(k, "v")
+            else:
+                db.get(k)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    return ops / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование по числу потоков: шарды против глобальной блокировки")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=400_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--shards", type=int, default=64)
+    parser.add_argument("--write-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'включен' if gil else 'выключен (free-threaded)'}")
+    print(f"{'потоки':>7} {'глобальная блокировка, оп/с':>28} {'шарды, оп/с':>13}")
+    for threads in args.threads:
+        single = run(GlobalLockDatabase(), threads, args.ops, args.keys, args.write_ratio)
+        sharded = run(ShardedDatabase(args.shards), threads, args.ops, args.keys, args.write_ratio)
+        print(f"{threads:>7} {single:>28.0f} {sharded:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
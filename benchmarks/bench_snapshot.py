@@ -0,0 +1,42 @@
+import argparse
+import os
+import tempfile
+import time
+
+from database import RAMDatabase
+from snapshot import iter_snapshot, save_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время сохранения и загрузки снимка")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--distinct", type=int, default=1_000)
+    args = parser.parse_args()
+
+    print(f"{'N':>10} {'размер, МБ':>11} {'SAVE, с':>9} {'LOAD, с':>9} {'SET-цикл, с':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dump.rdb")
+        for n in args.sizes:
+            source = RAMDatabase()
+            start = time.perf_counter()
+            for i in range(n):
+                source.set(f"key{i}", f"v{i % args.distinct}")
+            set_loop = time.perf_counter() - start
+
+            start = time.perf_counter()
+            save_snapshot(source.items(), path)
+            save = time.perf_counter() - start
+            del source
+
+            target = RAMDatabase()
+            start = time.perf_counter()
+            target.load(iter_snapshot(path))
+            load = time.perf_counter() - start
+            assert target.counts("v0") == len(range(0, n, args.distinct))
+
+            size_mb = os.path.getsize(path) / 2**20
+            print(f"{n:>10} {size_mb:>11.1f} {save:>9.2f} {load:>9.2f} {set_loop:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
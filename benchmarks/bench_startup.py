@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from database import RAMDatabase
+from processor import CommandHandler
+from transaction_wrapper import WrappedDatabase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+# модули точки входа, время импорта которых попадает в отчет
+MODULES = ["app", "processor", "database"]
+
+
+def environment() -> dict[str, str]:
+    # замер с кешем байткода, как у установленного приложения
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def import_times(runs: int) -> dict[str, float]:
+    # медиана суммарного времени импорта модулей по python -X importtime, мс
+    env = environment()
+    samples: dict[str, list[float]] = {name: [] for name in MODULES}
+    subprocess.run([sys.executable, "-c", "import app"], cwd=ROOT, env=env, check=True)
+    for _ in range(runs):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app"],
+            cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+        ).stderr
+        # строки вида "import time:  self | cumulative | name", имя с отступом по вложенности
+        for line in stderr.splitlines():
+            _, cumulative, name = line.split(":", 1)[1].split("|")
+            name = name.strip()
+            if name in samples:
+                samples[name].append(int(cumulative) / 1e3)
+    return {f"import_{name}_ms": statistics.median(times) for name, times in samples.items() if times}
+
+
+def startup_time(runs: int) -> float:
+    # медиана полного запуска app.py --script на пустом файле, мс
+    env = environment()
+    with tempfile.NamedTemporaryFile(suffix=".txt") as script:
+        command = [sys.executable, APP, "--script", script.name]
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+            times.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(times)
+
+
+def dispatch_times(number: int, repeat: int) -> dict[str, float]:
+    # нс на команду, лучший из repeat прогонов: разбор имени и вызов обработчика без метрик,
+    # пакетный режим и создание обработчика соединения
+    db = RAMDatabase()
+    db.set("k", "v")
+    database = WrappedDatabase(db)
+    handler = CommandHandler(database)
+    args = ["k"]
+    lines = [["GET", "k"]] * number
+
+    def batch():
+        for _ in handler.execute_batch(lines):
+            pass
+
+    cases = {
+        "dispatch_GET_ns": lambda: handler.execute("GET", args),
+        "dispatch_get_ns": lambda: handler.execute("get", args),
+        "dispatch_unknown_ns": lambda: handler.execute("NOPE", args),
+        "handler_init_ns": lambda: CommandHandler(database),
+    }
+    results = {
+        name: min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e9 for name, fn in cases.items()
+    }
+    results["batch_GET_ns"] = min(timeit.repeat(batch, number=1, repeat=repeat)) / number * 1e9
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Время запуска (-X importtime) и разбора команд с JSON-отчетом")
+    parser.add_argument("--runs", type=int, default=20, help="запусков процесса, берется медиана")
+    parser.add_argument("--number", type=int, default=200_000, help="вызовов в одном прогоне разбора команд")
+    parser.add_argument("--repeat", type=int, default=10, help="прогонов разбора команд, берется лучший")
+    parser.add_argument("--output", help="записать результаты в JSON-файл")
+    parser.add_argument("--baseline", help="JSON-файл прошлых результатов для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="допустимый рост времени (доля)")
+    args = parser.parse_args(argv)
+
+    results = {**import_times(args.runs), "startup_ms": startup_time(args.runs), **dispatch_times(args.number, args.repeat)}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    print(f"{'замер':<20} {'значение':>10} {'к базовой':>10}")
+    regressions = []
+    for name, value in results.items():
+        ratio = ""
+        if baseline is not None and name in baseline:
+            ratio = f"{value / baseline[name]:.2f}x"
+            if value > baseline[name] * (1 + args.tolerance):
+                regressions.append(f"{name}: {baseline[name]:.1f} -> {value:.1f}")
+        print(f"{name:<20} {value:>10.1f} {ratio:>10}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2, ensure_ascii=False)
+    if baseline is not None:
+        if regressions:
+            print("Регрессии относительно базовой линии:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("Регрессий относительно базовой линии нет.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
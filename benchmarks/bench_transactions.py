@@ -0,0 +1,93 @@
+import argparse
+import time
+
+from database import RAMDatabase
+from transaction_wrapper import WrappedDatabase
+
+
+def build(n: int, distinct_values: int) -> WrappedDatabase:
+    db = RAMDatabase()
+    for i in range(n):
+        db.set(f"key{i}", f"v{i % distinct_values}")
+    return WrappedDatabase(db)
+
+
+def measure(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench_counts_find(sizes: list[int], distinct: int, repeat: int) -> None:
+    print("COUNTS/FIND внутри транзакции (BEGIN + 100 записей)")
+    print(f"{'N':>10} {'COUNTS, мкс':>14} {'FIND rare, мкс':>16}")
+    for n in sizes:
+        wrapped = build(n, distinct)
+        wrapped.set("rare", "unique-value")
+        wrapped.begin()
+        for i in range(100):
+            wrapped.set(f"key{i}", "v1")
+        counts_us = measure(lambda: wrapped.counts("v1"), repeat)
+        rare_us = measure(lambda: wrapped.find("unique-value"), repeat)
+        print(f"{n:>10} {counts_us:>14.2f} {rare_us:>16.2f}")
+
+
+def bench_deep_get(levels: int, writes: int, repeat: int) -> None:
+    print(f"GET через {levels} уровней вложенности по {writes} записей")
+    wrapped = build(writes, 1_000)
+    for level in range(levels):
+        wrapped.begin()
+        for i in range(writes):
+            wrapped.set(f"L{level}:{i}", str(i))
+    hit_top_us = measure(lambda: wrapped.get(f"L{levels - 1}:7"), repeat)
+    hit_bottom_us = measure(lambda: wrapped.get("L0:7"), repeat)
+    base_us = measure(lambda: wrapped.get("key7"), repeat)
+    miss_us = measure(lambda: wrapped.get("missing"), repeat)
+    print(f"{'верхний слой, мкс':>20} {'нижний слой, мкс':>20} {'база, мкс':>12} {'промах, мкс':>14}")
+    print(f"{hit_top_us:>20.2f} {hit_bottom_us:>20.2f} {base_us:>12.2f} {miss_us:>14.2f}")
+
+
+def bench_commit(sizes: list[int], repeat: int) -> None:
+    print("COMMIT транзакции из 3 ключей / вложенный COMMIT слоя из 10000 ключей")
+    print(f"{'N':>10} {'COMMIT, мкс':>14} {'вложенный COMMIT, мкс':>24}")
+    for n in sizes:
+        wrapped = build(n, 1_000)
+
+        def small_commit():
+            wrapped.begin()
+            wrapped.set("key1", "x")
+            wrapped.set("new", "y")
+            wrapped.unset("key2")
+            wrapped.commit()
+
+        commit_us = measure(small_commit, repeat)
+
+        wrapped.begin()
+        nested_total = 0.0
+        for _ in range(10):
+            wrapped.begin()
+            for i in range(10_000):
+                wrapped.set(f"key{i}", "z")
+            start = time.perf_counter()
+            wrapped.commit()
+            nested_total += time.perf_counter() - start
+        wrapped.rollback()
+        print(f"{n:>10} {commit_us:>14.2f} {nested_total / 10 * 1e6:>24.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры операций внутри транзакций")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--distinct", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=1_000)
+    parser.add_argument("--levels", type=int, default=10)
+    parser.add_argument("--writes", type=int, default=100_000)
+    args = parser.parse_args()
+    bench_counts_find(args.sizes, args.distinct, args.repeat)
+    bench_deep_get(args.levels, args.writes, args.repeat)
+    bench_commit(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import fnmatch
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.workloads import SCALE, VALUES, WORKLOADS
+from database import RAMDatabase
+from processor import CommandHandler
+from transaction_wrapper import WrappedDatabase
+
+# рост пика памяти меньше этого порога не считается регрессией: мелкие пики шумят
+MEMORY_SLACK = 64 * 1024
+
+
+def prepare(keys: int) -> CommandHandler:
+    db = RAMDatabase()
+    db.load((f"key{i}", f"v{i % VALUES}") for i in range(keys))
+    return CommandHandler(WrappedDatabase(db))
+
+
+def execute(handler: CommandHandler, lines: list[list[str]]) -> None:
+    execute = handler.execute
+    for parts in lines:
+        execute(parts[0], parts[1:])
+
+
+def measure_prepare(keys: int) -> int:
+    # память заполненной базы: регрессия в хранении ключей видна здесь, а не в пиках нагрузок
+    gc.collect()
+    tracemalloc.start()
+    handler = prepare(keys)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del handler
+    return size
+
+
+def measure(name: str, keys: int, ops: int, repeat: int, memory: bool) -> dict[str, float]:
+    ops = max(int(ops * SCALE.get(name, 1.0)), 1)
+    lines = [line.split() for line in WORKLOADS[name](random.Random(1), keys, ops)]
+    best = float("inf")
+    for _ in range(repeat):
+        handler = prepare(keys)
+        gc.collect()
+        start = time.perf_counter()
+        execute(handler, lines)
+        best = min(best, time.perf_counter() - start)
+    result = {"ops": len(lines), "ops_per_sec": len(lines) / best}
+    if memory:
+        # отдельный прогон под tracemalloc: пик памяти сверх заполненной базы
+        handler = prepare(keys)
+        gc.collect()
+        tracemalloc.start()
+        execute(handler, lines)
+        result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def exceeds(size: int, base: int, memory_tolerance: float) -> bool:
+    return size > base + max(base * memory_tolerance, MEMORY_SLACK)
+
+
+def compare(report: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list[str]:
+    regressions = []
+    results = report["results"]
+    if "prepare_memory" in report and "prepare_memory" in baseline:
+        if exceeds(report["prepare_memory"], baseline["prepare_memory"], memory_tolerance):
+            regressions.append(f"prepare: память {baseline['prepare_memory']} -> {report['prepare_memory']} байт")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: ops/sec {base['ops_per_sec']:.0f} -> {result['ops_per_sec']:.0f}")
+        if "peak_memory" in result and "peak_memory" in base:
+            if exceeds(result["peak_memory"], base["peak_memory"], memory_tolerance):
+                regressions.append(f"{name}: память {base['peak_memory']} -> {result['peak_memory']} байт")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Набор бенчмарков пути команд с JSON-отчетом и сравнением с базовой линией")
+    parser.add_argument("--keys", type=int, default=100_000, help="число ключей в заполненной базе")
+    parser.add_argument("--ops", type=int, default=100_000, help="команд в каждой нагрузке")
+    parser.add_argument("--repeat", type=int, default=3, help="прогонов на нагрузку, берется лучший")
+    parser.add_argument("--only", nargs="+", default=["*"], help="шаблоны имен нагрузок (fnmatch)")
+    parser.add_argument("--no-memory", action="store_true", help="не замерять пик памяти")
+    parser.add_argument("--output", help="записать результаты в JSON-файл")
+    parser.add_argument("--baseline", help="JSON-файл прошлых результатов для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="допустимое падение ops/sec (доля)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="допустимый рост пика памяти (доля)")
+    parser.add_argument("--list", action="store_true", help="показать нагрузки и выйти")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(WORKLOADS))
+        return 0
+    names = [name for name in WORKLOADS if any(fnmatch.fnmatch(name, pattern) for pattern in args.only)]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        # результаты на другом размере базы или числе команд несравнимы
+        if (baseline.get("keys"), baseline.get("ops")) != (args.keys, args.ops):
+            parser.error(
+                f"базовая линия снята с --keys {baseline.get('keys')} --ops {baseline.get('ops')}, "
+                f"а не --keys {args.keys} --ops {args.ops}"
+            )
+
+    results = {}
+    prepare_memory = None
+    if not args.no_memory:
+        prepare_memory = measure_prepare(args.keys)
+        print(f"заполненная база: {prepare_memory / 1024:.0f} КиБ")
+    print(f"{'нагрузка':<18} {'ком/с':>12} {'пик памяти, КиБ':>16} {'к базовой':>10}")
+    for name in names:
+        result = measure(name, args.keys, args.ops, args.repeat, not args.no_memory)
+        results[name] = result
+        ratio = ""
+        base = (baseline or {}).get("results", {}).get(name)
+        if base is not None:
+            ratio = f"{result['ops_per_sec'] / base['ops_per_sec']:.2f}x"
+        peak = f"{result['peak_memory'] / 1024:.0f}" if "peak_memory" in result else "-"
+        print(f"{name:<18} {result['ops_per_sec']:>12.0f} {peak:>16} {ratio:>10}")
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "keys": args.keys,
+        "ops": args.ops,
+        "results": results,
+    }
+    if prepare_memory is not None:
+        report["prepare_memory"] = prepare_memory
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance, args.memory_tolerance)
+        if regressions:
+            print("Регрессии относительно базовой линии:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("Регрессий относительно базовой линии нет.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
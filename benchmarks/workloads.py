@@ -0,0 +1,110 @@
+import random
+from collections.abc import Callable
+
+# сколько различных значений в заполненной базе: от этого зависят COUNTS/FIND
+VALUES = 100
+
+
+def key(rnd: random.Random, keys: int) -> str:
+    return f"key{rnd.randrange(keys)}"
+
+
+def value(rnd: random.Random) -> str:
+    return f"v{rnd.randrange(VALUES)}"
+
+
+def single(command: str) -> Callable[[random.Random, int, int], list[str]]:
+    def generate(rnd: random.Random, keys: int, ops: int) -> list[str]:
+        if command == "SET":
+            return [f"SET {key(rnd, keys)} {value(rnd)}" for _ in range(ops)]
+        if command in ("GET", "UNSET"):
+            return [f"{command} {key(rnd, keys)}" for _ in range(ops)]
+        return [f"{command} {value(rnd)}" for _ in range(ops)]
+
+    return generate
+
+
+def mixed(write_ratio: float) -> Callable[[random.Random, int, int], list[str]]:
+    def generate(rnd: random.Random, keys: int, ops: int) -> list[str]:
+        lines = []
+        for _ in range(ops):
+            r = rnd.random()
+            if r < write_ratio * 0.9:
+                lines.append(f"SET {key(rnd, keys)} {value(rnd)}")
+            elif r < write_ratio:
+                lines.append(f"UNSET {key(rnd, keys)}")
+            elif r < write_ratio + (1 - write_ratio) * 0.9:
+                lines.append(f"GET {key(rnd, keys)}")
+            else:
+                lines.append(f"COUNTS {value(rnd)}")
+        return lines
+
+    return generate
+
+
+def deep_begin(depth: int) -> Callable[[random.Random, int, int], list[str]]:
+    # чтения и записи под стеком из depth вложенных транзакций, затем откат всего стека
+    def generate(rnd: random.Random, keys: int, ops: int) -> list[str]:
+        lines = ["BEGIN"] * depth
+        for i in range(ops - 2 * depth):
+            if i % 4 == 0:
+                lines.append(f"SET {key(rnd, keys)} {value(rnd)}")
+            elif i % 4 == 3:
+                lines.append(f"COUNTS {value(rnd)}")
+            else:
+                lines.append(f"GET {key(rnd, keys)}")
+        return lines + ["ROLLBACK"] * depth
+
+    return generate
+
+
+def large_layer(rnd: random.Random, keys: int, ops: int) -> list[str]:
+    # одна транзакция на всю нагрузку: много записей в слой, COUNTS/FIND поверх него и COMMIT
+    lines = ["BEGIN"]
+    for i in range(ops - 2):
+        lines.append(f"FIND {value(rnd)}" if i % 100 == 99 else f"SET {key(rnd, keys)} {value(rnd)}")
+    return lines + ["COMMIT"]
+
+
+def storm(finish: str) -> Callable[[random.Random, int, int], list[str]]:
+    # много коротких транзакций: BEGIN, две записи, COMMIT или ROLLBACK
+    def generate(rnd: random.Random, keys: int, ops: int) -> list[str]:
+        lines = []
+        for _ in range(ops // 4):
+            lines += ["BEGIN", f"SET {key(rnd, keys)} {value(rnd)}", f"UNSET {key(rnd, keys)}", finish]
+        return lines
+
+    return generate
+
+
+def nested_commit(depth: int) -> Callable[[random.Random, int, int], list[str]]:
+    # вложенные транзакции глубины depth, каждая пишет и фиксируется в родителя
+    def generate(rnd: random.Random, keys: int, ops: int) -> list[str]:
+        lines = []
+        while len(lines) < ops:
+            for _ in range(depth):
+                lines += ["BEGIN", f"SET {key(rnd, keys)} {value(rnd)}"]
+            lines += ["COMMIT"] * depth
+        return lines
+
+    return generate
+
+
+WORKLOADS: dict[str, Callable[[random.Random, int, int], list[str]]] = {
+    "get": single("GET"),
+    "set": single("SET"),
+    "unset": single("UNSET"),
+    "counts": single("COUNTS"),
+    "find": single("FIND"),
+    "mixed_read_90": mixed(0.1),
+    "mixed_50": mixed(0.5),
+    "mixed_write_90": mixed(0.9),
+    "deep_begin_100": deep_begin(100),
+    "large_layer": large_layer,
+    "commit_storm": storm("COMMIT"),
+    "rollback_storm": storm("ROLLBACK"),
+    "nested_commit_10": nested_commit(10),
+}
+
+# доля --ops для тяжелых команд, чтобы прогон всех нагрузок занимал сравнимое время
+SCALE: dict[str, float] = {"find": 0.05}
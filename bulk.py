@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import csv
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import BinaryIO, TextIO
+
+from interfaces import DataBaseAbstractClass
+from layer import Layer
+
+# сколько байт пакетный режим читает за раз
+READ_CHUNK = 1 << 20
+# сколько строк дампа применяется к базе одним слоем
+IMPORT_BATCH = 100_000
+DELIMITERS = {"csv": ",", "tsv": "\t"}
+
+
+def read_commands(stream: BinaryIO, chunk_size: int = READ_CHUNK) -> Iterator[list[str]]:
+    # команды из потока блоками по chunk_size байт: блок декодируется и режется на строки целиком,
+    # пустые строки дают пустой список, который execute_batch пропускает
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = tail + chunk
+        cut = data.rfind(b"\n") + 1
+        tail = data[cut:]
+        yield from map(str.split, data[:cut].decode(errors="replace").splitlines())
+    if tail:
+        yield tail.decode(errors="replace").split()
+
+
+def iter_delimited(stream: TextIO, delimiter: str) -> Iterator[tuple[str, str]]:
+    # пары ключ-значение из CSV/TSV, пустые строки пропускаются
+    for line, row in enumerate(csv.reader(stream, delimiter=delimiter), 1):
+        if len(row) == 2:
+            # команды делят строку по пробелам, поэтому ключ или значение с пробелом потом не прочитать
+            k, v = row
+            if k.split() != [k] and k or v.split() != [v] and v:
+                raise ValueError(f"строка {line}: ключ и значение не должны содержать пробелов")
+            yield k, v
+        elif row:
+            raise ValueError(f"строка {line}: ожидалось 2 поля, получено {len(row)}")
+
+
+def import_items(database: DataBaseAbstractClass, items: Iterable[tuple[str, str]], batch: int = IMPORT_BATCH) -> int:
+    # запись пачками через apply: без разбора команд, журнал и реплики получают по записи на пачку
+    items = iter(items)
+    imported = 0
+    while True:
+        rows = list(islice(items, batch))
+        if not rows:
+            return imported
+        layer = Layer()
+        layer.writes.update(rows)
+        database.apply(layer)
+        imported += len(rows)
+
+
+def import_file(database: DataBaseAbstractClass, path: str, format: str | None = None) -> int:
+    if format is None:
+        format = "tsv" if path.lower().endswith(".tsv") else "csv"
+    with open(path, newline="", encoding="utf-8") as stream:
+        return import_items(database, iter_delimited(stream, DELIMITERS[format]))
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator
+
+from interfaces import DataBaseAbstractClass
+from layer import Layer
+
+
+class _Deleted:
+    __slots__ = ()
+
+
+# отметка освобожденного слота в открытой адресации
+_DELETED = _Deleted()
+_EMPTY = -1
+_MIN_CAPACITY = 8
+
+
+class CompactDatabase(DataBaseAbstractClass):
+    def __init__(self):
+        # таблица значений: каждое значение хранится один раз, ключи ссылаются на него по номеру
+        self.__value_ids: dict[str, int] = {}
+        self.__values: list[str | None] = []
+        self.__refs = array("q")
+        self.__free_ids: list[int] = []
+        # открытая адресация: ключи и номера их значений в параллельных массивах
+        self.__keys: list[str | _Deleted | None] = [None] * _MIN_CAPACITY
+        self.__vids = array("i", [_EMPTY]) * _MIN_CAPACITY
+        self.__size = 0
+        self.__used = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def set(self, k: str, v: str) -> None:
+        slot = self.__find_slot(k)
+        if slot >= 0:
+            old = self.__vids[slot]
+            if self.__values[old] == v:
+                return None
+            self.__vids[slot] = self.__intern(v)
+            self.__release(old)
+            return None
+        if (self.__used + 1) * 3 > len(self.__keys) * 2:
+            self.__resize()
+        slot = self.__insert_slot(k)
+        if self.__keys[slot] is None:
+            self.__used += 1
+        self.__keys[slot] = k
+        self.__vids[slot] = self.__intern(v)
+        self.__size += 1
+        return None
+
+    def get(self, k: str) -> str:
+        v = self.lookup(k)
+        return "NULL" if v is None else v
+
+    def lookup(self, k: str) -> str | None:
+        slot = self.__find_slot(k)
+        if slot < 0:
+            return None
+        return self.__values[self.__vids[slot]]
+
+    def unset(self, k: str) -> None:
+        slot = self.__find_slot(k)
+        if slot < 0:
+            return None
+        self.__release(self.__vids[slot])
+        self.__keys[slot] = _DELETED
+        self.__vids[slot] = _EMPTY
+        self.__size -= 1
+        return None
+
+    def counts(self, v: str) -> int:
+        vid = self.__value_ids.get(v)
+        return 0 if vid is None else self.__refs[vid]
+
+    def find(self, v: str) -> str:
+        return " ".join(self.iter_find(v))
+
+    def find_keys(self, v: str) -> set[str]:
+        return set(self.iter_find(v))
+
+    def iter_find(self, v: str) -> Iterator[str]:
+        # ключи в порядке таблицы
+        vid = self.__value_ids.get(v)
+        if vid is None:
+            return iter(())
+        return iter([k for k, i in zip(self.__keys, self.__vids) if i == vid])
+
+    def apply(self, layer: Layer) -> None:
+        for k in layer.deletes:
+            self.unset(k)
+        for k, v in layer.writes.items():
+            self.set(k, v)
+        return None
+
+    def commit(self, layer: Layer) -> None:
+        return self.apply(layer)
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        values = self.__values
+        for k, i in zip(self.__keys, self.__vids):
+            if i != _EMPTY:
+                yield k, values[i]
+
+    def load(self, items: Iterable[tuple[str, str]]) -> None:
+        self.__init__()
+        for k, v in items:
+            self.set(k, v)
+        return None
+
+    def read_database(self) -> dict[str, str]:
+        return dict(self.items())
+
+    def distinct_values(self) -> int:
+        return len(self.__value_ids)
+
+    def __find_slot(self, k: str) -> int:
+        keys = self.__keys
+        mask = len(keys) - 1
+        slot = hash(k) & mask
+        while True:
+            key = keys[slot]
+            if key is None:
+                return -1
+            if key == k:
+                return slot
+            slot = (slot + 1) & mask
+
+    def __insert_slot(self, k: str) -> int:
+        keys = self.__keys
+        mask = len(keys) - 1
+        slot = hash(k) & mask
+        while True:
+            key = keys[slot]
+            if key is None or key is _DELETED:
+                return slot
+            slot = (slot + 1) & mask
+
+    def __resize(self) -> None:
+        capacity = _MIN_CAPACITY
+        while capacity * 2 < (self.__size + 1) * 3:
+            capacity *= 2
+        capacity *= 2
+        keys, vids = self.__keys, self.__vids
+        self.__keys = [None] * capacity
+        self.__vids = array("i", [_EMPTY]) * capacity
+        self.__used = self.__size
+        mask = capacity - 1
+        for k, i in zip(keys, vids):
+            if i == _EMPTY:
+                continue
+            slot = hash(k) & mask
+            while self.__keys[slot] is not None:
+                slot = (slot + 1) & mask
+            self.__keys[slot] = k
+            self.__vids[slot] = i
+        return None
+
+    def __intern(self, v: str) -> int:
+        vid = self.__value_ids.get(v)
+        if vid is None:
+            if self.__free_ids:
+                vid = self.__free_ids.pop()
+                self.__values[vid] = v
+                self.__refs[vid] = 0
+            else:
+                vid = len(self.__values)
+                self.__values.append(v)
+                self.__refs.append(0)
+            self.__value_ids[v] = vid
+        self.__refs[vid] += 1
+        return vid
+
+    def __release(self, vid: int) -> None:
+        self.__refs[vid] -= 1
+        if self.__refs[vid] == 0:
+            del self.__value_ids[self.__values[vid]]
+            self.__values[vid] = None
+            self.__free_ids.append(vid)
+        return None
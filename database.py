@@ -1,38 +1,428 @@
-from interfaces import DataBaseAbstractClass
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterable, Iterator
+from heapq import heapify, heappop, heappush
+from itertools import islice
+
+from eviction import EvictionPolicy, entry_size, make_policy
+from interfaces import ChangeListener, DataBaseAbstractClass, to_number
+from layer import Layer
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    # SortedList нужен только базам с индексами, см. __init__
+    from sortedlist import SortedList
+
+
+# по скольким записям оценивается занятая память, если лимит памяти не задан
+MEMORY_SAMPLE = 1000
 
 
 class RAMDatabase(DataBaseAbstractClass):
-    def __init__(self):
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.time,
+        maxkeys: int | None = None,
+        maxmemory: int | None = None,
+        eviction: str | EvictionPolicy = "lru",
+        ordered_index: bool = False,
+        numeric_index: bool = False,
+    ):
         self.__database = {}
+        # значение -> ключи со значением; словарь вместо множества хранит порядок, в котором ключи
+        # получили значение, поэтому ответ FIND не зависит от PYTHONHASHSEED
+        self.__index: dict[str, dict[str, None]] = {}
+        self.__listeners: list[ChangeListener] = []
+        self.__clock = clock
+        # ключ -> момент истечения; куча (момент, ключ) находит истекшие ключи без обхода базы
+        self.__expires: dict[str, float] = {}
+        self.__heap: list[tuple[float, str]] = []
+        # ключи, измененные в открытых транзакциях, не истекают до их завершения
+        self.__pins: dict[str, int] = {}
+        # сколько раз менялись закрепленные ключи: пока счетчик стоит, база под транзакциями неизменна
+        self.__pinned_changes = 0
+        # ограничения по числу ключей и оценке занятой памяти; без них обращения не отслеживаются
+        self.maxkeys = maxkeys
+        self.maxmemory = maxmemory
+        self.__policy: EvictionPolicy | None = None
+        if maxkeys is not None or maxmemory is not None:
+            self.__policy = make_policy(eviction) if isinstance(eviction, str) else eviction
+        self.__used_memory = 0
+        self.__evicted = 0
+        # упорядоченный индекс ключей для SCAN/KEYS/RANGE
+        self.__ordered: SortedList | None = None
+        # пары (число, ключ) для значений, которые читаются как числа, - для COUNTRANGE/FINDRANGE
+        self.__numbers: SortedList | None = None
+        if ordered_index or numeric_index:
+            # модуль индексов загружается, только если индекс включен
+            import sortedlist
+
+            self.__ordered = sortedlist.SortedList() if ordered_index else None
+            self.__numbers = sortedlist.SortedList() if numeric_index else None
+
+    def add_listener(self, listener: ChangeListener) -> None:
+        self.__listeners.append(listener)
+        return None
+
+    def remove_listener(self, listener: ChangeListener) -> None:
+        self.__listeners.remove(listener)
+        return None
 
     def read_database(self) -> dict[str, str]:
+        if self.__expires:
+            return dict(self.items())
         return self.__database.copy()
 
+    def items(self) -> Iterator[tuple[str, str]]:
+        if not self.__expires:
+            return iter(self.__database.items())
+        # истекшие ключи пропускаются без удаления: items читают под блокировками журнала и снимков;
+        # закрепленные транзакциями ключи не истекают, как и в lookup
+        now = self.__clock()
+        expires = self.__expires
+        pins = self.__pins
+        return ((k, v) for k, v in self.__database.items() if expires.get(k, now + 1) > now or k in pins)
+
+    def load(self, items: Iterable[tuple[str, str]]) -> None:
+        database: dict[str, str] = {}
+        index: dict[str, dict[str, None]] = {}
+        repeated = False
+        for k, v in items:
+            old = database.get(k)
+            if old is not None:
+                del index[old][k]
+                repeated = True
+            database[k] = v
+            keys = index.get(v)
+            if keys is None:
+                index[v] = {k: None}
+            else:
+                keys[k] = None
+        if self.__pins:
+            self.__pinned_changes += 1
+        self.__database = database
+        self.__index = {v: keys for v, keys in index.items() if keys} if repeated else index
+        self.__expires = {}
+        self.__heap = []
+        if self.__ordered is not None or self.__numbers is not None:
+            import sortedlist
+
+            if self.__ordered is not None:
+                self.__ordered = sortedlist.SortedList(database)
+            if self.__numbers is not None:
+                self.__numbers = sortedlist.SortedList(self.__numbered(database.items()))
+        if self.__policy is not None:
+            self.__policy.clear()
+            self.__used_memory = 0
+            for k, v in database.items():
+                self.__policy.add(k)
+                self.__used_memory += entry_size(k, v)
+        for listener in self.__listeners:
+            listener.on_load(self)
+        if self.__policy is not None:
+            self.__evict(())
+        return None
+
     def set(self, k: str, v: str) -> None:
-        self.__database[k] = v
+        if self.__store(k, v):
+            for listener in self.__listeners:
+                listener.on_set(k, v)
+        if self.__policy is not None:
+            self.__evict((k,))
         return None
 
     def get(self, k: str) -> str:
+        if self.__expires and k in self.__expires:
+            self.__expire_if_due(k)
+        if self.__policy is not None and k in self.__database:
+            self.__policy.touch(k)
         return self.__database.get(k, "NULL")
 
+    def lookup(self, k: str) -> str | None:
+        if self.__expires and k in self.__expires:
+            self.__expire_if_due(k)
+        if self.__policy is not None and k in self.__database:
+            self.__policy.touch(k)
+        return self.__database.get(k)
+
     def unset(self, k: str) -> None:
-        self.__database.pop(k, None)
+        if self.__drop(k):
+            for listener in self.__listeners:
+                listener.on_unset(k)
         return None
 
     def counts(self, v: str) -> int:
-        _ = 0
-        for value in self.__database.values():
-            if value == v:
-                _ += 1
-        return _
+        if self.__heap:
+            self.expire_due()
+        keys = self.__index.get(v)
+        return len(keys) if keys else 0
 
     def find(self, v: str) -> str:
-        str_ = ""
-        for key, value in self.__database.items():
-            if value == v:
-                str_ += f"{key} "
-        return str_[:-1]
-
-    def commit(self, new: list):
-        self.__database.update(new)
-        self.__database = {k: v for k, v in self.__database.items() if v != "NULL"}
+        if self.__heap:
+            self.expire_due()
+        return " ".join(self.__index.get(v, ()))
+
+    def find_keys(self, v: str) -> set[str]:
+        if self.__heap:
+            self.expire_due()
+        return set(self.__index.get(v, ()))
+
+    def iter_find(self, v: str) -> Iterator[str]:
+        if self.__heap:
+            self.expire_due()
+        # кортеж ссылок на ключи: обход остается верным, даже если базу меняют, пока ответ уходит клиенту
+        return iter(tuple(self.__index.get(v, ())))
+
+    def key_range(self, lo: str | None = None, hi: str | None = None) -> Iterator[str]:
+        if self.__ordered is None:
+            return super().key_range(lo, hi)
+        keys = self.__ordered.irange(lo, hi)
+        if not self.__expires:
+            return keys
+        now = self.__clock()
+        expires = self.__expires
+        pins = self.__pins
+        return (k for k in keys if expires.get(k, now + 1) > now or k in pins)
+
+    def count_range(self, lo: float, hi: float) -> int:
+        if self.__numbers is None:
+            return super().count_range(lo, hi)
+        if self.__heap:
+            self.expire_due()
+        return self.__numbers.count((lo,), (hi,))
+
+    def find_range(self, lo: float, hi: float) -> set[str]:
+        if self.__numbers is None:
+            return super().find_range(lo, hi)
+        if self.__heap:
+            self.expire_due()
+        return {k for _, k in self.__numbers.irange((lo,), (hi,))}
+
+    def expire(self, k: str, seconds: float | None) -> None:
+        return self.expire_at(k, None if seconds is None else self.__clock() + seconds)
+
+    def expire_at(self, k: str, deadline: float | None) -> None:
+        if self.lookup(k) is None:
+            return None
+        if deadline is None:
+            if self.__expires.pop(k, None) is None:
+                return None
+        else:
+            self.__expires[k] = deadline
+            heappush(self.__heap, (deadline, k))
+            if len(self.__heap) > 2 * len(self.__expires) + 1024:
+                # в куче накопились устаревшие моменты перезаписанных ключей
+                self.__heap = [(d, key) for key, d in self.__expires.items()]
+                heapify(self.__heap)
+        for listener in self.__listeners:
+            listener.on_expire(k, deadline)
+        return None
+
+    def supports_ttl(self) -> bool:
+        return True
+
+    def ttl(self, k: str) -> float | None:
+        deadline = self.__expires.get(k)
+        if deadline is None or self.__expire_if_due(k):
+            return None
+        return deadline - self.__clock()
+
+    def expirations(self) -> Iterator[tuple[str, float]]:
+        # истекшие сроки тоже отдаются: ключ мог попасть в снимок до своего истечения
+        return iter(self.__expires.items())
+
+    def expire_due(self, limit: int | None = None) -> int:
+        heap = self.__heap
+        expires = self.__expires
+        now = self.__clock()
+        expired = 0
+        while heap and heap[0][0] <= now and (limit is None or expired < limit):
+            deadline, k = heappop(heap)
+            # устаревшая запись кучи или ключ закреплен транзакцией (истечет при unpin)
+            if expires.get(k) != deadline or k in self.__pins:
+                continue
+            self.unset(k)
+            expired += 1
+        return expired
+
+    def memory_estimate(self) -> int:
+        if self.__policy is not None:
+            return self.__used_memory
+        sample = list(islice(self.__database.items(), MEMORY_SAMPLE))
+        if not sample:
+            return 0
+        return sum(entry_size(k, v) for k, v in sample) * len(self.__database) // len(sample)
+
+    def stats(self) -> dict[str, object]:
+        stats = self.eviction_stats()
+        stats["used_memory"] = self.memory_estimate()
+        stats["expires"] = len(self.__expires)
+        stats["pinned_keys"] = len(self.__pins)
+        return stats
+
+    def eviction_stats(self) -> dict[str, int | str | None]:
+        return {
+            "keys": len(self.__database),
+            "maxkeys": self.maxkeys,
+            "used_memory": self.__used_memory,
+            "maxmemory": self.maxmemory,
+            "policy": None if self.__policy is None else self.__policy.name,
+            "evicted_keys": self.__evicted,
+        }
+
+    def pin(self, k: str) -> None:
+        self.__pins[k] = self.__pins.get(k, 0) + 1
+        return None
+
+    def unpin(self, k: str) -> None:
+        left = self.__pins[k] - 1
+        if left:
+            self.__pins[k] = left
+            return None
+        del self.__pins[k]
+        if k in self.__expires:
+            self.__expire_if_due(k)
+        # ключи зафиксированной транзакции становятся доступны для вытеснения
+        if self.__policy is not None:
+            self.__evict(())
+        return None
+
+    def pinned_changes(self) -> int:
+        return self.__pinned_changes
+
+    def apply(self, layer: Layer) -> None:
+        listeners = self.__listeners
+        if not listeners:
+            for k in layer.deletes:
+                self.__drop(k)
+            for k, v in layer.writes.items():
+                self.__store(k, v)
+            for k, seconds in layer.expires.items():
+                self.expire(k, seconds)
+            if self.__policy is not None:
+                self.__evict(self.__last_written(layer))
+            return None
+        # все изменения слоя доставляются слушателям одной пачкой
+        for listener in listeners:
+            listener.on_batch_start()
+        for k in layer.deletes:
+            if self.__drop(k):
+                for listener in listeners:
+                    listener.on_unset(k)
+        for k, v in layer.writes.items():
+            if self.__store(k, v):
+                for listener in listeners:
+                    listener.on_set(k, v)
+        for k, seconds in layer.expires.items():
+            self.expire(k, seconds)
+        if self.__policy is not None:
+            self.__evict(self.__last_written(layer))
+        for listener in listeners:
+            listener.on_batch_end()
+        return None
+
+    def commit(self, layer: Layer):
+        return self.apply(layer)
+
+    def __store(self, k: str, v: str) -> bool:
+        old = self.__database.get(k)
+        # SET без EX/PX снимает время жизни ключа
+        persisted = bool(self.__expires) and self.__expires.pop(k, None) is not None
+        if old == v:
+            return persisted
+        if self.__pins and k in self.__pins:
+            self.__pinned_changes += 1
+        if self.__policy is not None:
+            if old is None:
+                self.__policy.add(k)
+                self.__used_memory += entry_size(k, v)
+            else:
+                self.__policy.touch(k)
+                self.__used_memory += entry_size(k, v) - entry_size(k, old)
+        if old is not None:
+            self.__index_remove(old, k)
+        elif self.__ordered is not None:
+            self.__ordered.add(k)
+        if self.__numbers is not None:
+            self.__renumber(k, old, v)
+        self.__database[k] = v
+        self.__index_add(v, k)
+        return True
+
+    def __drop(self, k: str) -> bool:
+        old = self.__database.pop(k, None)
+        if old is None:
+            return False
+        if self.__pins and k in self.__pins:
+            self.__pinned_changes += 1
+        if self.__expires:
+            self.__expires.pop(k, None)
+        if self.__policy is not None:
+            self.__policy.remove(k)
+            self.__used_memory -= entry_size(k, old)
+        if self.__ordered is not None:
+            self.__ordered.discard(k)
+        if self.__numbers is not None:
+            self.__renumber(k, old, None)
+        self.__index_remove(old, k)
+        return True
+
+    def __evict(self, protected) -> None:
+        # вытесненный ключ удаляется обычным UNSET; ключи открытых транзакций и только что записанный не трогаем
+        pins = self.__pins
+
+        def skip(k: str) -> bool:
+            return k in pins or k in protected
+
+        while (self.maxkeys is not None and len(self.__database) > self.maxkeys) or (
+            self.maxmemory is not None and self.__used_memory > self.maxmemory
+        ):
+            k = self.__policy.victim(skip)
+            if k is None:
+                return None
+            self.unset(k)
+            self.__evicted += 1
+        return None
+
+    @staticmethod
+    def __last_written(layer: Layer) -> tuple[str, ...]:
+        # из пачки защищен только последний записанный ключ: остальные вытесняются политикой,
+        # иначе COMMIT или пачка больше лимита оставили бы базу за его пределами
+        return (next(reversed(layer.writes)),) if layer.writes else ()
+
+    def __renumber(self, k: str, old: str | None, new: str | None) -> None:
+        n = None if old is None else to_number(old)
+        if n is not None:
+            self.__numbers.discard((n, k))
+        n = None if new is None else to_number(new)
+        if n is not None:
+            self.__numbers.add((n, k))
+        return None
+
+    @staticmethod
+    def __numbered(items: Iterable[tuple[str, str]]) -> Iterator[tuple[float, str]]:
+        for k, v in items:
+            n = to_number(v)
+            if n is not None:
+                yield n, k
+
+    def __expire_if_due(self, k: str) -> bool:
+        if self.__expires[k] > self.__clock() or k in self.__pins:
+            return False
+        # истечение идет через обычное удаление: индекс и слушатели видят UNSET
+        self.unset(k)
+        return True
+
+    def __index_add(self, v: str, k: str) -> None:
+        keys = self.__index.get(v)
+        if keys is None:
+            self.__index[v] = {k: None}
+        else:
+            keys[k] = None
+
+    def __index_remove(self, v: str, k: str) -> None:
+        keys = self.__index[v]
+        del keys[k]
+        if not keys:
+            del self.__index[v]
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import math
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import random
+
+# оценка накладных расходов на ключ сверх самих строк: слот словаря, элемент индекса значений,
+# учет политики вытеснения (порядка bench_memory для RAMDatabase)
+ENTRY_OVERHEAD = 160
+# сколько случайных ключей сравнивают приближенные политики (как maxmemory-samples в Redis)
+SAMPLES = 5
+
+
+def entry_size(k: str, v: str) -> int:
+    return sys.getsizeof(k) + sys.getsizeof(v) + ENTRY_OVERHEAD
+
+
+def parse_size(size: str) -> int:
+    units = {"kb": 1 << 10, "mb": 1 << 20, "gb": 1 << 30}
+    size = size.strip().lower()
+    for suffix, unit in units.items():
+        if size.endswith(suffix):
+            return int(size[: -len(suffix)]) * unit
+    return int(size)
+
+
+class EvictionPolicy:
+    name = ""
+
+    def add(self, k: str) -> None:
+        raise NotImplementedError
+
+    def touch(self, k: str) -> None:
+        raise NotImplementedError
+
+    def remove(self, k: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def victim(self, skip: Callable[[str], bool]) -> str | None:
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    name = "lru"
+
+    def __init__(self):
+        # от давно не использованных к недавним
+        self.__order: OrderedDict[str, None] = OrderedDict()
+
+    def add(self, k: str) -> None:
+        self.__order[k] = None
+        self.__order.move_to_end(k)
+        return None
+
+    def touch(self, k: str) -> None:
+        self.__order.move_to_end(k)
+        return None
+
+    def remove(self, k: str) -> None:
+        self.__order.pop(k, None)
+        return None
+
+    def clear(self) -> None:
+        self.__order.clear()
+        return None
+
+    def victim(self, skip: Callable[[str], bool]) -> str | None:
+        for k in self.__order:
+            if not skip(k):
+                return k
+        return None
+
+
+class _SampledPolicy(EvictionPolicy):
+    def __init__(self, rnd: random.Random | None = None):
+        # список ключей с позициями: случайный ключ и удаление за O(1)
+        self.keys: list[str] = []
+        self.positions: dict[str, int] = {}
+        if rnd is None:
+            # random нужен только приближенным политикам и загружается вместе с ними
+            import random
+
+            rnd = random.Random()
+        self.random = rnd
+
+    def add(self, k: str) -> None:
+        if k not in self.positions:
+            self.positions[k] = len(self.keys)
+            self.keys.append(k)
+        return None
+
+    def touch(self, k: str) -> None:
+        return None
+
+    def remove(self, k: str) -> None:
+        i = self.positions.pop(k, None)
+        if i is None:
+            return None
+        last = self.keys.pop()
+        if last != k:
+            self.keys[i] = last
+            self.positions[last] = i
+        return None
+
+    def clear(self) -> None:
+        self.keys.clear()
+        self.positions.clear()
+        return None
+
+    def victim(self, skip: Callable[[str], bool]) -> str | None:
+        keys = self.keys
+        for _ in range(SAMPLES * 4):
+            if not keys:
+                return None
+            sample = [k for k in self.random.choices(keys, k=SAMPLES) if not skip(k)]
+            if sample:
+                return self.pick(sample)
+        # почти все ключи закреплены транзакциями
+        return next((k for k in keys if not skip(k)), None)
+
+    def pick(self, sample: list[str]) -> str:
+        return sample[0]
+
+
+class RandomPolicy(_SampledPolicy):
+    name = "random"
+
+
+class LFUPolicy(_SampledPolicy):
+    name = "lfu"
+    # логарифмический 8-битный счетчик обращений, как в Redis
+    INITIAL = 5
+    LOG_FACTOR = 10
+    # раз в сколько минут без обращений счетчик уменьшается на 1
+    DECAY_MINUTES = 1
+
+    def __init__(self, rnd: random.Random | None = None, clock: Callable[[], float] = time.monotonic):
+        super().__init__(rnd)
+        self.clock = clock
+        # ключ -> (счетчик, минута последнего уменьшения)
+        self.counters: dict[str, tuple[int, int]] = {}
+
+    def add(self, k: str) -> None:
+        super().add(k)
+        self.counters[k] = (self.INITIAL, self.__minute())
+        return None
+
+    def touch(self, k: str) -> None:
+        counter, minute = self.__decayed(k)
+        if counter < 255:
+            base = max(counter - self.INITIAL, 0)
+            if self.random.random() < 1.0 / (base * self.LOG_FACTOR + 1):
+                counter += 1
+        self.counters[k] = (counter, minute)
+        return None
+
+    def remove(self, k: str) -> None:
+        super().remove(k)
+        self.counters.pop(k, None)
+        return None
+
+    def clear(self) -> None:
+        super().clear()
+        self.counters.clear()
+        return None
+
+    def frequency(self, k: str) -> int:
+        return self.__decayed(k)[0]
+
+    def pick(self, sample: list[str]) -> str:
+        counters = self.counters
+        now = self.__minute()
+        best, lowest = sample[0], 256
+        for k in sample:
+            counter, minute = counters[k]
+            counter -= (now - minute) // self.DECAY_MINUTES
+            if counter < lowest:
+                best, lowest = k, counter
+        return best
+
+    def __minute(self) -> int:
+        return math.floor(self.clock() / 60)
+
+    def __decayed(self, k: str) -> tuple[int, int]:
+        counter, minute = self.counters[k]
+        now = self.__minute()
+        periods = (now - minute) // self.DECAY_MINUTES
+        if periods:
+            return max(counter - periods, 0), now
+        return counter, minute
+
+
+POLICIES: dict[str, type[EvictionPolicy]] = {
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+    RandomPolicy.name: RandomPolicy,
+}
+
+
+def make_policy(name: str) -> EvictionPolicy:
+    policy = POLICIES.get(name.lower())
+    if policy is None:
+        raise ValueError(f"Неизвестная политика вытеснения: {name}. Доступны: {', '.join(POLICIES)}.")
+    return policy()
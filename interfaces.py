@@ -1,4 +1,58 @@
+from __future__ import annotations
+
+import math
 from abc import ABC, abstractmethod
+from collections.abc import Collection, Iterable, Iterator
+
+from layer import Layer
+
+TTL_UNSUPPORTED = "Время жизни ключей не поддерживается этим хранилищем."
+
+
+def in_range(k: str, lo: str | None, hi: str | None) -> bool:
+    return (lo is None or k >= lo) and (hi is None or k < hi)
+
+
+def to_number(v: str) -> float | None:
+    # числовое значение для COUNTRANGE/FINDRANGE; nan и бесконечности числами не считаются
+    try:
+        n = float(v)
+    except ValueError:
+        return None
+    return n if math.isfinite(n) else None
+
+
+def in_number_range(v: str, lo: float, hi: float) -> bool:
+    n = to_number(v)
+    return n is not None and lo <= n < hi
+
+
+# база под открытой транзакцией может меняться другими соединениями, поэтому поправки транзакции
+# к COUNTS/FIND сверяются с текущей базой по ключам транзакции; обходится меньшая из двух сторон
+
+
+def count_shadowed(database: DataBaseAbstractClass, v: str, keys: Collection[str]) -> int:
+    # сколько ключей из keys сейчас хранят в базе значение v
+    if database.counts(v) < len(keys):
+        return sum(k in keys for k in database.iter_find(v))
+    lookup = database.lookup
+    return sum(lookup(k) == v for k in keys)
+
+
+def count_shadowed_range(database: DataBaseAbstractClass, lo: float, hi: float, keys: Collection[str]) -> int:
+    # сколько ключей из keys сейчас хранят в базе число из [lo, hi)
+    if database.count_range(lo, hi) < len(keys):
+        return sum(k in keys for k in database.find_range(lo, hi))
+    lookup = database.lookup
+    return sum(1 for k in keys if (v := lookup(k)) is not None and in_number_range(v, lo, hi))
+
+
+def exclude(keys: set[str], hidden: Collection[str]) -> set[str]:
+    # keys без ключей из hidden
+    if len(keys) < len(hidden):
+        return {k for k in keys if k not in hidden}
+    keys.difference_update(hidden)
+    return keys
 
 
 class DataBaseAbstractClass(ABC):
@@ -31,5 +85,97 @@ class DataBaseAbstractClass(ABC):
     def commit(self, *args, **kwargs):
         pass
 
+    def apply(self, layer: Layer) -> None:
+        for k in layer.deletes:
+            self.unset(k)
+        for k, v in layer.writes.items():
+            self.set(k, v)
+        for k, seconds in layer.expires.items():
+            self.expire(k, seconds)
+        return None
+
     def read_database(self) -> dict[str,str]:
         return {}
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        return iter(self.read_database().items())
+
+    def load(self, items: Iterable[tuple[str, str]]) -> str | None:
+        for k, v in items:
+            self.set(k, v)
+        return None
+
+    def lookup(self, k: str) -> str | None:
+        v = self.get(k)
+        return None if v == "NULL" else v
+
+    def find_keys(self, v: str) -> set[str]:
+        return set(self.find(v).split())
+
+    def iter_find(self, v: str) -> Iterator[str]:
+        # ключи со значением v по одному, без сборки всего ответа в строку
+        return iter(self.find_keys(v))
+
+    def key_range(self, lo: str | None = None, hi: str | None = None) -> Iterator[str]:
+        # ключи lo <= k < hi по возрастанию; без упорядоченного индекса - сортировка всех ключей
+        return iter(sorted(k for k, _ in self.items() if in_range(k, lo, hi)))
+
+    def count_range(self, lo: float, hi: float) -> int:
+        return len(self.find_range(lo, hi))
+
+    def find_range(self, lo: float, hi: float) -> set[str]:
+        # ключи с числовыми значениями lo <= value < hi; без числового индекса - обход базы
+        return {k for k, v in self.items() if in_number_range(v, lo, hi)}
+
+    def stats(self) -> dict[str, object]:
+        return {"keys": sum(1 for _ in self.items())}
+
+    def expire(self, k: str, seconds: float | None) -> str | None:
+        return TTL_UNSUPPORTED
+
+    def expire_at(self, k: str, deadline: float | None) -> str | None:
+        return TTL_UNSUPPORTED
+
+    def supports_ttl(self) -> bool:
+        # хранилище без времени жизни отбрасывает expires слоя в apply, поэтому EX/PX
+        # и PERSIST проверяют поддержку до изменения данных
+        return False
+
+    def ttl(self, k: str) -> float | None:
+        return None
+
+    def expirations(self) -> Iterator[tuple[str, float]]:
+        return iter(())
+
+    def expire_due(self, limit: int | None = None) -> int:
+        return 0
+
+    def pin(self, k: str) -> None:
+        pass
+
+    def unpin(self, k: str) -> None:
+        pass
+
+    def pinned_changes(self) -> int | None:
+        # счетчик изменений закрепленных ключей; None - хранилище его не ведет
+        return None
+
+
+class ChangeListener:
+    def on_set(self, k: str, v: str) -> None:
+        pass
+
+    def on_unset(self, k: str) -> None:
+        pass
+
+    def on_batch_start(self) -> None:
+        pass
+
+    def on_batch_end(self) -> None:
+        pass
+
+    def on_expire(self, k: str, deadline: float | None) -> None:
+        pass
+
+    def on_load(self, database: DataBaseAbstractClass) -> None:
+        pass
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from collections.abc import KeysView
+from itertools import chain
+
+
+class _Tombstone:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "TOMBSTONE"
+
+
+# отметка об удалении ключа в слое транзакции
+TOMBSTONE = _Tombstone()
+
+
+class Layer:
+    __slots__ = ("writes", "deletes", "expires", "added", "removed", "before")
+
+    def __init__(self):
+        self.writes: dict[str, str] = {}
+        self.deletes: set[str] = set()
+        # ключ -> время жизни в секундах, отсчитывается от фиксации слоя (None - снять время жизни)
+        self.expires: dict[str, float | None] = {}
+        # значение -> ключи, получившие / потерявшие его в этом слое, в порядке записи
+        self.added: dict[str, dict[str, None]] = {}
+        self.removed: dict[str, dict[str, None]] = {}
+        # значение ключа под слоем на момент первой записи в слой (None - ключа не было)
+        self.before: dict[str, str | None] = {}
+
+    def __contains__(self, k: str) -> bool:
+        return k in self.writes or k in self.deletes
+
+    def __len__(self) -> int:
+        return len(self.writes) + len(self.deletes)
+
+    def __iter__(self):
+        yield from self.writes
+        yield from self.deletes
+
+    def get(self, k: str) -> str | _Tombstone | None:
+        v = self.writes.get(k)
+        if v is None and k in self.deletes:
+            return TOMBSTONE
+        return v
+
+    def items(self):
+        yield from self.writes.items()
+        for k in self.deletes:
+            yield k, TOMBSTONE
+
+    def set(self, k: str, v: str) -> None:
+        self.deletes.discard(k)
+        self.expires.pop(k, None)
+        self.writes[k] = v
+        return None
+
+    def unset(self, k: str) -> None:
+        self.writes.pop(k, None)
+        self.expires.pop(k, None)
+        self.deletes.add(k)
+        return None
+
+    def expire(self, k: str, seconds: float | None) -> None:
+        self.expires[k] = seconds
+        return None
+
+    def keys(self) -> KeysView[str]:
+        # в порядке записи: после COMMIT ключи освобождаются от закрепления в том же порядке,
+        # и вытеснение доходит до ключей транзакции начиная со старых
+        return dict.fromkeys(chain(self.writes, self.deletes, self.expires)).keys()
+
+    def put(self, k: str, v: str | _Tombstone, below: str | None) -> None:
+        if k in self:
+            below = self.before[k]
+            self.__untrack(k, below, self.writes.get(k))
+        else:
+            self.before[k] = below
+        self.expires.pop(k, None)
+        if v is TOMBSTONE:
+            self.writes.pop(k, None)
+            self.deletes.add(k)
+            self.__track(k, below, None)
+        else:
+            self.deletes.discard(k)
+            self.writes[k] = v
+            self.__track(k, below, v)
+        return None
+
+    def drop(self, k: str) -> None:
+        # убрать запись ключа, как будто в слой его не писали; время жизни не трогается
+        if k not in self:
+            return None
+        self.__untrack(k, self.before.pop(k), self.writes.pop(k, None))
+        self.deletes.discard(k)
+        return None
+
+    def __track(self, k: str, before: str | None, after: str | None) -> None:
+        if before == after:
+            return None
+        if before is not None:
+            keys = self.removed.get(before)
+            if keys is None:
+                self.removed[before] = {k: None}
+            else:
+                keys[k] = None
+        if after is not None:
+            keys = self.added.get(after)
+            if keys is None:
+                self.added[after] = {k: None}
+            else:
+                keys[k] = None
+        return None
+
+    def __untrack(self, k: str, before: str | None, after: str | None) -> None:
+        if before == after:
+            return None
+        if before is not None:
+            self.__discard(self.removed, before, k)
+        if after is not None:
+            self.__discard(self.added, after, k)
+        return None
+
+    @staticmethod
+    def __discard(delta: dict[str, dict[str, None]], v: str, k: str) -> None:
+        keys = delta[v]
+        del keys[k]
+        if not keys:
+            del delta[v]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Sequence
+
+# точность гистограммы: 2**SUB_BITS корзин на каждую степень двойки (ошибка не больше 12.5%)
+SUB_BITS = 3
+_SUB = 1 << SUB_BITS
+_EXACT = _SUB * 2
+_BUCKETS = 64 * _SUB
+PERCENTILES = (50.0, 99.0, 99.9)
+# время замеряется у каждой SAMPLE-й команды: два вызова часов и запись в гистограмму
+# сравнимы по цене с самой командой, а счетчики вызовов точные всегда
+SAMPLE = 16
+# готовые номера корзин для задержек до 64 мкс с шагом 16 нс: запись без вычислений на горячем пути
+_TABLE_SHIFT = 4
+_TABLE_LIMIT = 1 << 16
+
+
+def bucket_of(ns: int) -> int:
+    if ns < _EXACT:
+        return ns
+    shift = ns.bit_length() - SUB_BITS - 1
+    return min((shift + 1) * _SUB + (ns >> shift) - _SUB, _BUCKETS - 1)
+
+
+def bucket_upper(i: int) -> int:
+    if i < _EXACT:
+        return i
+    shift = i // _SUB - 1
+    return ((i % _SUB + _SUB + 1) << shift) - 1
+
+
+_TABLE = [bucket_of(ns << _TABLE_SHIFT) for ns in range(_TABLE_LIMIT >> _TABLE_SHIFT)]
+
+
+class LatencyHistogram:
+    # логарифмически-линейные корзины в духе HdrHistogram: запись O(1), память постоянна
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int) -> None:
+        self.counts[_TABLE[ns >> _TABLE_SHIFT] if ns < _TABLE_LIMIT else bucket_of(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        return None
+
+    def percentile(self, p: float) -> int:
+        if self.count == 0:
+            return 0
+        rank = max(self.count * p / 100.0, 1)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bucket_upper(i), self.max)
+        return self.max
+
+
+class SlowLog:
+    def __init__(self, threshold_us: int = 10_000, max_len: int = 128):
+        # команды дольше порога попадают в журнал медленных команд; отрицательный порог выключает журнал
+        self.threshold_us = threshold_us
+        self.threshold_ns = threshold_us * 1000 if threshold_us >= 0 else None
+        self.entries: deque[tuple[int, int, int, str]] = deque(maxlen=max_len)
+        self.next_id = 0
+
+    def add(self, command: str, args: Sequence[str], ns: int) -> None:
+        text = " ".join([command, *args])
+        self.entries.appendleft((self.next_id, int(time.time()), ns // 1000, text))
+        self.next_id += 1
+        return None
+
+    def reset(self) -> None:
+        self.entries.clear()
+        return None
+
+
+class Metrics:
+    def __init__(self, slowlog_threshold_us: int = 10_000, slowlog_max_len: int = 128, sample: int = SAMPLE):
+        if sample < 1:
+            raise ValueError("Период замеров должен быть не меньше 1.")
+        self.started = time.monotonic()
+        self.calls: defaultdict[str, int] = defaultdict(int)
+        # до следующего замера; CommandHandler уменьшает и сбрасывает счетчик сам
+        self.sample = sample
+        self.countdown = sample
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self.slowlog = SlowLog(slowlog_threshold_us, slowlog_max_len)
+        # порог в наносекундах для проверки на каждой команде; выключенный журнал - недостижимый порог
+        self.slow_ns = self.slowlog.threshold_ns if self.slowlog.threshold_ns is not None else 1 << 62
+        # с включенным журналом время берется у каждой команды, а не только у замеренных в гистограмму
+        self.time_all = self.slowlog.threshold_ns is not None
+        # дополнительные секции INFO: имя -> функция, возвращающая поля секции
+        self.sections: dict[str, Callable[[], dict[str, object]]] = {}
+
+    def record(self, command: str, args: Sequence[str], ns: int) -> None:
+        histogram = self.histograms.get(command)
+        if histogram is None:
+            histogram = self.histograms[command] = LatencyHistogram()
+        # то же, что histogram.record(ns), без лишнего вызова: метод вызывается на каждую команду
+        histogram.counts[_TABLE[ns >> _TABLE_SHIFT] if ns < _TABLE_LIMIT else bucket_of(ns)] += 1
+        histogram.count += 1
+        histogram.total += ns
+        if ns > histogram.max:
+            histogram.max = ns
+        if ns >= self.slow_ns:
+            self.slowlog.add(command, args, ns)
+        return None
+
+    def add_section(self, name: str, fields: Callable[[], dict[str, object]]) -> None:
+        self.sections[name] = fields
+        return None
+
+    def uptime(self) -> int:
+        return int(time.monotonic() - self.started)
+
+    def command_stats(self) -> dict[str, str]:
+        stats = {}
+        for command, calls in sorted(self.calls.items()):
+            fields = [f"calls={calls}"]
+            histogram = self.histograms.get(command)
+            if histogram is not None:
+                # суммарное время оценивается по замеренным вызовам
+                per_call = histogram.total / histogram.count
+                fields += [
+                    f"sampled={histogram.count}",
+                    f"usec={int(per_call * calls / 1000)}",
+                    f"usec_per_call={per_call / 1000:.2f}",
+                ]
+                fields += [f"p{p:g}={histogram.percentile(p) / 1000:.2f}" for p in PERCENTILES]
+                fields.append(f"max={histogram.max / 1000:.2f}")
+            stats[f"cmdstat_{command.lower()}"] = ",".join(fields)
+        return stats
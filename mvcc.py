@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_right
+from collections import deque
+from collections.abc import Iterable, Iterator
+from heapq import merge
+
+from database import RAMDatabase
+from interfaces import DataBaseAbstractClass, in_number_range, in_range
+from layer import Layer
+
+
+class VersionedStore:
+    def __init__(self, database: RAMDatabase | None = None):
+        # последнее зафиксированное состояние
+        self.database = database if database is not None else RAMDatabase()
+        self.version = 0
+        self.__lock = threading.Lock()
+        # версия снимка -> число читателей, которые его держат
+        self.__active: dict[int, int] = {}
+        # ключ -> [(версия фиксации, значение до нее)], по возрастанию версий
+        self.__undo: dict[str, list[tuple[int, str | None]]] = {}
+        self.__versions: dict[str, list[int]] = {}
+        # (версия фиксации, измененные ключи) по возрастанию версий
+        self.__changes: deque[tuple[int, tuple[str, ...]]] = deque()
+
+    def session(self) -> SnapshotView:
+        return SnapshotView(self)
+
+    def acquire(self) -> int:
+        with self.__lock:
+            version = self.version
+            self.__active[version] = self.__active.get(version, 0) + 1
+            return version
+
+    def release(self, snapshot: int) -> None:
+        with self.__lock:
+            left = self.__active[snapshot] - 1
+            if left:
+                self.__active[snapshot] = left
+            else:
+                del self.__active[snapshot]
+            self.__collect_garbage()
+        return None
+
+    def active_snapshots(self) -> int:
+        return sum(self.__active.values())
+
+    def retained_versions(self) -> int:
+        return sum(len(versions) for versions in self.__versions.values())
+
+    def commit(self, layer: Layer, snapshot: int | None) -> str | None:
+        with self.__lock:
+            if snapshot is not None:
+                for k, _ in layer.items():
+                    versions = self.__versions.get(k)
+                    if versions and versions[-1] > snapshot:
+                        return f"Конфликт транзакции: ключ {k} изменен другой сессией. Транзакция отменена."
+            version = self.version + 1
+            if self.__active:
+                keys = tuple(k for k, _ in layer.items())
+                lookup = self.database.lookup
+                for k in keys:
+                    self.__undo.setdefault(k, []).append((version, lookup(k)))
+                    self.__versions.setdefault(k, []).append(version)
+                self.__changes.append((version, keys))
+            self.database.apply(layer)
+            self.version = version
+        return None
+
+    def load(self, items: Iterable[tuple[str, str]]) -> str | None:
+        with self.__lock:
+            if self.__active:
+                return "LOAD недоступен, пока открыты транзакции."
+            self.database.load(items)
+            self.version += 1
+        return None
+
+    def value_at(self, k: str, snapshot: int) -> str | None:
+        versions = self.__versions.get(k)
+        if versions:
+            i = bisect_right(versions, snapshot)
+            if i < len(versions):
+                return self.__undo[k][i][1]
+        return self.database.lookup(k)
+
+    def counts_at(self, v: str, snapshot: int) -> int:
+        _ = self.database.counts(v)
+        for k in self.__changed_since(snapshot):
+            if self.database.lookup(k) == v:
+                _ -= 1
+            if self.value_at(k, snapshot) == v:
+                _ += 1
+        return _
+
+    def find_keys_at(self, v: str, snapshot: int) -> set[str]:
+        keys = self.database.find_keys(v)
+        for k in self.__changed_since(snapshot):
+            if self.value_at(k, snapshot) == v:
+                keys.add(k)
+            else:
+                keys.discard(k)
+        return keys
+
+    def iter_find_at(self, v: str, snapshot: int) -> Iterator[str]:
+        # ключи, не менявшиеся после снимка, - в порядке базы, измененные - следом по возрастанию
+        changed = self.__changed_since(snapshot)
+        keys = [k for k in self.database.iter_find(v) if k not in changed]
+        keys.extend(sorted(k for k in changed if self.value_at(k, snapshot) == v))
+        return iter(keys)
+
+    def count_range_at(self, lo: float, hi: float, snapshot: int) -> int:
+        _ = self.database.count_range(lo, hi)
+        for k in self.__changed_since(snapshot):
+            v = self.database.lookup(k)
+            if v is not None and in_number_range(v, lo, hi):
+                _ -= 1
+            v = self.value_at(k, snapshot)
+            if v is not None and in_number_range(v, lo, hi):
+                _ += 1
+        return _
+
+    def find_range_at(self, lo: float, hi: float, snapshot: int) -> set[str]:
+        keys = self.database.find_range(lo, hi)
+        for k in self.__changed_since(snapshot):
+            v = self.value_at(k, snapshot)
+            if v is not None and in_number_range(v, lo, hi):
+                keys.add(k)
+            else:
+                keys.discard(k)
+        return keys
+
+    def key_range_at(self, lo: str | None, hi: str | None, snapshot: int) -> Iterator[str]:
+        changed = self.__changed_since(snapshot)
+        lookup = self.database.lookup
+        # ключи, удаленные после снимка, в базе уже не видны и добавляются отдельно
+        removed = sorted(
+            k for k in changed
+            if in_range(k, lo, hi) and lookup(k) is None and self.value_at(k, snapshot) is not None
+        )
+        keys = (
+            k for k in self.database.key_range(lo, hi)
+            if k not in changed or self.value_at(k, snapshot) is not None
+        )
+        return merge(keys, removed)
+
+    def __changed_since(self, snapshot: int) -> set[str]:
+        keys: set[str] = set()
+        for version, changed in reversed(self.__changes):
+            if version <= snapshot:
+                break
+            keys.update(changed)
+        return keys
+
+    def __collect_garbage(self) -> None:
+        if not self.__active:
+            self.__undo.clear()
+            self.__versions.clear()
+            self.__changes.clear()
+            return None
+        # версии не старше самого старого активного снимка больше никому не нужны
+        oldest = min(self.__active)
+        while self.__changes and self.__changes[0][0] <= oldest:
+            version, keys = self.__changes.popleft()
+            for k in keys:
+                versions = self.__versions[k]
+                if versions[0] == version:
+                    versions.pop(0)
+                    self.__undo[k].pop(0)
+                    if not versions:
+                        del self.__versions[k]
+                        del self.__undo[k]
+        return None
+
+
+class SnapshotView(DataBaseAbstractClass):
+    def __init__(self, store: VersionedStore):
+        self.store = store
+        self.snapshot: int | None = None
+
+    def set(self, k: str, v: str) -> None:
+        layer = Layer()
+        layer.set(k, v)
+        self.store.commit(layer, None)
+        return None
+
+    def get(self, k: str) -> str:
+        v = self.lookup(k)
+        return "NULL" if v is None else v
+
+    def lookup(self, k: str) -> str | None:
+        if self.snapshot is None:
+            return self.store.database.lookup(k)
+        return self.store.value_at(k, self.snapshot)
+
+    def unset(self, k: str) -> None:
+        layer = Layer()
+        layer.unset(k)
+        self.store.commit(layer, None)
+        return None
+
+    def counts(self, v: str) -> int:
+        if self.snapshot is None:
+            return self.store.database.counts(v)
+        return self.store.counts_at(v, self.snapshot)
+
+    def find(self, v: str) -> str:
+        return " ".join(self.iter_find(v))
+
+    def find_keys(self, v: str) -> set[str]:
+        if self.snapshot is None:
+            return self.store.database.find_keys(v)
+        return self.store.find_keys_at(v, self.snapshot)
+
+    def iter_find(self, v: str) -> Iterator[str]:
+        if self.snapshot is None:
+            return self.store.database.iter_find(v)
+        return self.store.iter_find_at(v, self.snapshot)
+
+    def apply(self, layer: Layer) -> None:
+        self.store.commit(layer, None)
+        return None
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        return self.store.database.items()
+
+    def count_range(self, lo: float, hi: float) -> int:
+        if self.snapshot is None:
+            return self.store.database.count_range(lo, hi)
+        return self.store.count_range_at(lo, hi, self.snapshot)
+
+    def find_range(self, lo: float, hi: float) -> set[str]:
+        if self.snapshot is None:
+            return self.store.database.find_range(lo, hi)
+        return self.store.find_range_at(lo, hi, self.snapshot)
+
+    def stats(self) -> dict[str, object]:
+        stats = self.store.database.stats()
+        stats["mvcc_version"] = self.store.version
+        stats["active_snapshots"] = self.store.active_snapshots()
+        stats["retained_versions"] = self.store.retained_versions()
+        return stats
+
+    def key_range(self, lo: str | None = None, hi: str | None = None) -> Iterator[str]:
+        if self.snapshot is None:
+            return self.store.database.key_range(lo, hi)
+        return self.store.key_range_at(lo, hi, self.snapshot)
+
+    # время жизни не версионируется: истекший ключ пропадает из всех снимков сразу
+    def expire(self, k: str, seconds: float | None) -> str | None:
+        return self.store.database.expire(k, seconds)
+
+    def expire_at(self, k: str, deadline: float | None) -> str | None:
+        return self.store.database.expire_at(k, deadline)
+
+    def supports_ttl(self) -> bool:
+        return self.store.database.supports_ttl()
+
+    def ttl(self, k: str) -> float | None:
+        return self.store.database.ttl(k)
+
+    def expirations(self) -> Iterator[tuple[str, float]]:
+        return self.store.database.expirations()
+
+    def expire_due(self, limit: int | None = None) -> int:
+        return self.store.database.expire_due(limit)
+
+    def pin(self, k: str) -> None:
+        return self.store.database.pin(k)
+
+    def unpin(self, k: str) -> None:
+        return self.store.database.unpin(k)
+
+    def pinned_changes(self) -> int | None:
+        # внутри транзакции чтения идут из снимка, и другие соединения его не меняют
+        if self.snapshot is not None:
+            return 0
+        return self.store.database.pinned_changes()
+
+    def load(self, items: Iterable[tuple[str, str]]) -> str | None:
+        return self.store.load(items)
+
+    def begin(self) -> None:
+        if self.snapshot is None:
+            self.snapshot = self.store.acquire()
+        return None
+
+    def rollback(self) -> None:
+        if self.snapshot is not None:
+            self.store.release(self.snapshot)
+            self.snapshot = None
+        return None
+
+    def commit(self, layer: Layer) -> str | None:
+        try:
+            return self.store.commit(layer, self.snapshot)
+        finally:
+            self.rollback()
@@ -1,42 +1,266 @@
-from interfaces import DataBaseAbstractClass
+from __future__ import annotations
+
+import heapq
+import math
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import islice
+from time import perf_counter_ns
+
+from interfaces import TTL_UNSUPPORTED, DataBaseAbstractClass, to_number
+from layer import Layer
+
+# как typing.TYPE_CHECKING, но без импорта typing при запуске
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    # журнал, метрики и подписки нужны только для аннотаций: их модули загружает тот, кто их создает
+    from aof import AppendOnlyLog
+    from metrics import Metrics
+    from watch import ChangeFeed, Subscription
+
+# команды, которые не меняют данные и доступны на репликах
+READ_COMMANDS = frozenset(
+    {
+        "GET", "COUNTS", "FIND", "COUNTRANGE", "FINDRANGE", "MGET", "TTL", "SCAN", "KEYS", "RANGE", "INFO", "SLOWLOG",
+        "WATCH", "WATCH-VALUE", "WATCH-PREFIX", "UNWATCH", "HELP", "END",
+    }
+)
+# сколько ключей SCAN и FIND с CURSOR возвращают за вызов без COUNT/LIMIT
+SCAN_COUNT = 10
+# сколько ключей в одном куске потокового ответа FIND
+STREAM_CHUNK = 1000
+# множитель единиц времени жизни в SET name value EX seconds / PX milliseconds
+TTL_UNITS = {"EX": 1.0, "PX": 0.001}
+
+
+def prefix_end(prefix: str) -> str | None:
+    # наименьшая строка больше всех строк с данным префиксом
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+def decode_cursor(cursor: str) -> str | None:
+    # курсор - последний отданный ключ в hex, "0" - начало обхода; None - курсор неверный
+    if cursor == "0":
+        return ""
+    try:
+        return bytes.fromhex(cursor).decode()
+    except ValueError:
+        return None
 
 
 class CommandHandler:
-    def __init__(self, database: DataBaseAbstractClass):
+    def __init__(
+        self,
+        database: DataBaseAbstractClass,
+        snapshot_path: str | None = None,
+        log: AppendOnlyLog | None = None,
+        read_only: bool = False,
+        metrics: Metrics | None = None,
+        feed: ChangeFeed | None = None,
+    ):
         self.database = database
+        self.snapshot_path = snapshot_path
+        self.log = log
+        self.read_only = read_only
+        # None - команды не замеряются
+        self.metrics = metrics
+        # лента изменений сервера; подписка соединения создается первой командой WATCH
+        self.feed = feed
+        self.subscription: Subscription | None = None
+        # продолжение постраничного FIND: значение, курсор, отсортированные ключи после курсора и позиция в них
+        self.__find_pages: tuple[str, str, list[str] | None, int] | None = None
+        # таблицы разбора общие для всех экземпляров и собраны при определении класса
+        if read_only:
+            self.__commands = self.__read_only_commands
+            self.__dispatch = self.__read_only_batch
+            self.__streaming_dispatch = self.__read_only_streaming_batch
+        else:
+            self.__commands = self.__all_commands
+            self.__dispatch = self.__batch
+            self.__streaming_dispatch = self.__streaming_batch
 
     def execute(self, command: str, args: list[str]) -> str | int | None:
-        command = command.upper()
-        if command == "SET":
-            return self.__handle_set(args)
-        elif command == "GET":
-            return self.__handle_get(args)
-        elif command == "UNSET":
-            return self.__handle_unset(args)
-        elif command == "COUNTS":
-            return self.__handle_counts(args)
-        elif command == "FIND":
-            return self.__handle_find(args)
-        elif command == "HELP":
-            return self.__handle_help()
-        elif command == "BEGIN":
-            return self.__handle_begin()
-        elif command == "ROLLBACK":
-            return self.__handle_rollback()
-        elif command == "COMMIT":
-            return self.__handle_commit()
-        elif command == "END":
-            return "END"
-        else:
-            return "Ошибка в команде. Введите HELP для справки."
+        # таблица ключена по имени в верхнем регистре; upper() нужен, только если имя не нашлось как есть
+        name = command
+        handler = self.__commands.get(name)
+        if handler is None:
+            name = command.upper()
+            handler = self.__commands.get(name)
+            if handler is None:
+                return "Ошибка в команде. Введите HELP для справки."
+        metrics = self.metrics
+        if metrics is None:
+            return handler(self, args)
+        metrics.calls[name] += 1
+        metrics.countdown -= 1
+        sampled = not metrics.countdown
+        if not sampled and not metrics.time_all:
+            return handler(self, args)
+        if sampled:
+            metrics.countdown = metrics.sample
+        start = perf_counter_ns()
+        result = handler(self, args)
+        ns = perf_counter_ns() - start
+        if sampled:
+            metrics.record(name, args, ns)
+        elif ns >= metrics.slow_ns:
+            metrics.slowlog.add(name, args, ns)
+        return result
+
+    def execute_stream(self, command: str, args: list[str]) -> str | int | None | Iterator[str]:
+        # как execute, но длинные ответы (FIND value) отдаются итератором кусков строки
+        name = command.upper()
+        streamer = self.__streams.get(name)
+        if streamer is None:
+            return self.execute(name, args)
+        if self.metrics is not None:
+            self.metrics.calls[name] += 1
+        return streamer(self, args)
+
+    def execute_batch(
+        self, commands: Iterable[str | Sequence[str]], stream: bool = False
+    ) -> Iterator[str | int | None | Iterator[str]]:
+        dispatch = self.__streaming_dispatch if stream else self.__dispatch
+        metrics = self.metrics
+        if metrics is not None:
+            calls, countdown, sample, time_all = metrics.calls, metrics.countdown, metrics.sample, metrics.time_all
+        pending = Layer()
+        dirty = False
+        timed = sampled = False
+        # записи, собранные в pending до применения, и номера тех из них, что идут в гистограмму
+        writes: list[Sequence[str]] = []
+        sampled_writes: list[int] = []
+
+        def flush() -> None:
+            # запись в pending почти ничего не стоит, время записей - это apply (вытеснение, ожидание
+            # fsync, слушатели); оно делится поровну между записями пачки
+            if metrics is None:
+                self.database.apply(pending)
+            else:
+                start = perf_counter_ns()
+                self.database.apply(pending)
+                share = (perf_counter_ns() - start) // len(writes)
+                for i in sampled_writes:
+                    metrics.record(writes[i][0].upper(), writes[i][1:], share)
+                if share >= metrics.slow_ns:
+                    for parts in writes:
+                        metrics.slowlog.add(parts[0].upper(), parts[1:], share)
+                writes.clear()
+                sampled_writes.clear()
+            pending.writes.clear()
+            pending.deletes.clear()
+            pending.expires.clear()
+            return None
+
+        try:
+            for command in commands:
+                parts = command.split() if isinstance(command, str) else command
+                if not parts:
+                    continue
+                name = parts[0]
+                entry = dispatch.get(name)
+                if entry is None:
+                    name = name.upper()
+                    entry = dispatch.get(name)
+                    if entry is None:
+                        yield "Ошибка в команде. Введите HELP для справки."
+                        continue
+                handler, collect = entry
+                if metrics is not None:
+                    calls[name] += 1
+                    countdown -= 1
+                    sampled = not countdown
+                    timed = sampled or time_all
+                    if sampled:
+                        countdown = sample
+                if collect is not None:
+                    result = collect(self, pending, parts[1:])
+                    if result is None:
+                        dirty = True
+                        # запись учитывается после применения пачки, ошибка разбора не замеряется
+                        if metrics is not None:
+                            if sampled:
+                                sampled_writes.append(len(writes))
+                            writes.append(parts)
+                    yield result
+                    continue
+                if dirty:
+                    flush()
+                    dirty = False
+                if timed:
+                    start = perf_counter_ns()
+                result = handler(self, parts[1:])
+                if timed:
+                    self.__record(name, parts[1:], perf_counter_ns() - start, sampled)
+                yield result
+                if result == "END":
+                    return
+        finally:
+            if metrics is not None:
+                metrics.countdown = countdown
+            if dirty:
+                flush()
+
+    def __record(self, name: str, args: Sequence[str], ns: int, sampled: bool) -> None:
+        # в гистограмму идет каждая sample-я команда, порог журнала медленных команд проверяется у всех
+        if sampled:
+            self.metrics.record(name, args, ns)
+        elif ns >= self.metrics.slow_ns:
+            self.metrics.slowlog.add(name, args, ns)
+        return None
+
+    def __collect_set(self, pending: Layer, args: Sequence[str]) -> str | None:
+        if len(args) == 2:
+            pending.set(args[0], args[1])
+            return None
+        if len(args) != 4:
+            return "SET требует 2 аргумента."
+        seconds = self.__parse_ttl(args[2], args[3])
+        if isinstance(seconds, str):
+            return seconds
+        if not self.database.supports_ttl():
+            return TTL_UNSUPPORTED
+        pending.set(args[0], args[1])
+        pending.expire(args[0], seconds)
+        return None
+
+    def __collect_unset(self, pending: Layer, args: Sequence[str]) -> str | None:
+        if len(args) != 1:
+            return "UNSET требует 1 аргумент."
+        pending.unset(args[0])
+        return None
+
+    def __collect_mset(self, pending: Layer, args: Sequence[str]) -> str | None:
+        if len(args) == 0 or len(args) % 2 != 0:
+            return "MSET требует пары аргументов (name value)."
+        for i in range(0, len(args), 2):
+            pending.set(args[i], args[i + 1])
+        return None
 
     def __handle_set(self, args: list[str]) -> str | None:
         if len(args) != 2:
-            return "SET требует 2 аргумента."
+            # SET с временем жизни применяется одним слоем: значение и срок фиксируются вместе
+            layer = Layer()
+            error = self.__collect_set(layer, args)
+            if error is not None:
+                return error
+            return self.database.apply(layer)
         k, v = args
         self.database.set(k, v)
         return None
 
+    def __parse_ttl(self, option: str, amount: str) -> float | str:
+        unit = TTL_UNITS.get(option.upper())
+        if unit is None:
+            return "SET поддерживает только параметры EX seconds и PX milliseconds."
+        if not amount.isdecimal() or int(amount) == 0:
+            return "Время жизни должно быть положительным целым числом."
+        return int(amount) * unit
+
     def __handle_get(self, args: list[str]) -> str:
         if len(args) != 1:
             return "GET требует 1 аргумент."
@@ -56,19 +280,349 @@ class CommandHandler:
         return self.database.counts(k)
 
     def __handle_find(self, args: list[str]) -> str:
+        if len(args) == 0:
+            return "FIND требует значение (формат FIND value [LIMIT n] [CURSOR c])."
+        if len(args) == 1:
+            return self.database.find(args[0])
+        options = self.__parse_options(args[1:], ("LIMIT", "CURSOR"))
+        if isinstance(options, str):
+            return options
+        after = decode_cursor(options.get("CURSOR", "0"))
+        if after is None:
+            return "Неверный курсор FIND."
+        # страница - следующие по возрастанию ключи после курсора, первым словом идет курсор следующей страницы
+        value = args[0]
+        limit = options.get("LIMIT", SCAN_COUNT)
+        pages = self.__find_pages
+        if after and pages is not None and pages[0] == value and pages[1] == after:
+            return self.__next_find_page(value, after, limit, pages[2], pages[3])
+        keys = self.database.iter_find(value)
+        page = heapq.nsmallest(limit + 1, (k for k in keys if k > after) if after else keys)
+        self.__find_pages = None
+        if len(page) <= limit:
+            return " ".join(["0", *page])
+        page = page[:limit]
+        # отсортированный остаток строится, только если клиент действительно попросит следующую страницу
+        self.__find_pages = (value, page[-1], None, 0)
+        return " ".join([page[-1].encode().hex(), *page])
+
+    def __next_find_page(self, value: str, after: str, limit: int, rest: list[str] | None, start: int) -> str:
+        # остаток обхода сортируется один раз, дальше страницы берутся из него без повторного просмотра совпадений;
+        # ключи, потерявшие значение после сортировки, пропускаются, новые ключи с этим значением могут не попасть
+        if rest is None:
+            rest = sorted(k for k in self.database.iter_find(value) if k > after)
+        lookup = self.database.lookup
+        page = []
+        while start < len(rest) and len(page) < limit:
+            k = rest[start]
+            start += 1
+            if lookup(k) == value:
+                page.append(k)
+        if start == len(rest):
+            self.__find_pages = None
+            return " ".join(["0", *page])
+        self.__find_pages = (value, page[-1], rest, start)
+        return " ".join([page[-1].encode().hex(), *page])
+
+    def __stream_find(self, args: list[str]) -> str | Iterator[str]:
         if len(args) != 1:
-            return "FIND требует 1 аргумент."
+            return self.__handle_find(args)
+        return self.__find_chunks(self.database.iter_find(args[0]))
+
+    def __find_chunks(self, keys: Iterator[str]) -> Iterator[str]:
+        separator = ""
+        while True:
+            chunk = list(islice(keys, STREAM_CHUNK))
+            if not chunk:
+                return
+            yield separator + " ".join(chunk)
+            separator = " "
+
+    def __handle_countrange(self, args: list[str]) -> int | str:
+        bounds = self.__parse_bounds("COUNTRANGE", args)
+        if isinstance(bounds, str):
+            return bounds
+        return self.database.count_range(*bounds)
+
+    def __handle_findrange(self, args: list[str]) -> str:
+        bounds = self.__parse_bounds("FINDRANGE", args)
+        if isinstance(bounds, str):
+            return bounds
+        # ключи идут по (число, ключ), как в числовом индексе, чтобы порядок не зависел от PYTHONHASHSEED
+        # и был одинаковым с индексом, без него и в транзакции
+        lookup = self.database.lookup
+        found = []
+        for k in self.database.find_range(*bounds):
+            v = lookup(k)
+            if v is not None:
+                found.append((to_number(v), k))
+        found.sort()
+        return " ".join(k for _, k in found)
+
+    def __parse_bounds(self, command: str, args: list[str]) -> tuple[float, float] | str:
+        if len(args) != 2:
+            return f"{command} требует 2 аргумента (формат {command} min max)."
+        # границы включаются, кроме отмеченных "(", и приводятся к полуинтервалу [lo, hi)
+        bounds = []
+        for bound, upper in zip(args, (False, True)):
+            exclusive = bound.startswith("(")
+            try:
+                n = float(bound[1:] if exclusive else bound)
+            except ValueError:
+                n = math.nan
+            if math.isnan(n):
+                return "Границы диапазона должны быть числами, -inf или +inf; ( перед числом исключает границу."
+            if exclusive != upper:
+                n = math.nextafter(n, math.inf)
+            bounds.append(n)
+        return bounds[0], bounds[1]
+
+    def __handle_mset(self, args: list[str]) -> str | None:
+        layer = Layer()
+        error = self.__collect_mset(layer, args)
+        if error is not None:
+            return error
+        return self.database.apply(layer)
+
+    def __handle_mget(self, args: list[str]) -> str:
+        if len(args) == 0:
+            return "MGET требует хотя бы 1 аргумент."
+        return " ".join(self.database.get(k) for k in args)
+
+    def __handle_scan(self, args: list[str]) -> str:
+        if len(args) == 0:
+            return "SCAN требует курсор (формат SCAN cursor [MATCH prefix] [COUNT n])."
+        options = self.__parse_options(args[1:], ("MATCH", "COUNT"))
+        if isinstance(options, str):
+            return options
+        lo = decode_cursor(args[0])
+        if lo is None:
+            return "Неверный курсор SCAN."
+        if lo:
+            lo += "\0"
+        prefix = options.get("MATCH", "").removesuffix("*")
+        if lo < prefix:
+            lo = prefix
+        count = options.get("COUNT", SCAN_COUNT)
+        keys = list(islice(self.database.key_range(lo or None, prefix_end(prefix)), count + 1))
+        cursor = "0"
+        if len(keys) > count:
+            keys = keys[:count]
+            cursor = keys[-1].encode().hex()
+        return " ".join([cursor, *keys])
+
+    def __handle_keys(self, args: list[str]) -> str:
+        if len(args) != 1:
+            return "KEYS требует 1 аргумент (формат KEYS prefix)."
+        prefix = args[0].removesuffix("*")
+        return " ".join(self.database.key_range(prefix or None, prefix_end(prefix)))
+
+    def __handle_range(self, args: list[str]) -> str:
+        if len(args) < 2:
+            return "RANGE требует 2 аргумента (формат RANGE start stop [COUNT n])."
+        options = self.__parse_options(args[2:], ("COUNT",))
+        if isinstance(options, str):
+            return options
+        keys = self.database.key_range(args[0], args[1] + "\0")
+        return " ".join(islice(keys, options.get("COUNT")))
+
+    def __parse_options(self, args: list[str], names: tuple[str, ...]) -> dict[str, str | int] | str:
+        if len(args) % 2 != 0:
+            return f"Параметры задаются парами: {' '.join(f'[{name} value]' for name in names)}."
+        options: dict[str, str | int] = {}
+        for i in range(0, len(args), 2):
+            name, value = args[i].upper(), args[i + 1]
+            if name not in names:
+                return f"Неизвестный параметр {args[i]}."
+            if name in ("COUNT", "LIMIT"):
+                if not value.isdecimal() or int(value) == 0:
+                    return f"{name} должен быть положительным целым числом."
+                value = int(value)
+            options[name] = value
+        return options
+
+    def __handle_ttl(self, args: list[str]) -> int | str:
+        if len(args) != 1:
+            return "TTL требует 1 аргумент."
         k = args[0]
-        return self.database.find(k)
+        if self.database.lookup(k) is None:
+            return -2
+        seconds = self.database.ttl(k)
+        if seconds is None:
+            return -1
+        return math.ceil(seconds)
+
+    def __handle_persist(self, args: list[str]) -> str | None:
+        if len(args) != 1:
+            return "PERSIST требует 1 аргумент."
+        if not self.database.supports_ttl():
+            return TTL_UNSUPPORTED
+        return self.database.expire(args[0], None)
+
+    def __handle_save(self, args: list[str]) -> str | None:
+        path = self.__snapshot_arg(args)
+        if path is None:
+            return "SAVE требует путь к файлу снимка (формат SAVE path)."
+        try:
+            if self.log is not None and len(args) == 0:
+                # снимок по пути по умолчанию покрывает весь журнал, журнал можно сжать
+                self.log.compact(self.database, path)
+            else:
+                from snapshot import save_snapshot
+
+                save_snapshot(self.database.items(), path, self.database.expirations())
+        except OSError as e:
+            return f"Не удалось сохранить снимок: {e}"
+        return None
 
-    def __handle_help(self) -> str:
-        return "Команды:\nSET - сохраняет аргумент в базе данных (формат SET name value).\nGET - возвращает, ранее сохраненную переменную (формат GET name). Если такой переменной не было сохранено, возвращает NULL.\nUNSET - удаляет, ранее установленную переменную (формат UNSET name). Если значение не было установлено, не делает ничего.\nCOUNTS - показывает сколько раз данные значение встречается в базе данных (формат COUNTS name).\nFIND - выводит найденные установленные переменные для данного значения (Формат FIND name).\nEND - закрывает приложение.\nBEGIN - начало транзакции.\nROLLBACK - откат текущей (самой внутренней) транзакции.\nCOMMIT - фиксация изменений текущей (самой внутренней) транзакции."
+    def __handle_load(self, args: list[str]) -> str | None:
+        path = self.__snapshot_arg(args)
+        if path is None:
+            return "LOAD требует путь к файлу снимка (формат LOAD path)."
+        from snapshot import load_snapshot
 
-    def __handle_begin(self):
+        try:
+            return load_snapshot(self.database, path)
+        except (OSError, ValueError) as e:
+            return f"Не удалось загрузить снимок: {e}"
+
+    def __snapshot_arg(self, args: list[str]) -> str | None:
+        if len(args) == 1:
+            return args[0]
+        if len(args) == 0:
+            return self.snapshot_path
+        return None
+
+    def __handle_info(self, args: list[str]) -> str:
+        if len(args) > 1:
+            return "INFO принимает не больше 1 аргумента (формат INFO [section])."
+        sections: dict[str, dict[str, object]] = {}
+        if self.metrics is not None:
+            sections["server"] = {"uptime_seconds": self.metrics.uptime()}
+        sections["database"] = self.database.stats()
+        if self.metrics is not None:
+            for name, fields in self.metrics.sections.items():
+                sections[name] = fields()
+            sections["commandstats"] = self.metrics.command_stats()
+        if args:
+            name = args[0].lower()
+            if name not in sections:
+                return f"Неизвестная секция INFO: {args[0]}."
+            sections = {name: sections[name]}
+        lines = []
+        for name, fields in sections.items():
+            lines.append(f"# {name.capitalize()}")
+            lines += [f"{k}:{'' if v is None else v}" for k, v in fields.items()]
+        return "\n".join(lines)
+
+    def __handle_slowlog(self, args: list[str]) -> str | int | None:
+        if self.metrics is None:
+            return "Метрики выключены."
+        slowlog = self.metrics.slowlog
+        action = args[0].upper() if args else ""
+        if action == "GET" and len(args) <= 2:
+            if len(args) == 2 and not args[1].isdecimal():
+                return "SLOWLOG GET принимает число записей."
+            count = int(args[1]) if len(args) == 2 else 10
+            return "\n".join(
+                f"{entry_id} {timestamp} {duration_us} {text}"
+                for entry_id, timestamp, duration_us, text in islice(slowlog.entries, count)
+            )
+        if action == "LEN" and len(args) == 1:
+            return len(slowlog.entries)
+        if action == "RESET" and len(args) == 1:
+            return slowlog.reset()
+        return "Формат SLOWLOG GET [count] | SLOWLOG LEN | SLOWLOG RESET."
+
+    def __handle_watch(self, args: list[str]) -> str | None:
+        return self.__watch("WATCH", args)
+
+    def __handle_watch_value(self, args: list[str]) -> str | None:
+        return self.__watch("WATCH-VALUE", args)
+
+    def __handle_watch_prefix(self, args: list[str]) -> str | None:
+        return self.__watch("WATCH-PREFIX", args)
+
+    def __watch(self, command: str, args: list[str]) -> str | None:
+        if self.feed is None:
+            return "Подписки на изменения доступны только в режиме сервера."
+        if len(args) != 1:
+            return f"{command} требует 1 аргумент."
+        if self.subscription is None or self.subscription.closed:
+            self.subscription = self.feed.subscribe()
+        if command == "WATCH":
+            return self.feed.watch_key(self.subscription, args[0])
+        if command == "WATCH-VALUE":
+            return self.feed.watch_value(self.subscription, args[0])
+        return self.feed.watch_prefix(self.subscription, args[0].removesuffix("*"))
+
+    def __handle_unwatch(self, args: list[str]) -> str | None:
+        if self.subscription is not None:
+            self.feed.unsubscribe(self.subscription)
+            self.subscription = None
+        return None
+
+    def __handle_help(self, args: list[str]) -> str:
+        return "Команды:\nSET - сохраняет аргумент в базе данных (формат SET name value [EX seconds | PX milliseconds]), с EX/PX ключ удаляется по истечении времени жизни.\nGET - возвращает, ранее сохраненную переменную (формат GET name). Если такой переменной не было сохранено, возвращает NULL.\nUNSET - удаляет, ранее установленную переменную (формат UNSET name). Если значение не было установлено, не делает ничего.\nCOUNTS - показывает сколько раз данные значение встречается в базе данных (формат COUNTS name).\nFIND - выводит найденные установленные переменные для данного значения (Формат FIND name [LIMIT n] [CURSOR c]), с LIMIT/CURSOR - страница ключей по возрастанию, первым словом идет курсор следующей страницы, 0 - последняя страница.\nCOUNTRANGE - сколько значений в базе - числа из диапазона (формат COUNTRANGE min max, границы включаются, (min исключает границу, допускаются -inf и +inf).\nFINDRANGE - ключи с числовыми значениями из диапазона по возрастанию значения (формат FINDRANGE min max).\nMSET - сохраняет несколько переменных за раз (формат MSET name1 value1 name2 value2 ...).\nMGET - возвращает значения нескольких переменных через пробел (формат MGET name1 name2 ...).\nTTL - оставшееся время жизни ключа в секундах (формат TTL name), -1 если время жизни не задано, -2 если ключа нет.\nPERSIST - снимает время жизни ключа (формат PERSIST name).\nSCAN - постраничный обход ключей по возрастанию (формат SCAN cursor [MATCH prefix] [COUNT n]), возвращает следующий курсор и ключи, курсор 0 - начало и конец обхода.\nKEYS - все ключи с данным префиксом по возрастанию (формат KEYS prefix).\nRANGE - ключи от start до stop включительно по возрастанию (формат RANGE start stop [COUNT n]).\nINFO - состояние базы и статистика команд (формат INFO [section]).\nSLOWLOG - журнал медленных команд (формат SLOWLOG GET [count] | SLOWLOG LEN | SLOWLOG RESET).\nWATCH - подписка на зафиксированные изменения ключа (формат WATCH name), только в режиме сервера.\nWATCH-VALUE - подписка на ключи, получающие или теряющие значение (формат WATCH-VALUE value).\nWATCH-PREFIX - подписка на изменения ключей с префиксом (формат WATCH-PREFIX prefix).\nUNWATCH - отменяет все подписки соединения.\nSAVE - сохраняет базу в файл снимка (формат SAVE path, путь можно не указывать, если задан --snapshot).\nLOAD - заменяет содержимое базы данными из файла снимка (формат LOAD path).\nEND - закрывает приложение.\nBEGIN - начало транзакции.\nROLLBACK - откат текущей (самой внутренней) транзакции.\nCOMMIT - фиксация изменений текущей (самой внутренней) транзакции."
+
+    def __handle_begin(self, args: list[str]):
         return self.database.begin()
 
-    def __handle_rollback(self):
+    def __handle_rollback(self, args: list[str]):
         return self.database.rollback()
 
-    def __handle_commit(self):
+    def __handle_commit(self, args: list[str]):
         return self.database.commit()
+
+    def __handle_read_only(self, args: list[str]) -> str:
+        return "Реплика доступна только для чтения."
+
+    def __handle_end(self, args: list[str]) -> str:
+        return "END"
+
+    # обработчики - функции класса, вызываются как handler(self, args)
+    __all_commands = {
+        "SET": __handle_set,
+        "GET": __handle_get,
+        "UNSET": __handle_unset,
+        "COUNTS": __handle_counts,
+        "FIND": __handle_find,
+        "COUNTRANGE": __handle_countrange,
+        "FINDRANGE": __handle_findrange,
+        "MSET": __handle_mset,
+        "MGET": __handle_mget,
+        "TTL": __handle_ttl,
+        "SCAN": __handle_scan,
+        "KEYS": __handle_keys,
+        "RANGE": __handle_range,
+        "PERSIST": __handle_persist,
+        "SAVE": __handle_save,
+        "LOAD": __handle_load,
+        "INFO": __handle_info,
+        "SLOWLOG": __handle_slowlog,
+        "WATCH": __handle_watch,
+        "WATCH-VALUE": __handle_watch_value,
+        "WATCH-PREFIX": __handle_watch_prefix,
+        "UNWATCH": __handle_unwatch,
+        "HELP": __handle_help,
+        "BEGIN": __handle_begin,
+        "ROLLBACK": __handle_rollback,
+        "COMMIT": __handle_commit,
+        "END": __handle_end,
+    }
+    __read_only_commands = {
+        **__all_commands,
+        **dict.fromkeys(__all_commands.keys() - READ_COMMANDS, __handle_read_only),
+    }
+    # пакетный режим: имя -> (обработчик, сборщик); команды со сборщиком накапливаются в один слой записи
+    __batch = {
+        **{name: (handler, None) for name, handler in __all_commands.items()},
+        "SET": (__handle_set, __collect_set),
+        "UNSET": (__handle_unset, __collect_unset),
+        "MSET": (__handle_mset, __collect_mset),
+    }
+    __read_only_batch = {name: (handler, None) for name, handler in __read_only_commands.items()}
+    # команды, ответ которых можно отдавать кусками: итератор строк вместо одной строки
+    __streams = {"FIND": __stream_find}
+    __streaming_batch = {**__batch, "FIND": (__stream_find, None)}
+    __read_only_streaming_batch = {**__read_only_batch, "FIND": (__stream_find, None)}
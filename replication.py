@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import struct
+import time
+from collections.abc import Callable
+from multiprocessing import shared_memory
+
+from aof import OP_CLEAR, RecordListener, apply_record, encode_expire, encode_set
+from database import RAMDatabase
+from interfaces import DataBaseAbstractClass
+
+# заголовок кольца: позиция записи, число опубликованных записей, емкость, число читателей,
+# затем для каждого читателя позиция чтения и число примененных записей
+_U64 = struct.Struct("<Q")
+_LEN = struct.Struct("<I")
+_WRITE_POS = 0
+_PUBLISHED = 8
+_CAPACITY = 16
+_READERS = 24
+_READER_SLOTS = 32
+_READER_SLOT_SIZE = 16
+# записи выравниваются на 8 байт, поэтому в конце кольца всегда помещается маркер переноса
+_ALIGN = 8
+_WRAP = 0xFFFFFFFF
+# бит длины: за частью следует продолжение той же записи
+_MORE = 0x80000000
+# пауза реплики, когда новых записей нет, секунды
+POLL_INTERVAL = 0.0005
+# сколько секунд основной процесс ждет места в кольце, прежде чем отключить отставшую реплику
+STALL_TIMEOUT = 5.0
+
+
+def _header_size(readers: int) -> int:
+    size = _READER_SLOTS + readers * _READER_SLOT_SIZE
+    return (size + 63) // 64 * 64
+
+
+class RingBuffer:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        self.capacity = _U64.unpack_from(self.buf, _CAPACITY)[0]
+        self.readers = _U64.unpack_from(self.buf, _READERS)[0]
+        self.data = _header_size(self.readers)
+        # части записи больше половины кольца режутся так, чтобы любая часть дождалась места
+        self.fragment = self.capacity // 2 // _ALIGN * _ALIGN - _LEN.size
+        self.timeout = STALL_TIMEOUT
+        # проверка, что процесс читателя жив, и реакция на его отключение задаются владельцем
+        self.alive: Callable[[int], bool] | None = None
+        self.on_detach: Callable[[int], None] | None = None
+        self.detached: set[int] = set()
+        self.__partial: list[bytes] = []
+
+    @classmethod
+    def create(cls, capacity: int, readers: int) -> RingBuffer:
+        capacity = (capacity + _ALIGN - 1) // _ALIGN * _ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=_header_size(readers) + capacity)
+        shm.buf[:_header_size(readers)] = bytes(_header_size(readers))
+        _U64.pack_into(shm.buf, _CAPACITY, capacity)
+        _U64.pack_into(shm.buf, _READERS, readers)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> RingBuffer:
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # до Python 3.13: реплики запускаются через multiprocessing и делят resource_tracker
+            # с основным процессом, поэтому сегмент будет удален один раз - владельцем
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def published(self) -> int:
+        return _U64.unpack_from(self.buf, _PUBLISHED)[0]
+
+    def applied(self, reader: int) -> int:
+        return _U64.unpack_from(self.buf, self.__slot(reader) + 8)[0]
+
+    def publish(self, body: bytes) -> None:
+        # запись больше части уходит несколькими частями, реплика применит ее только целиком
+        view = memoryview(body)
+        offset = 0
+        while len(body) - offset > self.fragment:
+            self.__put(view[offset:offset + self.fragment], _MORE)
+            offset += self.fragment
+        self.__put(view[offset:], 0)
+        return None
+
+    def detach(self, reader: int) -> None:
+        # отключенный читатель больше не держит место в кольце
+        if reader not in self.detached:
+            self.detached.add(reader)
+            if self.on_detach is not None:
+                self.on_detach(reader)
+        return None
+
+    def consume(self, reader: int, apply: Callable[[bytes], None], limit: int = 1024) -> int:
+        slot = self.__slot(reader)
+        pos = _U64.unpack_from(self.buf, slot)[0]
+        applied = _U64.unpack_from(self.buf, slot + 8)[0]
+        end = _U64.unpack_from(self.buf, _WRITE_POS)[0]
+        done = 0
+        while pos < end and done < limit:
+            offset = pos % self.capacity
+            (size,) = _LEN.unpack_from(self.buf, self.data + offset)
+            if size == _WRAP:
+                pos += self.capacity - offset
+                continue
+            more, size = size & _MORE, size & ~_MORE
+            start = self.data + offset + _LEN.size
+            body = bytes(self.buf[start:start + size])
+            pos += (_LEN.size + size + _ALIGN - 1) // _ALIGN * _ALIGN
+            if more:
+                self.__partial.append(body)
+            else:
+                if self.__partial:
+                    self.__partial.append(body)
+                    body = b"".join(self.__partial)
+                    self.__partial = []
+                apply(body)
+                applied += 1
+                done += 1
+            _U64.pack_into(self.buf, slot + 8, applied)
+            _U64.pack_into(self.buf, slot, pos)
+        return done
+
+    def close(self) -> None:
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        return None
+
+    def __slot(self, reader: int) -> int:
+        return _READER_SLOTS + reader * _READER_SLOT_SIZE
+
+    def __put(self, chunk: memoryview, more: int) -> None:
+        size = (_LEN.size + len(chunk) + _ALIGN - 1) // _ALIGN * _ALIGN
+        pos = _U64.unpack_from(self.buf, _WRITE_POS)[0]
+        offset = pos % self.capacity
+        skip = self.capacity - offset if offset + size > self.capacity else 0
+        # ждем, пока самая медленная реплика освободит место; упавшую или зависшую дольше
+        # timeout реплику отключаем, чтобы основной процесс не встал вместе с ней
+        deadline = None
+        while pos + skip + size - self.__min_read_pos() > self.capacity:
+            if deadline is None:
+                deadline = time.monotonic() + self.timeout
+            self.__drop_stalled(pos + skip + size - self.capacity, time.monotonic() > deadline)
+            time.sleep(POLL_INTERVAL)
+        if skip:
+            _LEN.pack_into(self.buf, self.data + offset, _WRAP)
+            pos += skip
+            offset = 0
+        start = self.data + offset
+        _LEN.pack_into(self.buf, start, len(chunk) | more)
+        self.buf[start + _LEN.size:start + _LEN.size + len(chunk)] = chunk
+        # позиция записи обновляется последней: читатель видит только полностью записанные данные
+        if not more:
+            _U64.pack_into(self.buf, _PUBLISHED, self.published() + 1)
+        _U64.pack_into(self.buf, _WRITE_POS, pos + size)
+        return None
+
+    def __drop_stalled(self, needed: int, expired: bool) -> None:
+        for reader in range(self.readers):
+            if reader in self.detached or _U64.unpack_from(self.buf, self.__slot(reader))[0] >= needed:
+                continue
+            if expired or (self.alive is not None and not self.alive(reader)):
+                self.detach(reader)
+        return None
+
+    def __min_read_pos(self) -> int:
+        return min(
+            (_U64.unpack_from(self.buf, self.__slot(i))[0] for i in range(self.readers) if i not in self.detached),
+            default=_U64.unpack_from(self.buf, _WRITE_POS)[0],
+        )
+
+
+class ReplicationPublisher(RecordListener):
+    def __init__(self, ring: RingBuffer):
+        super().__init__()
+        self.ring = ring
+
+    def append(self, body: bytes) -> None:
+        self.ring.publish(body)
+        return None
+
+    def on_load(self, database: DataBaseAbstractClass) -> None:
+        self.resync(database)
+        return None
+
+    def resync(self, database: DataBaseAbstractClass) -> None:
+        self.ring.publish(OP_CLEAR)
+        for k, v in database.items():
+            self.ring.publish(encode_set(k, v))
+        for k, deadline in database.expirations():
+            self.ring.publish(encode_expire(k, deadline))
+        return None
+
+
+def run_replica(shm_name: str, reader: int, host: str, port: int, ports) -> None:
+    from server import Server
+
+    ring = RingBuffer.attach(shm_name)
+    database = RAMDatabase()
+
+    def apply(body: bytes) -> None:
+        apply_record(body, database)
+
+    async def main() -> None:
+        server = Server(database, read_only=True)
+        listener = await asyncio.start_server(server.handle, host, port)
+        ports.put((reader, listener.sockets[0].getsockname()[1]))
+        async with listener:
+            # поток изменений применяется в том же цикле событий, что и чтения
+            while True:
+                if not ring.consume(reader, apply):
+                    await asyncio.sleep(POLL_INTERVAL)
+                else:
+                    await asyncio.sleep(0)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+
+class ReplicaSet:
+    def __init__(self, database: RAMDatabase, workers: int, capacity: int = 16 << 20):
+        self.database = database
+        self.ring = RingBuffer.create(capacity, workers)
+        self.publisher = ReplicationPublisher(self.ring)
+        self.processes: list[multiprocessing.Process] = []
+        self.ports: list[int] = []
+        self.workers = workers
+
+    def start(self, host: str = "127.0.0.1", base_port: int = 0, timeout: float = 30.0) -> list[int]:
+        ctx = multiprocessing.get_context("spawn")
+        ports = ctx.Queue()
+        for reader in range(self.workers):
+            port = base_port + reader if base_port else 0
+            process = ctx.Process(
+                target=run_replica,
+                args=(self.ring.name, reader, host, port, ports),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+        found = dict(ports.get(timeout=timeout) for _ in range(self.workers))
+        self.ports = [found[reader] for reader in range(self.workers)]
+        self.ring.alive = lambda reader: self.processes[reader].is_alive()
+        self.ring.on_detach = self.__detach
+        # начальное состояние уходит в поток тем же путем, что и последующие изменения
+        self.publisher.resync(self.database)
+        self.database.add_listener(self.publisher)
+        return self.ports
+
+    def lag(self) -> list[int]:
+        published = self.ring.published()
+        return [published - self.ring.applied(reader) for reader in range(self.workers)]
+
+    def info(self) -> dict[str, object]:
+        return {
+            "replicas": self.workers,
+            "ports": ",".join(map(str, self.ports)),
+            "published_records": self.ring.published(),
+            "replica_lag": ",".join(map(str, self.lag())),
+            "detached_replicas": ",".join(map(str, sorted(self.ring.detached))),
+        }
+
+    def wait_caught_up(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while any(lag for reader, lag in enumerate(self.lag()) if reader not in self.ring.detached):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Реплики не догнали основной процесс.")
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def close(self) -> None:
+        self.database.remove_listener(self.publisher)
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.ring.close()
+        return None
+
+    def __detach(self, reader: int) -> None:
+        # отключенная реплика пропустила изменения и не должна отдавать устаревшие данные
+        self.processes[reader].terminate()
+        return None
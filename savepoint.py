@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from heapq import merge
+from itertools import chain, filterfalse
+
+from interfaces import (
+    DataBaseAbstractClass,
+    count_shadowed,
+    count_shadowed_range,
+    exclude,
+    in_number_range,
+    in_range,
+)
+from layer import TOMBSTONE, Layer
+
+
+class _Absent:
+    __slots__ = ()
+
+
+# отметка в журнале отката: времени жизни у ключа в транзакции не было
+_ABSENT = _Absent()
+
+
+class SavepointDatabase(DataBaseAbstractClass):
+    # транзакции на журнале отката: все уровни вложенности пишут в один общий слой,
+    # BEGIN запоминает длину журнала, вложенный COMMIT только снимает отметку,
+    # ROLLBACK возвращает ключам значения из журнала до отметки
+    def __init__(self, database: DataBaseAbstractClass):
+        self.database = database
+        # итоговые изменения всех открытых транзакций относительно базы
+        self.__layer = Layer()
+        # счетчик изменений закрепленных ключей базы на момент BEGIN верхнего уровня
+        self.__pinned_changes: int | None = None
+        # ключ, его запись и время жизни в слое до изменения (None - ключа в слое не было)
+        self.__undo: list[tuple[str, object, object]] = []
+        # длина журнала отката на момент каждого BEGIN
+        self.savepoints: list[int] = []
+
+    @property
+    def depth(self) -> int:
+        return len(self.savepoints)
+
+    def set(self, k: str, v: str) -> None:
+        if not self.savepoints:
+            return self.database.set(k, v)
+        self.__write(k, v)
+        return None
+
+    def get(self, k: str) -> str:
+        layer = self.__layer
+        v = layer.writes.get(k)
+        if v is not None:
+            return v
+        if k in layer.deletes:
+            return "NULL"
+        return self.database.get(k)
+
+    def lookup(self, k: str) -> str | None:
+        layer = self.__layer
+        v = layer.writes.get(k)
+        if v is not None or k in layer.deletes:
+            return v
+        return self.database.lookup(k)
+
+    def unset(self, k: str) -> None:
+        if not self.savepoints:
+            return self.database.unset(k)
+        self.__write(k, TOMBSTONE)
+        return None
+
+    def apply(self, layer: Layer) -> None:
+        if not self.savepoints:
+            return self.database.apply(layer)
+        for k in layer.deletes:
+            self.__write(k, TOMBSTONE)
+        for k, v in layer.writes.items():
+            self.__write(k, v)
+        for k, seconds in layer.expires.items():
+            self.expire(k, seconds)
+        return None
+
+    def expire(self, k: str, seconds: float | None) -> str | None:
+        if not self.savepoints:
+            return self.database.expire(k, seconds)
+        if self.lookup(k) is None:
+            return None
+        # время жизни из транзакции начинает отсчитываться при фиксации
+        self.__remember(k)
+        self.__layer.expire(k, seconds)
+        return None
+
+    def expire_at(self, k: str, deadline: float | None) -> str | None:
+        # абсолютные сроки приходят из снимка при LOAD, который внутри транзакции запрещен
+        if self.savepoints:
+            return "Абсолютный срок жизни недоступен внутри транзакции."
+        return self.database.expire_at(k, deadline)
+
+    def supports_ttl(self) -> bool:
+        return self.database.supports_ttl()
+
+    def ttl(self, k: str) -> float | None:
+        layer = self.__layer
+        if k in layer.expires:
+            return layer.expires[k]
+        if k in layer:
+            return None
+        return self.database.ttl(k)
+
+    def counts(self, v: str) -> int:
+        layer = self.__layer
+        _ = self.database.counts(v)
+        if self.__base_unchanged():
+            return _ + len(layer.added.get(v, ())) - len(layer.removed.get(v, ()))
+        return _ - count_shadowed(self.database, v, layer) + sum(w == v for w in layer.writes.values())
+
+    def find(self, v: str) -> str:
+        if not self.savepoints:
+            return self.database.find(v)
+        # порядок как у базы, ключи, получившие значение в транзакции, - следом в порядке записи
+        return " ".join(self.__iter_find(v))
+
+    def find_keys(self, v: str) -> set[str]:
+        layer = self.__layer
+        keys = self.database.find_keys(v)
+        if self.__base_unchanged():
+            keys.difference_update(layer.removed.get(v, ()))
+            keys.update(layer.added.get(v, ()))
+            return keys
+        keys = exclude(keys, layer)
+        keys.update(k for k, w in layer.writes.items() if w == v)
+        return keys
+
+    def iter_find(self, v: str) -> Iterator[str]:
+        if not self.savepoints:
+            return self.database.iter_find(v)
+        return self.__iter_find(v)
+
+    def __iter_find(self, v: str) -> Iterator[str]:
+        layer = self.__layer
+        if not self.__base_unchanged():
+            return chain(
+                filterfalse(layer.__contains__, self.database.iter_find(v)),
+                [k for k, w in layer.writes.items() if w == v],
+            )
+        # в одном слое added/removed - итог по ключу: потерявшие v скрываются из базы,
+        # получившие v в базе его не имели и идут следом в порядке записи
+        removed = layer.removed.get(v)
+        keys = self.database.iter_find(v)
+        return chain(filterfalse(removed.__contains__, keys) if removed else keys, list(layer.added.get(v, ())))
+
+    def count_range(self, lo: float, hi: float) -> int:
+        layer = self.__layer
+        _ = self.database.count_range(lo, hi)
+        if self.__base_unchanged():
+            _ += sum(len(keys) for v, keys in layer.added.items() if in_number_range(v, lo, hi))
+            _ -= sum(len(keys) for v, keys in layer.removed.items() if in_number_range(v, lo, hi))
+            return _
+        _ -= count_shadowed_range(self.database, lo, hi, layer)
+        return _ + sum(1 for w in layer.writes.values() if in_number_range(w, lo, hi))
+
+    def find_range(self, lo: float, hi: float) -> set[str]:
+        layer = self.__layer
+        keys = self.database.find_range(lo, hi)
+        if self.__base_unchanged():
+            for v, removed in layer.removed.items():
+                if in_number_range(v, lo, hi):
+                    keys.difference_update(removed)
+            for v, added in layer.added.items():
+                if in_number_range(v, lo, hi):
+                    keys.update(added)
+            return keys
+        keys = exclude(keys, layer)
+        keys.update(k for k, w in layer.writes.items() if in_number_range(w, lo, hi))
+        return keys
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        return self.database.items()
+
+    def stats(self) -> dict[str, object]:
+        stats = self.database.stats()
+        layer = self.__layer
+        if len(layer):
+            lookup = self.database.lookup
+            stats["keys"] += sum((v is not TOMBSTONE) - (lookup(k) is not None) for k, v in layer.items())
+        stats["transaction_depth"] = len(self.savepoints)
+        stats["transaction_keys"] = len(layer)
+        stats["undo_log"] = len(self.__undo)
+        return stats
+
+    def key_range(self, lo: str | None = None, hi: str | None = None) -> Iterator[str]:
+        keys = self.database.key_range(lo, hi)
+        layer = self.__layer
+        if not len(layer):
+            return keys
+        written = sorted(k for k in layer.writes if in_range(k, lo, hi))
+        return self.__visible(merge(keys, written))
+
+    def __visible(self, keys: Iterator[str]) -> Iterator[str]:
+        deletes = self.__layer.deletes
+        last = None
+        for k in keys:
+            if k != last and k not in deletes:
+                yield k
+            last = k
+
+    def expirations(self) -> Iterator[tuple[str, float]]:
+        return self.database.expirations()
+
+    def load(self, items: Iterable[tuple[str, str]]) -> str | None:
+        if self.savepoints:
+            return "LOAD недоступен внутри транзакции."
+        return self.database.load(items)
+
+    def begin(self) -> None:
+        if not self.savepoints:
+            self.database.begin()
+            self.__pinned_changes = self.database.pinned_changes()
+        self.savepoints.append(len(self.__undo))
+        return None
+
+    def rollback(self) -> None:
+        if len(self.savepoints) == 1:
+            self.savepoints.pop()
+            layer = self.__finish()
+            self.database.rollback()
+            self.__unpin(layer.keys())
+        elif len(self.savepoints) >= 2:
+            self.__rewind(self.savepoints.pop())
+        return None
+
+    def commit(self) -> str | None:
+        if len(self.savepoints) == 1:
+            self.savepoints.pop()
+            layer = self.__finish()
+            try:
+                return self.database.commit(layer)
+            finally:
+                self.__unpin(layer.keys())
+        elif len(self.savepoints) >= 2:
+            # изменения уже лежат в общем слое, их откат теперь - дело внешней транзакции
+            self.savepoints.pop()
+        return None
+
+    def __finish(self) -> Layer:
+        layer = self.__layer
+        self.__layer = Layer()
+        self.__undo = []
+        return layer
+
+    def __rewind(self, mark: int) -> None:
+        layer, undo = self.__layer, self.__undo
+        for i in range(len(undo) - 1, mark - 1, -1):
+            k, v, seconds = undo[i]
+            if v is None:
+                layer.drop(k)
+            elif layer.get(k) is not v:
+                layer.put(k, v, None)
+            if seconds is _ABSENT:
+                layer.expires.pop(k, None)
+            else:
+                layer.expires[k] = seconds
+            # ключ закреплялся при первом попадании в слой, и эта запись журнала - самая ранняя
+            if k not in layer and k not in layer.expires:
+                self.database.unpin(k)
+        del undo[mark:]
+        return None
+
+    def __base_unchanged(self) -> bool:
+        # added/removed слоя точны, пока другие соединения не меняли ключи слоя
+        if not len(self.__layer):
+            return True
+        changes = self.__pinned_changes
+        return changes is not None and self.database.pinned_changes() == changes
+
+    def __unpin(self, keys: Iterable[str]) -> None:
+        for k in keys:
+            self.database.unpin(k)
+        return None
+
+    def __remember(self, k: str) -> None:
+        layer = self.__layer
+        if k not in layer and k not in layer.expires:
+            self.database.pin(k)
+        self.__undo.append((k, layer.get(k), layer.expires.get(k, _ABSENT)))
+        return None
+
+    def __write(self, k: str, v) -> None:
+        # то же, что __remember и put, без повторных проверок: запись - самая частая операция
+        layer = self.__layer
+        if k in layer:
+            self.__undo.append((k, layer.get(k), layer.expires.get(k, _ABSENT)))
+            layer.put(k, v, None)
+            return None
+        if k not in layer.expires:
+            self.database.pin(k)
+        self.__undo.append((k, None, layer.expires.get(k, _ABSENT)))
+        layer.put(k, v, self.database.lookup(k))
+        return None
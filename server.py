@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Iterator
+
+from database import RAMDatabase
+from interfaces import DataBaseAbstractClass
+from processor import CommandHandler
+from transaction_wrapper import WrappedDatabase
+from watch import ChangeFeed, Event, Subscription
+
+READ_CHUNK = 64 * 1024
+# фоновое удаление истекших ключей: период в секундах и предел ключей за один проход
+ACTIVE_EXPIRE_INTERVAL = 0.1
+ACTIVE_EXPIRE_LIMIT = 1000
+
+
+def encode_reply(result: str | int | None) -> bytes:
+    if result is None:
+        return b"+OK\r\n"
+    if isinstance(result, int):
+        return b":%d\r\n" % result
+    return encode_bulk(result)
+
+
+def encode_bulk(data: str | None) -> bytes:
+    if data is None:
+        return b"_\r\n"
+    data = data.encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def encode_event(event: Event) -> bytes:
+    # событие подписки - push-сообщение RESP3 из трех элементов: операция, ключ, значение
+    op, k, v = event
+    return b">3\r\n" + encode_bulk(op) + encode_bulk(k) + encode_bulk(v)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> str | int | list | None:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Соединение закрыто сервером.")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return None if payload == b"OK" else payload.decode()
+    if kind == b":":
+        return int(payload)
+    if kind == b"_":
+        return None
+    if kind in (b">", b"*"):
+        # push-сообщение подписки или массив; событие приходит списком [операция, ключ, значение]
+        return [await read_reply(reader) for _ in range(int(payload))]
+    if kind == b"$" and payload == b"?":
+        # потоковая строка RESP3: куски ;length data до куска нулевой длины
+        parts = []
+        while True:
+            size = int((await reader.readline())[1:-2])
+            if size == 0:
+                return b"".join(parts).decode()
+            parts.append((await reader.readexactly(size + 2))[:-2])
+    if kind == b"$":
+        data = await reader.readexactly(int(payload) + 2)
+        return data[:-2].decode()
+    raise ValueError(f"Неизвестный ответ сервера: {line!r}")
+
+
+class Server:
+    def __init__(
+        self,
+        database: RAMDatabase,
+        session: Callable[[], DataBaseAbstractClass] | None = None,
+        transactions: Callable[[DataBaseAbstractClass], DataBaseAbstractClass] = WrappedDatabase,
+        **handler_options,
+    ):
+        self.database = database
+        # база, поверх которой соединение открывает свой стек транзакций
+        self.session = session if session is not None else lambda: database
+        # движок транзакций соединения: WrappedDatabase (слои) или SavepointDatabase (журнал отката)
+        self.transactions = transactions
+        # параметры CommandHandler, общие для всех соединений
+        self.handler_options = handler_options
+        # подписки соединений на зафиксированные изменения общей базы
+        self.feed = ChangeFeed(database)
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # у каждого соединения свой стек транзакций поверх общей базы
+        database = self.transactions(self.session())
+        handler = CommandHandler(database, feed=self.feed, **self.handler_options)
+        self.connections += 1
+        # события подписки пишет отдельная задача; блокировка не дает им вклиниться в потоковую строку
+        lock = asyncio.Lock()
+        forwarded: Subscription | None = None
+        forwarder: asyncio.Task | None = None
+        tail = b""
+        try:
+            while True:
+                chunk = await reader.read(READ_CHUNK)
+                if not chunk:
+                    break
+                *lines, tail = (tail + chunk).split(b"\n")
+                if not lines:
+                    continue
+                replies = []
+                published = self.feed.published
+                commands = (line.decode(errors="replace").split() for line in lines)
+                for result in handler.execute_batch(commands, stream=True):
+                    if isinstance(result, Iterator):
+                        # длинный ответ уходит потоковой строкой RESP3, после каждого куска ждем клиента
+                        async with lock:
+                            writer.write(b"".join(replies) + b"$?\r\n")
+                            replies = []
+                            for part in result:
+                                data = part.encode()
+                                writer.write(b";%d\r\n%s\r\n" % (len(data), data))
+                                await writer.drain()
+                            writer.write(b";0\r\n")
+                        continue
+                    replies.append(encode_reply(result))
+                    if result == "END":
+                        writer.write(b"".join(replies))
+                        await writer.drain()
+                        return
+                writer.write(b"".join(replies))
+                if handler.subscription is not None and handler.subscription is not forwarded:
+                    forwarded = handler.subscription
+                    forwarder = asyncio.create_task(self.forward(forwarded, writer, lock))
+                await writer.drain()
+                # обратное давление только для пачек, которые добавили события в очереди подписчиков
+                if self.feed.published != published:
+                    await self.feed.wait_drained()
+        except ConnectionError:
+            pass
+        finally:
+            # незакоммиченные транзакции отбрасываются, чтобы освободить их ключи и снимки
+            while database.depth:
+                database.rollback()
+            if handler.subscription is not None:
+                self.feed.unsubscribe(handler.subscription)
+            if forwarder is not None:
+                forwarder.cancel()
+            self.connections -= 1
+            writer.close()
+
+    async def forward(self, subscription: Subscription, writer: asyncio.StreamWriter, lock: asyncio.Lock) -> None:
+        # события уходят клиенту пачками в порядке фиксации, пока подписка не закрыта
+        try:
+            while events := await subscription.get():
+                async with lock:
+                    writer.write(b"".join(map(encode_event, events)))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        return None
+
+    async def expire_keys(self) -> None:
+        while True:
+            await asyncio.sleep(ACTIVE_EXPIRE_INTERVAL)
+            self.database.expire_due(ACTIVE_EXPIRE_LIMIT)
+
+    async def serve(self, host: str, port: int, ready: asyncio.Future | None = None) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        expiry = asyncio.create_task(self.expire_keys())
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            expiry.cancel()
+
+
+def run_server(
+    database: RAMDatabase,
+    host: str,
+    port: int,
+    session: Callable[[], DataBaseAbstractClass] | None = None,
+    transactions: Callable[[DataBaseAbstractClass], DataBaseAbstractClass] = WrappedDatabase,
+    **handler_options,
+) -> None:
+    print(f"Сервер слушает {host}:{port}")
+    try:
+        asyncio.run(Server(database, session, transactions, **handler_options).serve(host, port))
+    except KeyboardInterrupt:
+        print("Сервер остановлен.")
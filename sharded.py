@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterable, Iterator
+
+from database import RAMDatabase
+from interfaces import DataBaseAbstractClass
+from layer import Layer
+
+
+class ShardedDatabase(DataBaseAbstractClass):
+    def __init__(self, shards: int = 16, **options):
+        if shards < 1:
+            raise ValueError("Число шардов должно быть положительным.")
+        # у каждого шарда свой словарь, свой индекс значений и своя блокировка
+        self.shards = [RAMDatabase(**options) for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+
+    def shard_of(self, k: str) -> int:
+        return hash(k) % len(self.shards)
+
+    def set(self, k: str, v: str) -> None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            self.shards[i].set(k, v)
+        return None
+
+    def get(self, k: str) -> str:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            return self.shards[i].get(k)
+
+    def lookup(self, k: str) -> str | None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            return self.shards[i].lookup(k)
+
+    def unset(self, k: str) -> None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            self.shards[i].unset(k)
+        return None
+
+    def counts(self, v: str) -> int:
+        _ = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                _ += shard.counts(v)
+        return _
+
+    def find(self, v: str) -> str:
+        return " ".join(self.iter_find(v))
+
+    def find_keys(self, v: str) -> set[str]:
+        keys: set[str] = set()
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                keys.update(shard.find_keys(v))
+        return keys
+
+    def iter_find(self, v: str) -> Iterator[str]:
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                keys = shard.iter_find(v)
+            yield from keys
+
+    def stats(self) -> dict[str, object]:
+        stats: dict[str, object] = {"shards": len(self.shards), "keys": 0, "used_memory": 0}
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                shard_stats = shard.stats()
+            stats["keys"] += shard_stats["keys"]
+            stats["used_memory"] += shard_stats["used_memory"]
+        return stats
+
+    def count_range(self, lo: float, hi: float) -> int:
+        _ = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                _ += shard.count_range(lo, hi)
+        return _
+
+    def find_range(self, lo: float, hi: float) -> set[str]:
+        keys: set[str] = set()
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                keys.update(shard.find_range(lo, hi))
+        return keys
+
+    def expire(self, k: str, seconds: float | None) -> None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            self.shards[i].expire(k, seconds)
+        return None
+
+    def expire_at(self, k: str, deadline: float | None) -> None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            self.shards[i].expire_at(k, deadline)
+        return None
+
+    def supports_ttl(self) -> bool:
+        return True
+
+    def ttl(self, k: str) -> float | None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            return self.shards[i].ttl(k)
+
+    def expire_due(self, limit: int | None = None) -> int:
+        _ = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                _ += shard.expire_due(limit)
+        return _
+
+    def pin(self, k: str) -> None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            self.shards[i].pin(k)
+        return None
+
+    def unpin(self, k: str) -> None:
+        i = self.shard_of(k)
+        with self.locks[i]:
+            self.shards[i].unpin(k)
+        return None
+
+    def pinned_changes(self) -> int:
+        return sum(shard.pinned_changes() for shard in self.shards)
+
+    def apply(self, layer: Layer) -> None:
+        parts: dict[int, Layer] = {}
+        for k in layer.deletes:
+            parts.setdefault(self.shard_of(k), Layer()).unset(k)
+        for k, v in layer.writes.items():
+            parts.setdefault(self.shard_of(k), Layer()).set(k, v)
+        for k, seconds in layer.expires.items():
+            parts.setdefault(self.shard_of(k), Layer()).expire(k, seconds)
+        # блокировки затронутых шардов берутся по возрастанию номера, чтобы не было взаимоблокировок
+        touched = sorted(parts)
+        for i in touched:
+            self.locks[i].acquire()
+        try:
+            for i in touched:
+                self.shards[i].apply(parts[i])
+        finally:
+            for i in touched:
+                self.locks[i].release()
+        return None
+
+    def commit(self, layer: Layer) -> None:
+        return self.apply(layer)
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                items = list(shard.items())
+            yield from items
+
+    def expirations(self) -> Iterator[tuple[str, float]]:
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                expirations = list(shard.expirations())
+            yield from expirations
+
+    def load(self, items: Iterable[tuple[str, str]]) -> None:
+        parts: list[dict[str, str]] = [{} for _ in self.shards]
+        for k, v in items:
+            parts[self.shard_of(k)][k] = v
+        for shard, lock, part in zip(self.shards, self.locks, parts):
+            with lock:
+                shard.load(part.items())
+        return None
+
+    def read_database(self) -> dict[str, str]:
+        return dict(self.items())
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from collections.abc import Iterable, Iterator
+
+from interfaces import DataBaseAbstractClass
+
+MAGIC = b"RAMDB\x02"
+# снимки первой версии не хранят сроки жизни и читаются как снимки без сроков
+MAGIC_V1 = b"RAMDB\x01"
+# заголовок: MAGIC, число записей, число сроков жизни; затем сроки: длина ключа, момент истечения
+# по time.time, ключ; затем записи: длина ключа, длина значения, ключ, значение (UTF-8)
+_COUNT = struct.Struct("<Q")
+_RECORD = struct.Struct("<II")
+_EXPIRE = struct.Struct("<Id")
+_HEADER_SIZE = len(MAGIC) + _COUNT.size
+WRITE_BUFFER = 1 << 20
+
+
+def save_snapshot(
+    items: Iterable[tuple[str, str]],
+    path: str,
+    expirations: Iterable[tuple[str, float]] = (),
+) -> int:
+    tmp = f"{path}.tmp"
+    count = 0
+    pack = _RECORD.pack
+    with open(tmp, "wb", buffering=WRITE_BUFFER) as f:
+        write = f.write
+        write(MAGIC)
+        write(_COUNT.pack(0))
+        deadlines = 0
+        write(_COUNT.pack(0))
+        for k, deadline in expirations:
+            kb = k.encode()
+            write(_EXPIRE.pack(len(kb), deadline))
+            write(kb)
+            deadlines += 1
+        for k, v in items:
+            kb = k.encode()
+            vb = v.encode()
+            write(pack(len(kb), len(vb)))
+            write(kb)
+            write(vb)
+            count += 1
+        f.seek(len(MAGIC))
+        write(_COUNT.pack(count))
+        write(_COUNT.pack(deadlines))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return count
+
+
+def load_snapshot(database: DataBaseAbstractClass, path: str) -> str | None:
+    # сроки читаются до замены данных: поврежденный заголовок не должен оставить базу без них
+    expirations = read_expirations(path)
+    result = database.load(iter_snapshot(path))
+    if result is None:
+        for k, deadline in expirations:
+            database.expire_at(k, deadline)
+    return result
+
+
+def read_expirations(path: str) -> list[tuple[str, float]]:
+    with open(path, "rb") as f:
+        header = f.read(_HEADER_SIZE + _COUNT.size)
+        magic = header[:len(MAGIC)]
+        if magic == MAGIC_V1 and len(header) >= _HEADER_SIZE:
+            return []
+        if magic != MAGIC or len(header) < _HEADER_SIZE + _COUNT.size:
+            raise ValueError(f"Файл {path} не является снимком RAMdatabase.")
+        (count,) = _COUNT.unpack_from(header, _HEADER_SIZE)
+        expirations = []
+        for _ in range(count):
+            record = f.read(_EXPIRE.size)
+            if len(record) < _EXPIRE.size:
+                break
+            k_size, deadline = _EXPIRE.unpack(record)
+            kb = f.read(k_size)
+            if len(kb) < k_size:
+                break
+            expirations.append((kb.decode(), deadline))
+        else:
+            return expirations
+    raise ValueError(f"Снимок {path} поврежден: неожиданный конец файла.")
+
+
+def iter_snapshot(path: str) -> Iterator[tuple[str, str]]:
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _HEADER_SIZE:
+            raise ValueError(f"Файл {path} не является снимком RAMdatabase.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic = mm[:len(MAGIC)]
+            if magic not in (MAGIC, MAGIC_V1):
+                raise ValueError(f"Файл {path} не является снимком RAMdatabase.")
+            (count,) = _COUNT.unpack_from(mm, len(MAGIC))
+            unpack = _RECORD.unpack_from
+            pos = _HEADER_SIZE
+            try:
+                if magic == MAGIC:
+                    # сроки жизни читает read_expirations, здесь они пропускаются
+                    (deadlines,) = _COUNT.unpack_from(mm, pos)
+                    pos += _COUNT.size
+                    for _ in range(deadlines):
+                        pos += _EXPIRE.size + _EXPIRE.unpack_from(mm, pos)[0]
+                for _ in range(count):
+                    k_size, v_size = unpack(mm, pos)
+                    pos += _RECORD.size
+                    end = pos + k_size
+                    k = mm[pos:end].decode()
+                    pos = end + v_size
+                    if pos > size:
+                        break
+                    yield k, mm[end:pos].decode()
+                else:
+                    return
+            except struct.error:
+                pass
+            raise ValueError(f"Снимок {path} поврежден: неожиданный конец файла.")
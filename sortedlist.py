@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+# размер блока: вставка и удаление сдвигают не больше 2 * LOAD элементов
+LOAD = 1000
+
+
+class SortedList:
+    def __init__(self, values: Iterable[Any] = ()):
+        values = sorted(values)
+        # отсортированные блоки и максимум каждого блока для поиска нужного блока
+        self.__lists: list[list[Any]] = [values[i:i + LOAD] for i in range(0, len(values), LOAD)]
+        self.__maxes: list[Any] = [chunk[-1] for chunk in self.__lists]
+        self.__len = len(values)
+        # дерево Фенвика по длинам блоков для rank за O(log N); None - перестроить при запросе
+        self.__tree: list[int] | None = None
+
+    def __len__(self) -> int:
+        return self.__len
+
+    def __contains__(self, value: Any) -> bool:
+        i = bisect_left(self.__maxes, value)
+        if i == len(self.__maxes):
+            return False
+        chunk = self.__lists[i]
+        j = bisect_left(chunk, value)
+        return chunk[j] == value
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self.__lists:
+            yield from chunk
+
+    def add(self, value: Any) -> None:
+        lists, maxes = self.__lists, self.__maxes
+        self.__len += 1
+        if not maxes:
+            lists.append([value])
+            maxes.append(value)
+            self.__tree = None
+            return None
+        i = bisect_left(maxes, value)
+        if i == len(maxes):
+            i -= 1
+            lists[i].append(value)
+            maxes[i] = value
+        else:
+            insort(lists[i], value)
+        if len(lists[i]) > 2 * LOAD:
+            chunk = lists[i]
+            lists[i:i + 1] = [chunk[:LOAD], chunk[LOAD:]]
+            maxes[i:i + 1] = [chunk[LOAD - 1], chunk[-1]]
+            self.__tree = None
+        else:
+            self.__update(i, 1)
+        return None
+
+    def discard(self, value: Any) -> None:
+        lists, maxes = self.__lists, self.__maxes
+        i = bisect_left(maxes, value)
+        if i == len(maxes):
+            return None
+        chunk = lists[i]
+        j = bisect_left(chunk, value)
+        if chunk[j] != value:
+            return None
+        del chunk[j]
+        self.__len -= 1
+        if not chunk:
+            del lists[i]
+            del maxes[i]
+            self.__tree = None
+            return None
+        if j == len(chunk):
+            maxes[i] = chunk[-1]
+        self.__update(i, -1)
+        return None
+
+    def rank(self, value: Any) -> int:
+        # число элементов меньше value
+        i = bisect_left(self.__maxes, value)
+        if i == len(self.__maxes):
+            return self.__len
+        return self.__prefix(i) + bisect_left(self.__lists[i], value)
+
+    def count(self, lo: Any = None, hi: Any = None) -> int:
+        # число значений lo <= value < hi
+        end = self.__len if hi is None else self.rank(hi)
+        start = 0 if lo is None else self.rank(lo)
+        return max(end - start, 0)
+
+    def __prefix(self, i: int) -> int:
+        # суммарная длина первых i блоков
+        if self.__tree is None:
+            self.__build_tree()
+        tree = self.__tree
+        total = 0
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def __update(self, i: int, delta: int) -> None:
+        tree = self.__tree
+        if tree is None:
+            return None
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+        return None
+
+    def __build_tree(self) -> None:
+        tree = [0] * (len(self.__lists) + 1)
+        for i, chunk in enumerate(self.__lists, 1):
+            tree[i] += len(chunk)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.__tree = tree
+        return None
+
+    def irange(self, lo: Any = None, hi: Any = None) -> Iterator[Any]:
+        # значения lo <= value < hi, None - без границы
+        lists, maxes = self.__lists, self.__maxes
+        i = 0 if lo is None else bisect_left(maxes, lo)
+        j = 0 if lo is None or i == len(maxes) else bisect_left(lists[i], lo)
+        while i < len(lists):
+            chunk = lists[i]
+            if hi is not None and maxes[i] >= hi:
+                yield from chunk[j:bisect_left(chunk, hi, j)]
+                return
+            yield from chunk[j:]
+            i += 1
+            j = 0
@@ -1,5 +1,6 @@
 import pytest
 from database import RAMDatabase
+from layer import Layer
 from processor import CommandHandler
 from transaction_wrapper import WrappedDatabase
 
@@ -356,3 +357,1340 @@ def test_find_after_unset_in_outer_then_inner_set_and_commit(handler):
     # FIND 2 должно вернуть A, после final ROLLBACK A должен вернуться к 1 (т.к. внешняя транзакция откатила UNSET->SET)
     assert set(res[0].split()) == {"A"}
     assert res[1] == "1"
+
+
+def test_counts_and_find_follow_commit_of_transaction(handler):
+    # индекс значений должен обновляться при COMMIT транзакции в базу
+    res = run(
+        handler,
+        [
+            "SET A 1",
+            "SET B 1",
+            "BEGIN",
+            "SET A 2",
+            "UNSET B",
+            "SET C 1",
+            "COMMIT",
+            "COUNTS 1",
+            "FIND 1",
+            "COUNTS 2",
+            "FIND 2",
+        ],
+    )
+    assert res == [1, "C", 1, "A"]
+
+
+def test_index_direct_database_calls():
+    db = RAMDatabase()
+    db.set("A", "x")
+    db.set("B", "x")
+    db.set("A", "y")
+    db.unset("B")
+    db.unset("B")
+    assert db.counts("x") == 0
+    assert db.find("x") == ""
+    assert db.counts("y") == 1
+    assert db.find("y") == "A"
+
+
+def test_counts_find_in_transaction_do_not_copy_base(handler, monkeypatch):
+    # COUNTS/FIND внутри транзакции не должны копировать базу целиком
+    def fail(self):
+        raise AssertionError("read_database не должен вызываться")
+
+    monkeypatch.setattr(RAMDatabase, "read_database", fail)
+    res = run(
+        handler,
+        [
+            "SET A 1",
+            "SET B 1",
+            "BEGIN",
+            "SET A 2",
+            "BEGIN",
+            "SET A 1",
+            "SET C 1",
+            "UNSET B",
+            "COUNTS 1",
+            "FIND 1",
+            "COMMIT",
+            "COUNTS 1",
+            "COUNTS 2",
+        ],
+    )
+    assert res[0] == 2
+    assert set(res[1].split()) == {"A", "C"}
+    assert res[2:] == [2, 0]
+
+
+def test_counts_overwrite_within_same_layer(handler):
+    # повторная запись ключа в одном слое не должна ломать дельты счетчиков
+    res = run(
+        handler,
+        [
+            "SET A 1",
+            "BEGIN",
+            "SET A 2",
+            "SET A 3",
+            "SET A 1",
+            "COUNTS 1",
+            "COUNTS 2",
+            "COUNTS 3",
+            "UNSET A",
+            "SET A 3",
+            "COUNTS 1",
+            "COUNTS 3",
+            "ROLLBACK",
+            "COUNTS 1",
+        ],
+    )
+    assert res == [1, 0, 0, 0, 1, 1]
+
+
+def test_get_through_layers_after_rollback_and_nested_commit(handler):
+    # GET берет значение из ближайшего слоя, после ROLLBACK — из нижележащего
+    res = run(
+        handler,
+        [
+            "SET A 0",
+            "BEGIN",
+            "SET A 1",
+            "BEGIN",
+            "UNSET A",
+            "BEGIN",
+            "SET A 3",
+            "GET A",
+            "ROLLBACK",
+            "GET A",
+            "COMMIT",
+            "GET A",
+            "ROLLBACK",
+            "GET A",
+        ],
+    )
+    assert res == ["3", "NULL", "NULL", "0"]
+
+
+def test_user_value_null_survives_commit(handler):
+    # значение "NULL", заданное пользователем, не должно удаляться при COMMIT
+    res = run(
+        handler,
+        [
+            "BEGIN",
+            "SET A NULL",
+            "SET B 1",
+            "UNSET B",
+            "COUNTS NULL",
+            "COMMIT",
+            "COUNTS NULL",
+            "FIND NULL",
+            "COUNTS 1",
+        ],
+    )
+    assert res == [1, 1, "A", 0]
+
+
+def test_nested_commit_of_unset_over_parent_write(handler):
+    # UNSET во вложенной транзакции поверх записи родителя после COMMIT в базу удаляет ключ
+    res = run(
+        handler,
+        [
+            "SET A 1",
+            "BEGIN",
+            "SET A 2",
+            "BEGIN",
+            "UNSET A",
+            "COMMIT",
+            "COUNTS 1",
+            "COUNTS 2",
+            "COMMIT",
+            "GET A",
+            "COUNTS 1",
+        ],
+    )
+    assert res == [0, 0, "NULL", 0]
+
+
+def test_execute_batch_matches_single_execution(handler):
+    # пакетное выполнение должно давать те же результаты, что и поштучное
+    lines = [
+        "SET A 1",
+        "SET B 1",
+        "UNSET A",
+        "SET C 2",
+        "COUNTS 1",
+        "BEGIN",
+        "SET A 2",
+        "UNSET C",
+        "SET A 3",
+        "GET A",
+        "COUNTS 2",
+        "ROLLBACK",
+        "SET",
+        "GET C",
+        "FIND 1",
+        "WRONG",
+    ]
+    expected = []
+    for line in lines:
+        parts = line.split()
+        expected.append(handler.execute(parts[0], parts[1:]))
+
+    other = CommandHandler(WrappedDatabase(RAMDatabase()))
+    assert list(other.execute_batch(lines)) == expected
+
+
+def test_execute_batch_flushes_pending_writes_and_stops_on_end(handler):
+    res = list(handler.execute_batch(["SET A 1", "", "UNSET A", "SET A 2", "END", "SET B 3"]))
+    assert res == [None, None, None, "END"]
+    assert handler.execute("GET", ["A"]) == "2"
+    assert handler.execute("GET", ["B"]) == "NULL"
+
+
+def test_mset_mget(handler):
+    res = run(
+        handler,
+        [
+            "MSET A 1 B 2 A 3",
+            "MGET A B C",
+            "MSET A",
+            "BEGIN",
+            "MSET B 3 C 3",
+            "COUNTS 3",
+            "ROLLBACK",
+            "MGET A B C",
+        ],
+    )
+    assert res == ["3 2 NULL", "MSET требует пары аргументов (name value).", 3, "3 2 NULL"]
+
+
+def test_server_connections_have_own_transactions_and_pipeline():
+    import asyncio
+
+    from server import Server, read_reply
+
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(Server(RAMDatabase()).serve("127.0.0.1", 0, ready))
+        host, port = await ready
+        r1, w1 = await asyncio.open_connection(host, port)
+        r2, w2 = await asyncio.open_connection(host, port)
+
+        # несколько команд одним пакетом
+        w1.write(b"SET A 1\r\nBEGIN\r\nSET A 2\r\nGET A\r\nCOUNTS 2\r\n")
+        first = [await read_reply(r1) for _ in range(5)]
+
+        # второе соединение не видит незакоммиченную транзакцию первого
+        w2.write(b"GET A\nFIND 1\n")
+        second = [await read_reply(r2) for _ in range(2)]
+
+        w1.write(b"COMMIT\n")
+        await read_reply(r1)
+        w2.write(b"GET A\nEND\n")
+        third = [await read_reply(r2) for _ in range(2)]
+
+        w1.close()
+        w2.close()
+        task.cancel()
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first == [None, None, None, "2", 1]
+    assert second == ["1", "A"]
+    assert third == ["2", "END"]
+
+
+def test_save_and_load_snapshot(handler, tmp_path):
+    path = str(tmp_path / "dump.rdb")
+    res = run(
+        handler,
+        [
+            "SET A 1",
+            "SET B 1",
+            "SET ключ значение",
+            f"SAVE {path}",
+            "UNSET A",
+            "SET C 2",
+            "BEGIN",
+            f"LOAD {path}",
+            "ROLLBACK",
+            f"LOAD {path}",
+            "GET A",
+            "GET C",
+            "GET ключ",
+            "COUNTS 1",
+            "COUNTS 2",
+        ],
+    )
+    assert res == ["LOAD недоступен внутри транзакции.", "1", "NULL", "значение", 2, 0]
+
+
+@pytest.mark.parametrize("engine", ["layers", "savepoint"])
+def test_snapshot_keeps_ttl_and_reads_first_version(engine, tmp_path):
+    import struct
+
+    from savepoint import SavepointDatabase
+    from snapshot import MAGIC_V1
+
+    clock = FakeClock()
+    base = RAMDatabase(clock)
+    handler = CommandHandler(SavepointDatabase(base) if engine == "savepoint" else WrappedDatabase(base))
+    path = tmp_path / "dump.rdb"
+    run(handler, ["SET A 1 EX 100", "SET B 1", "SET C 1 PX 1", f"SAVE {path}", "PERSIST A", "SET C 2"])
+    clock.now += 10
+    assert run(handler, [f"LOAD {path}", "TTL A", "TTL B", "GET C", "COUNTS 1"]) == [90, -1, "NULL", 2]
+    clock.now += 100
+    assert run(handler, ["GET A", "COUNTS 1"]) == ["NULL", 1]
+
+    # снимок прежнего формата без сроков жизни
+    path.write_bytes(MAGIC_V1 + struct.pack("<QII", 1, 1, 1) + b"k" + b"v")
+    assert run(handler, [f"LOAD {path}", "GET k", "TTL k"]) == ["v", -1]
+
+
+def test_load_rejects_corrupted_snapshot(handler, tmp_path):
+    from snapshot import save_snapshot
+
+    path = tmp_path / "dump.rdb"
+    save_snapshot([("A", "1"), ("B", "2")], str(path))
+    path.write_bytes(path.read_bytes()[:-1])
+    res = run(handler, ["SET X 1", f"LOAD {path}", "GET X", "SAVE"])
+    assert res[0].startswith("Не удалось загрузить снимок")
+    assert res[1:] == ["1", "SAVE требует путь к файлу снимка (формат SAVE path)."]
+
+
+def test_append_only_log_records_only_committed_changes(tmp_path):
+    from aof import AppendOnlyLog, iter_log, replay_log
+
+    path = str(tmp_path / "db.aof")
+    db = RAMDatabase()
+    log = AppendOnlyLog(path, fsync=0)
+    db.add_listener(log)
+    handler = CommandHandler(WrappedDatabase(db), log=log)
+    run(
+        handler,
+        [
+            "SET A 1",
+            "SET A 1",  # без изменений - без записи
+            "BEGIN",
+            "SET B 2",
+            "UNSET A",
+            "BEGIN",
+            "SET C 3",
+            "COMMIT",
+            "COMMIT",  # одна запись на всю транзакцию
+            "BEGIN",
+            "SET D 4",
+            "ROLLBACK",  # откат в журнал не попадает
+            "UNSET X",
+        ],
+    )
+    log.close()
+    assert len(list(iter_log(path))) == 2
+
+    restored = RAMDatabase()
+    assert replay_log(path, restored) == 2
+    assert restored.read_database() == {"B": "2", "C": "3"}
+
+
+def test_replay_log_skips_torn_tail_and_compacts_into_snapshot(tmp_path):
+    from aof import AppendOnlyLog, replay_log
+    from snapshot import iter_snapshot
+
+    path = tmp_path / "db.aof"
+    snapshot_path = str(tmp_path / "dump.rdb")
+    db = RAMDatabase()
+    log = AppendOnlyLog(str(path), fsync=None)
+    db.add_listener(log)
+    db.set("A", "1")
+    db.set("B", "2")
+    log.close()
+    # запись, оборванная при сбое
+    path.write_bytes(path.read_bytes()[:-3])
+
+    restored = RAMDatabase()
+    assert replay_log(str(path), restored) == 1
+    assert restored.read_database() == {"A": "1"}
+
+    log = AppendOnlyLog(str(path), fsync=5)
+    restored.add_listener(log)
+    handler = CommandHandler(WrappedDatabase(restored), snapshot_path=snapshot_path, log=log)
+    run(handler, ["SET C 3", "SAVE", "SET D 4"])
+    log.close()
+
+    final = RAMDatabase()
+    final.load(iter_snapshot(snapshot_path))
+    assert replay_log(str(path), final) == 1
+    assert final.read_database() == {"A": "1", "C": "3", "D": "4"}
+
+
+def mvcc_sessions(count):
+    from mvcc import VersionedStore
+
+    store = VersionedStore()
+    return store, [CommandHandler(WrappedDatabase(store.session())) for _ in range(count)]
+
+
+def test_mvcc_reads_see_snapshot_taken_at_begin():
+    store, (a, b) = mvcc_sessions(2)
+    run(a, ["SET A 1", "SET B 1", "BEGIN"])
+    run(b, ["SET A 2", "UNSET B", "SET C 1"])
+    # сессия a видит состояние на момент BEGIN, b - последнее зафиксированное
+    res = run(a, ["GET A", "GET B", "GET C", "COUNTS 1", "FIND 1", "COUNTS 2"])
+    assert res[:4] == ["1", "1", "NULL", 2]
+    assert set(res[4].split()) == {"A", "B"}
+    assert res[5] == 0
+    assert run(b, ["GET A", "COUNTS 1", "FIND 1"]) == ["2", 1, "C"]
+    run(a, ["ROLLBACK"])
+    assert run(a, ["GET A", "COUNTS 1"]) == ["2", 1]
+
+
+def test_mvcc_write_write_conflict_aborts_commit():
+    store, (a, b) = mvcc_sessions(2)
+    run(a, ["SET A 0"])
+    run(a, ["BEGIN", "SET A 1", "SET X 1"])
+    run(b, ["BEGIN", "SET A 2", "BEGIN", "SET Y 2", "COMMIT"])
+    assert run(b, ["COMMIT"]) == []
+    res = run(a, ["COMMIT", "GET A", "GET X", "GET Y"])
+    assert res[0].startswith("Конфликт транзакции")
+    assert res[1:] == ["2", "NULL", "2"]
+    # непересекающиеся по ключам транзакции фиксируются обе
+    run(a, ["BEGIN", "SET P 1"])
+    run(b, ["BEGIN", "SET Q 1", "COMMIT"])
+    assert run(a, ["COMMIT", "COUNTS 1"]) == [2]
+
+
+def test_mvcc_garbage_collects_versions_no_reader_needs():
+    store, (a, b, c) = mvcc_sessions(3)
+    run(a, ["SET A 0", "BEGIN"])
+    run(b, ["SET A 1", "BEGIN"])
+    run(c, ["SET A 2", "SET A 3"])
+    assert store.retained_versions() == 3
+    assert run(a, ["GET A"]) == ["0"]
+    assert run(b, ["GET A"]) == ["1"]
+    run(a, ["ROLLBACK"])
+    # снимок a освобожден - версия, нужная только ему, удалена
+    assert store.retained_versions() == 2
+    assert run(b, ["GET A"]) == ["1"]
+    run(b, ["COMMIT"])
+    assert store.active_snapshots() == 0
+    assert store.retained_versions() == 0
+    assert run(a, ["GET A"]) == ["3"]
+
+
+def test_sharded_database_behaves_like_single_store():
+    from sharded import ShardedDatabase
+
+    handler = CommandHandler(WrappedDatabase(ShardedDatabase(shards=4)))
+    res = run(
+        handler,
+        [
+            "MSET A 1 B 1 C 2 D 1",
+            "UNSET D",
+            "BEGIN",
+            "SET C 1",
+            "SET E 3",
+            "COUNTS 1",
+            "COMMIT",
+            "COUNTS 1",
+            "FIND 1",
+            "GET E",
+        ],
+    )
+    assert res[:2] == [3, 3]
+    assert set(res[2].split()) == {"A", "B", "C"}
+    assert res[3] == "3"
+
+
+def test_sharded_database_concurrent_commits_keep_counts_consistent():
+    import threading
+
+    from sharded import ShardedDatabase
+
+    db = ShardedDatabase(shards=8)
+
+    def worker(t):
+        for i in range(300):
+            layer = Layer()
+            layer.set(f"k{t}:{i}", "x")
+            layer.set(f"shared{i % 10}", f"t{t}")
+            layer.unset(f"k{t}:{i - 1}")
+            db.commit(layer)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert db.counts("x") == 8
+    assert sum(db.counts(f"t{t}") for t in range(8)) == 10
+    assert len(db.read_database()) == 18
+
+
+def test_replicas_apply_committed_changes_from_shared_memory_stream():
+    import asyncio
+
+    from replication import ReplicaSet
+    from server import read_reply
+
+    primary = RAMDatabase()
+    primary.set("A", "1")
+    replicas = ReplicaSet(primary, workers=2, capacity=4096)
+    try:
+        ports = replicas.start()
+        handler = CommandHandler(WrappedDatabase(primary))
+        # больше записей, чем помещается в кольцо за один проход
+        run(handler, [f"SET K{i} {i % 3}" for i in range(300)])
+        run(handler, ["BEGIN", "SET A 2", "UNSET K0", "COMMIT", "BEGIN", "SET B 9", "ROLLBACK"])
+        # COMMIT больше всего кольца уходит частями
+        published = replicas.ring.published()
+        run(handler, ["BEGIN", *[f"SET L{i} {i}" for i in range(1000)], "COMMIT"])
+        assert replicas.ring.published() == published + 1
+        replicas.wait_caught_up()
+        assert replicas.lag() == [0, 0]
+
+        async def ask(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET A\nGET B\nCOUNTS 0\nGET L999\nSET C 1\n")
+            replies = [await read_reply(reader) for _ in range(5)]
+            writer.close()
+            return replies
+
+        for port in ports:
+            assert asyncio.run(ask(port)) == ["2", "NULL", 100, "999", "Реплика доступна только для чтения."]
+    finally:
+        replicas.close()
+
+
+def test_ring_buffer_detaches_dead_and_stalled_readers():
+    from replication import RingBuffer
+
+    ring = RingBuffer.create(256, readers=2)
+    try:
+        detached = []
+        ring.alive = lambda reader: reader != 0
+        ring.on_detach = detached.append
+        ring.timeout = 0.05
+        # читатель 0 упал, читатель 1 жив, но не читает: первого отключаем сразу, второго по timeout
+        for i in range(20):
+            ring.publish(b"x" * 40)
+        assert detached == [0, 1] and ring.detached == {0, 1}
+        assert ring.published() == 20
+    finally:
+        ring.close()
+
+
+def test_compact_database_matches_ram_database():
+    import random
+
+    from compact import CompactDatabase
+
+    ram, compact = RAMDatabase(), CompactDatabase()
+    rnd = random.Random(7)
+    for _ in range(5000):
+        k = f"k{rnd.randrange(300)}"
+        if rnd.random() < 0.3:
+            ram.unset(k)
+            compact.unset(k)
+        else:
+            v = str(rnd.randrange(5))
+            ram.set(k, v)
+            compact.set(k, v)
+    assert compact.read_database() == ram.read_database()
+    for v in ["0", "1", "2", "3", "4", "NULL"]:
+        assert compact.counts(v) == ram.counts(v)
+        assert compact.find_keys(v) == ram.find_keys(v)
+    assert compact.get("missing") == "NULL"
+    assert compact.distinct_values() == len({v for _, v in ram.items()})
+
+
+def test_compact_database_behind_command_handler():
+    from compact import CompactDatabase
+
+    handler = CommandHandler(WrappedDatabase(CompactDatabase()))
+    res = run(
+        handler,
+        ["SET A 10", "SET B 10", "BEGIN", "SET C 10", "UNSET A", "COUNTS 10", "COMMIT", "COUNTS 10", "FIND 10", "GET A"],
+    )
+    assert res[:2] == [2, 2]
+    assert set(res[2].split()) == {"B", "C"}
+    assert res[3] == "NULL"
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_set_ex_px_ttl_and_persist():
+    clock = FakeClock()
+    handler = CommandHandler(WrappedDatabase(RAMDatabase(clock)))
+    res = run(handler, ["SET A 1 EX 10", "SET B 1 PX 1500", "SET C 1", "TTL A", "TTL B", "TTL C", "TTL X", "COUNTS 1"])
+    assert res == [10, 2, -1, -2, 3]
+    clock.now += 2
+    res = run(handler, ["GET B", "COUNTS 1", "FIND 1", "TTL A"])
+    assert res[:2] == ["NULL", 2]
+    assert set(res[2].split()) == {"A", "C"}
+    assert res[3] == 8
+    run(handler, ["PERSIST A", "SET C 2 EX 1", "SET C 3"])
+    clock.now += 100
+    assert run(handler, ["GET A", "TTL A", "GET C", "TTL C"]) == ["1", -1, "3", -1]
+    assert run(handler, ["SET A 1 EX 0", "SET A 1 EX x", "SET A 1 EX ²", "SET A 1 KEEP 5", "SET A 1 EX"]) == [
+        "Время жизни должно быть положительным целым числом.",
+        "Время жизни должно быть положительным целым числом.",
+        "Время жизни должно быть положительным целым числом.",
+        "SET поддерживает только параметры EX seconds и PX milliseconds.",
+        "SET требует 2 аргумента.",
+    ]
+    assert run(handler, ["FIND 1 LIMIT ²", "SCAN 0 COUNT ²"]) == [
+        "LIMIT должен быть положительным целым числом.",
+        "COUNT должен быть положительным целым числом.",
+    ]
+
+
+@pytest.mark.parametrize("engine", ["layers", "savepoint"])
+def test_ttl_commands_rejected_by_storage_without_ttl(engine):
+    from compact import CompactDatabase
+    from savepoint import SavepointDatabase
+
+    wrapper = WrappedDatabase if engine == "layers" else SavepointDatabase
+    handler = CommandHandler(wrapper(CompactDatabase()))
+    unsupported = "Время жизни ключей не поддерживается этим хранилищем."
+    res = run(handler, ["SET A 1 EX 10", "MSET B 1", "SET C 1 PX 5", "GET A", "BEGIN", "SET A 2 EX 1", "PERSIST B"])
+    assert res == [unsupported, unsupported, "NULL", unsupported, unsupported]
+    assert run(handler, ["COMMIT", "GET A", "GET B"]) == ["NULL", "1"]
+
+
+def test_expire_due_uses_heap_and_goes_through_unset():
+    from interfaces import ChangeListener
+
+    class Recorder(ChangeListener):
+        def __init__(self):
+            self.unset = []
+
+        def on_unset(self, k):
+            self.unset.append(k)
+
+    clock = FakeClock()
+    db = RAMDatabase(clock)
+    recorder = Recorder()
+    db.add_listener(recorder)
+    for i in range(1000):
+        db.set(f"k{i}", "v")
+        db.expire(f"k{i}", 1 + i % 2)
+    db.set("k0", "v")  # SET без EX снимает время жизни
+    clock.now += 1.5
+    assert db.expire_due(limit=100) == 100
+    assert db.expire_due() == 399
+    assert db.counts("v") == 501
+    assert len(recorder.unset) == 499
+    assert db.ttl("k0") is None
+
+
+def test_keys_changed_in_transaction_expire_after_it_ends():
+    clock = FakeClock()
+    handler = CommandHandler(WrappedDatabase(RAMDatabase(clock)))
+    res = run(handler, ["SET A x EX 1", "SET B x EX 1", "BEGIN", "SET A y", "SET C z EX 5", "TTL C"])
+    assert res == [5]
+    clock.now += 10
+    # A закреплен транзакцией, B истекает, C отсчитывает время жизни только после COMMIT
+    assert run(handler, ["COUNTS x", "COUNTS y", "GET B", "GET C"]) == [0, 1, "NULL", "z"]
+    assert run(handler, ["ROLLBACK", "GET A", "COUNTS x"]) == ["NULL", 0]
+    run(handler, ["BEGIN", "SET C z EX 5", "BEGIN", "PERSIST C", "COMMIT", "COMMIT"])
+    clock.now += 10
+    assert run(handler, ["GET C", "TTL C"]) == ["z", -1]
+
+
+def test_aof_keeps_ttl_across_replay_and_compaction(tmp_path):
+    import time
+
+    from aof import AppendOnlyLog, replay_log
+    from snapshot import load_snapshot
+
+    path = str(tmp_path / "db.aof")
+    snapshot_path = str(tmp_path / "dump.rdb")
+    db = RAMDatabase()
+    log = AppendOnlyLog(path, fsync=None)
+    db.add_listener(log)
+    handler = CommandHandler(WrappedDatabase(db), snapshot_path=snapshot_path, log=log)
+    run(handler, ["SET A 1 EX 100", "SET B 1", "SET C 1 PX 1", "SAVE", "BEGIN", "SET D 2 EX 100", "COMMIT"])
+    time.sleep(0.01)
+    log.close()
+
+    restored = RAMDatabase()
+    load_snapshot(restored, snapshot_path)
+    # сроки жизни до SAVE восстанавливаются из снимка, после - из журнала
+    assert replay_log(path, restored) == 1
+    assert restored.read_database() == {"A": "1", "B": "1", "D": "2"}
+    assert 99 < restored.ttl("A") <= 100
+    assert 99 < restored.ttl("D") <= 100
+    assert restored.ttl("B") is None
+
+
+def test_lru_eviction_keeps_recent_and_pinned_keys():
+    db = RAMDatabase(maxkeys=3, eviction="lru")
+    handler = CommandHandler(WrappedDatabase(db))
+    run(handler, ["SET A x", "SET B x", "SET C y", "GET A", "SET D y"])
+    assert db.read_database() == {"A": "x", "C": "y", "D": "y"}
+    assert run(handler, ["COUNTS x", "COUNTS y"]) == [1, 2]
+    # A закреплен открытой транзакцией и не вытесняется, хотя использовался давно
+    run(handler, ["BEGIN", "SET A z", "GET C", "GET D"])
+    db.set("E", "y")
+    db.set("F", "y")
+    assert set(db.read_database()) == {"A", "E", "F"}
+    assert run(handler, ["COMMIT", "GET A", "COUNTS y", "COUNTS z"]) == ["z", 2, 1]
+    assert db.eviction_stats()["evicted_keys"] == 3
+
+
+@pytest.mark.parametrize("batch", ["pipeline", "commit", "savepoint"])
+def test_eviction_bounds_batches_larger_than_limit(batch):
+    from savepoint import SavepointDatabase
+
+    db = RAMDatabase(maxkeys=10, eviction="lru")
+    handler = CommandHandler(SavepointDatabase(db) if batch == "savepoint" else WrappedDatabase(db))
+    sets = [f"SET K{i} {i}" for i in range(1000)]
+    lines = sets if batch == "pipeline" else ["BEGIN", *sets, "COMMIT"]
+    list(handler.execute_batch([line.split() for line in lines]))
+    stats = db.eviction_stats()
+    assert stats["keys"] == 10 and stats["evicted_keys"] == 990
+    assert db.lookup("K999") == "999"
+    assert sum(db.counts(str(i)) for i in range(1000)) == 10
+
+
+def test_lfu_and_random_eviction_by_memory():
+    import random
+
+    from eviction import LFUPolicy, entry_size
+
+    lfu = LFUPolicy(random.Random(1))
+    db = RAMDatabase(maxkeys=100, eviction=lfu)
+    for i in range(50):
+        db.set(f"hot{i}", "v")
+    for _ in range(30):
+        for i in range(50):
+            db.get(f"hot{i}")
+    for i in range(300):
+        db.set(f"cold{i}", "v")
+    assert sum(k.startswith("hot") for k in db.read_database()) >= 35
+    assert db.counts("v") == 100
+
+    limit = 20 * entry_size("key00", "value")
+    db = RAMDatabase(maxmemory=limit, eviction="random")
+    for i in range(100):
+        db.set(f"key{i:02}", "value")
+    stats = db.eviction_stats()
+    assert stats["used_memory"] <= limit
+    assert stats["keys"] == 20 == db.counts("value")
+    assert stats["evicted_keys"] == 80
+
+
+def test_sorted_list_matches_sorted_builtin(monkeypatch):
+    import random
+
+    import sortedlist
+    from sortedlist import SortedList
+
+    # маленькие блоки, чтобы проверить разбиение и удаление пустых блоков
+    monkeypatch.setattr(sortedlist, "LOAD", 8)
+    rnd = random.Random(3)
+    values = SortedList(rnd.sample(range(10_000), 3000))
+    reference = set(values)
+    for _ in range(20_000):
+        v = rnd.randrange(10_000)
+        if v in reference:
+            values.discard(v)
+            reference.discard(v)
+        else:
+            values.add(v)
+            reference.add(v)
+    assert list(values) == sorted(reference)
+    assert len(values) == len(reference)
+    assert list(values.irange(2500, 7500)) == [v for v in sorted(reference) if 2500 <= v < 7500]
+    assert list(values.irange(None, 0)) == []
+
+
+@pytest.mark.parametrize("ordered_index", [True, False])
+def test_scan_keys_range_respect_layers(ordered_index):
+    handler = CommandHandler(WrappedDatabase(RAMDatabase(ordered_index=ordered_index)))
+    run(handler, [f"SET user:{i:02}:name n{i}" for i in range(12)] + ["SET order:1 x", "SET zebra z"])
+    assert run(handler, ["KEYS user:1", "RANGE order:1 user:01:name", "RANGE a z COUNT 2"]) == [
+        "user:10:name user:11:name",
+        "order:1 user:00:name user:01:name",
+        "order:1 user:00:name",
+    ]
+    run(handler, ["BEGIN", "SET user:10:age 7", "UNSET user:11:name", "UNSET user:00:name", "SET user:00:name m"])
+    assert run(handler, ["KEYS user:1*"]) == ["user:10:age user:10:name"]
+
+    keys, cursor = [], "0"
+    while True:
+        (page,) = run(handler, [f"SCAN {cursor} MATCH user:* COUNT 5"])
+        cursor, *found = page.split()
+        assert len(found) <= 5
+        keys.extend(found)
+        if cursor == "0":
+            break
+    assert keys == sorted([f"user:{i:02}:name" for i in range(11)] + ["user:10:age"])
+    assert run(handler, ["ROLLBACK", "KEYS user:10", "SCAN zz", "SCAN 0 COUNT 0"]) == [
+        "user:10:name",
+        "Неверный курсор SCAN.",
+        "COUNT должен быть положительным целым числом.",
+    ]
+
+
+@pytest.mark.parametrize("ordered_index", [True, False])
+def test_keys_show_expired_key_pinned_by_other_transaction(ordered_index):
+    clock = FakeClock()
+    base = RAMDatabase(clock, ordered_index=ordered_index)
+    first, second = CommandHandler(WrappedDatabase(base)), CommandHandler(WrappedDatabase(base))
+    run(first, ["SET a 1 EX 10", "SET b 1", "BEGIN", "SET a 2"])
+    clock.now += 20
+    # ключ держит открытая транзакция другого соединения, поэтому KEYS/SCAN видят его так же, как GET
+    assert run(second, ["GET a", "KEYS a", "SCAN 0", "RANGE a b"]) == ["1", "a", "0 a b", "a b"]
+    run(first, ["ROLLBACK"])
+    assert run(second, ["GET a", "KEYS a", "SCAN 0"]) == ["NULL", "", "0 b"]
+
+
+def test_mvcc_key_range_reads_snapshot():
+    _, (first, second) = mvcc_sessions(2)
+    run(first, ["SET a 1", "SET b 1", "SET c 1"])
+    run(first, ["BEGIN"])
+    run(second, ["UNSET b", "SET bb 2"])
+    assert run(first, ["KEYS b", "GET a"]) == ["b", "1"]
+    assert run(second, ["KEYS b"]) == ["bb"]
+
+
+@pytest.mark.parametrize("numeric_index", [True, False])
+def test_countrange_findrange_match_brute_force_with_layers(numeric_index):
+    import random
+
+    handler = CommandHandler(WrappedDatabase(RAMDatabase(numeric_index=numeric_index)))
+    rnd = random.Random(5)
+    lines = []
+    for _ in range(3000):
+        k = f"k{rnd.randrange(200)}"
+        roll = rnd.random()
+        if roll < 0.02:
+            lines.append(rnd.choice(["BEGIN", "COMMIT", "ROLLBACK"]))
+        elif roll < 0.2:
+            lines.append(f"UNSET {k}")
+        else:
+            lines.append(f"SET {k} {rnd.choice([str(rnd.randrange(-50, 50)), '1.5', 'abc', 'nan', '1e3'])}")
+    run(handler, lines)
+    visible = {}
+    for i in range(200):
+        v = handler.database.lookup(f"k{i}")
+        if v is not None and v not in ("abc", "nan"):
+            visible[f"k{i}"] = float(v)
+    for lo, hi in [("-10", "10"), ("(-10", "(10"), ("-inf", "+inf"), ("1.5", "1.5"), ("(1.5", "+inf")]:
+        low, high = float(lo.lstrip("(")), float(hi.lstrip("("))
+        expected = {
+            k for k, n in visible.items()
+            if (n > low if lo.startswith("(") else n >= low) and (n < high if hi.startswith("(") else n <= high)
+        }
+        count, found = run(handler, [f"COUNTRANGE {lo} {hi}", f"FINDRANGE {lo} {hi}"])
+        assert count == len(expected)
+        assert found.split() == sorted(expected, key=lambda k: (visible[k], k))
+    assert run(handler, ["COUNTRANGE a 1", "COUNTRANGE 1"]) == [
+        "Границы диапазона должны быть числами, -inf или +inf; ( перед числом исключает границу.",
+        "COUNTRANGE требует 2 аргумента (формат COUNTRANGE min max).",
+    ]
+
+
+def test_info_reports_database_transactions_and_commands():
+    from metrics import Metrics
+
+    handler = CommandHandler(WrappedDatabase(RAMDatabase()), metrics=Metrics(sample=1))
+    run(handler, ["SET a 1", "SET b 2", "BEGIN", "SET c 3", "UNSET a", "GET a"])
+    info = run(handler, ["INFO"])[0]
+    fields = dict(line.split(":", 1) for line in info.splitlines() if not line.startswith("#"))
+    assert "# Database" in info and "# Commandstats" in info
+    assert fields["keys"] == "2"
+    assert fields["transaction_depth"] == "1"
+    assert fields["layer_sizes"] == "2"
+    assert fields["cmdstat_set"].startswith("calls=3,sampled=3,")
+    assert "p99=" in fields["cmdstat_get"]
+    assert run(handler, ["INFO database"])[0].startswith("# Database\nkeys:2")
+    assert run(handler, ["INFO nope"]) == ["Неизвестная секция INFO: nope."]
+    assert run(CommandHandler(WrappedDatabase(RAMDatabase())), ["SLOWLOG LEN"]) == ["Метрики выключены."]
+
+
+def test_slowlog_and_sampled_histograms():
+    from metrics import LatencyHistogram, Metrics
+
+    histogram = LatencyHistogram()
+    for ns in range(1, 100_001):
+        histogram.record(ns * 100)
+    # корзины шириной не больше 1/8 от значения
+    for p in (50, 99, 99.9):
+        exact = p / 100 * 10_000_000
+        assert exact <= histogram.percentile(p) <= exact * 1.125
+    assert histogram.percentile(100) == histogram.max == 10_000_000
+
+    metrics = Metrics(slowlog_threshold_us=0, slowlog_max_len=2, sample=1)
+    handler = CommandHandler(WrappedDatabase(RAMDatabase()), metrics=metrics)
+    run(handler, ["SET a 1", "GET a", "COUNTS 1"])
+    assert run(handler, ["SLOWLOG LEN"]) == [2]
+    entries = run(handler, ["SLOWLOG GET"])[0].splitlines()
+    assert [line.split(" ", 3)[3] for line in entries] == ["SLOWLOG LEN", "COUNTS 1"]
+    run(handler, ["SLOWLOG RESET"])
+    assert run(handler, ["SLOWLOG GET 1"])[0].split(" ", 3)[3] == "SLOWLOG RESET"
+    assert run(handler, ["SLOWLOG GET ²"]) == ["SLOWLOG GET принимает число записей."]
+
+    sampled = Metrics(sample=4)
+    handler = CommandHandler(WrappedDatabase(RAMDatabase()), metrics=sampled)
+    run(handler, ["SET a 1"] * 5)
+    list(handler.execute_batch(["SET b 2"] * 7))
+    assert sampled.calls["SET"] == 12
+    assert sampled.histograms["SET"].count == 3
+
+
+def test_slowlog_sees_unsampled_commands_and_batch_apply():
+    import time
+
+    from metrics import Metrics
+
+    class Slow(RAMDatabase):
+        def counts(self, v):
+            time.sleep(0.002)
+            return super().counts(v)
+
+        def apply(self, layer):
+            time.sleep(0.002)
+            return super().apply(layer)
+
+    metrics = Metrics(slowlog_threshold_us=1000, sample=16)
+    handler = CommandHandler(WrappedDatabase(Slow()), metrics=metrics)
+    run(handler, ["COUNTS 1"] * 10)
+    assert len(metrics.slowlog.entries) == 10
+    assert metrics.histograms == {}
+    run(handler, ["SLOWLOG RESET"])
+    # время применения пачки записей достается записям, а не следующей команде
+    assert list(handler.execute_batch(["SET a 1", "GET a"])) == [None, "1"]
+    assert [text for _, _, _, text in metrics.slowlog.entries] == ["SET a 1"]
+
+
+def test_savepoint_engine_matches_layered_transactions():
+    import random
+
+    from savepoint import SavepointDatabase
+
+    clocks = [FakeClock(), FakeClock()]
+    bases = [RAMDatabase(clocks[0], ordered_index=True), RAMDatabase(clocks[1], ordered_index=True)]
+    layered = CommandHandler(WrappedDatabase(bases[0]))
+    savepoint = CommandHandler(SavepointDatabase(bases[1]))
+    rnd = random.Random(11)
+    for step in range(5000):
+        k, v = f"k{rnd.randrange(30)}", str(rnd.randrange(8))
+        roll = rnd.random()
+        if roll < 0.05:
+            line = "BEGIN"
+        elif roll < 0.1:
+            line = rnd.choice(["COMMIT", "ROLLBACK"])
+        elif roll < 0.35:
+            line = f"SET {k} {v}" + rnd.choice(["", "", f" EX {rnd.randrange(1, 5)}"])
+        elif roll < 0.45:
+            line = rnd.choice([f"UNSET {k}", f"PERSIST {k}", f"MSET {k} {v} k0 {v}"])
+        else:
+            line = rnd.choice([f"GET {k}", f"COUNTS {v}", f"FIND {v}", f"TTL {k}", "KEYS k1", "COUNTRANGE 2 5"])
+        results = run(layered, [line]), run(savepoint, [line])
+        if line.startswith("FIND") and results[0]:
+            results = [set(result[0].split()) for result in results]
+        assert results[0] == results[1], (step, line)
+        if step % 500 == 0:
+            for clock in clocks:
+                clock.now += 1
+    while layered.database.depth:
+        run(layered, ["ROLLBACK"])
+        run(savepoint, ["ROLLBACK"])
+    assert dict(bases[0].items()) == dict(bases[1].items())
+    assert bases[1].stats()["pinned_keys"] == 0
+
+
+def test_savepoint_nested_commit_keeps_changes_for_outer_rollback():
+    from savepoint import SavepointDatabase
+
+    handler = CommandHandler(SavepointDatabase(RAMDatabase()))
+    run(handler, ["SET a 1", "BEGIN", "SET a 2", "BEGIN", "SET b 3", "UNSET a", "COMMIT"])
+    assert run(handler, ["GET a", "GET b", "INFO database"])[:2] == ["NULL", "3"]
+    info = run(handler, ["INFO database"])[0]
+    assert "transaction_depth:1" in info and "undo_log:3" in info
+    run(handler, ["BEGIN", "SET a 4", "ROLLBACK"])
+    assert run(handler, ["GET a", "ROLLBACK", "GET a", "GET b", "COUNTS 1"]) == ["NULL", "1", "NULL", 1]
+
+
+@pytest.mark.parametrize("engine", ["layers", "savepoint", "mvcc", "sharded"])
+def test_iter_find_and_find_pages_match_find_keys(engine, monkeypatch):
+    import random
+
+    import processor
+    from mvcc import VersionedStore
+    from savepoint import SavepointDatabase
+    from sharded import ShardedDatabase
+
+    monkeypatch.setattr(processor, "STREAM_CHUNK", 7)
+    if engine == "mvcc":
+        handler = CommandHandler(WrappedDatabase(VersionedStore(RAMDatabase()).session()))
+    elif engine == "sharded":
+        handler = CommandHandler(WrappedDatabase(ShardedDatabase(4)))
+    else:
+        base = RAMDatabase()
+        handler = CommandHandler(SavepointDatabase(base) if engine == "savepoint" else WrappedDatabase(base))
+    rnd = random.Random(3)
+    run(handler, [f"SET k{i} {rnd.randrange(3)}" for i in range(300)])
+    # записи в двух уровнях транзакции, в том числе возврат прежнего значения
+    run(handler, ["BEGIN"] + [f"SET k{rnd.randrange(300)} {rnd.randrange(3)}" for _ in range(50)])
+    run(handler, ["BEGIN", "UNSET k1", "SET new 1", "SET k2 5", "SET k2 1"])
+    for v in ("0", "1", "5"):
+        expected = handler.database.find_keys(v)
+        streamed = list(handler.execute_stream("FIND", [v]))
+        keys = "".join(streamed).split()
+        assert len(keys) == len(set(keys)) and set(keys) == expected
+        assert keys == run(handler, [f"FIND {v}"])[0].split()
+        assert all(len(part.split()) <= 7 for part in streamed)
+        pages, cursor = [], "0"
+        while True:
+            cursor, *keys = run(handler, [f"FIND {v} LIMIT 13 CURSOR {cursor}"])[0].split(" ")
+            pages += [k for k in keys if k]
+            if cursor == "0":
+                break
+        assert pages == sorted(expected)
+    assert run(handler, ["FIND 1 LIMIT 0", "FIND 1 CURSOR zz", "FIND 1 LIMIT"]) == [
+        "LIMIT должен быть положительным целым числом.",
+        "Неверный курсор FIND.",
+        "Параметры задаются парами: [LIMIT value] [CURSOR value].",
+    ]
+
+
+def test_find_pages_do_not_rescan_matches():
+    class Counting(RAMDatabase):
+        scans = 0
+
+        def iter_find(self, v):
+            Counting.scans += 1
+            return super().iter_find(v)
+
+    handler = CommandHandler(Counting())
+    run(handler, [f"SET k{i:03} 1" for i in range(100)])
+    pages, cursor = [], "0"
+    while True:
+        cursor, *keys = run(handler, [f"FIND 1 LIMIT 10 CURSOR {cursor}"])[0].split(" ")
+        pages += [k for k in keys if k]
+        if cursor == "0":
+            break
+        if len(pages) == 30:
+            # ключи впереди курсора, потерявшие значение, в страницы не попадают
+            run(handler, ["UNSET k050", "SET k060 2"])
+    assert pages == [f"k{i:03}" for i in range(100) if i not in (50, 60)]
+    # первая страница и один отсортированный остаток, а не просмотр всех совпадений на каждой странице
+    assert Counting.scans == 2
+
+
+@pytest.mark.parametrize("engine", ["layers", "savepoint", "mvcc"])
+def test_find_returns_keys_in_order_they_got_value(engine):
+    from mvcc import VersionedStore
+    from savepoint import SavepointDatabase
+
+    if engine == "mvcc":
+        store = VersionedStore(RAMDatabase())
+        handler, other = (CommandHandler(WrappedDatabase(store.session())) for _ in range(2))
+    else:
+        base = RAMDatabase()
+        wrapper = SavepointDatabase if engine == "savepoint" else WrappedDatabase
+        handler, other = CommandHandler(wrapper(base)), CommandHandler(wrapper(base))
+    run(handler, ["SET b 1", "SET a 1", "SET c 2", "SET d 1", "SET a 2", "SET a 1"])
+    assert run(handler, ["FIND 1"]) == ["b d a"]
+    # ключи транзакции идут после ключей базы в порядке записи
+    run(handler, ["BEGIN", "SET z 1", "SET b 2", "SET b 1", "SET e 1", "UNSET d"])
+    assert run(handler, ["FIND 1"]) == ["b a z e"]
+    assert "".join(handler.execute_stream("FIND", ["1"])) == "b a z e"
+    # другое соединение меняет базу под транзакцией, снимок --mvcc этого не видит
+    run(other, ["SET y 1", "SET a 3"])
+    expected = "b a z e" if engine == "mvcc" else "b y z e"
+    assert run(handler, ["FIND 1"]) == [expected]
+    run(handler, ["COMMIT"])
+    assert run(handler, ["FIND 1"]) == ["b y z e"]
+
+
+def test_server_streams_long_find_reply():
+    import asyncio
+
+    from server import Server, read_reply
+
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(Server(RAMDatabase()).serve("127.0.0.1", 0, ready))
+        host, port = await ready
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"".join(b"SET k%d v\n" % i for i in range(2500)))
+        [await read_reply(reader) for _ in range(2500)]
+        writer.write(b"FIND v\n")
+        header = await reader.readline()
+        chunks = []
+        while (size := int((await reader.readline())[1:-2])) != 0:
+            chunks.append((await reader.readexactly(size + 2))[:-2])
+        writer.write(b"FIND v\nFIND missing\nGET k1\n")
+        replies = [await read_reply(reader) for _ in range(3)]
+        writer.close()
+        task.cancel()
+        return header, chunks, replies
+
+    header, chunks, (found, missing, value) = asyncio.run(scenario())
+    assert header == b"$?\r\n"
+    assert len(chunks) == 3
+    assert b"".join(chunks).decode().split() == found.split()
+    assert set(found.split()) == {f"k{i}" for i in range(2500)}
+    assert (missing, value) == ("", "v")
+
+
+def test_read_commands_and_script_mode(tmp_path, monkeypatch, capsys):
+    import io
+
+    import app
+    from bulk import read_commands
+
+    data = b"SET a 1\r\n\n   \nSET  b\t1\nFIND 1\nGET a"
+    # строки, разрезанные границей блока, собираются обратно
+    assert list(read_commands(io.BytesIO(data), chunk_size=3)) == list(read_commands(io.BytesIO(data)))
+    assert [parts for parts in read_commands(io.BytesIO(data)) if parts] == [
+        ["SET", "a", "1"], ["SET", "b", "1"], ["FIND", "1"], ["GET", "a"]
+    ]
+
+    script = tmp_path / "commands.txt"
+    script.write_bytes(data + b"\nCOUNTS 1\nBOGUS\nEND\nGET b\n")
+    monkeypatch.setattr(app, "OUTPUT_BATCH", 2)
+    app.main(["--script", str(script)])
+    lines = capsys.readouterr().out.splitlines()
+    assert set(lines[0].split()) == {"a", "b"}
+    assert lines[1:] == ["1", "2", "Ошибка в команде. Введите HELP для справки."]
+    with pytest.raises(SystemExit, match="Не удалось открыть"):
+        app.main(["--script", str(tmp_path / "missing.txt")])
+
+    # пустая строка в интерактивном режиме пропускается
+    inputs = iter(["", "SET a 1", "   ", "GET a"])
+
+    def fake_input(prompt):
+        for line in inputs:
+            return line
+        raise EOFError
+
+    monkeypatch.setattr("builtins.input", fake_input)
+    app.repl(RAMDatabase())
+    assert capsys.readouterr().out.splitlines()[1:] == ["1", "EOF. Работа завершена, бд очищена."]
+
+
+def test_import_csv_and_tsv_in_batches(tmp_path):
+    from aof import AppendOnlyLog, replay_log
+    from bulk import import_file, import_items
+
+    csv_path = tmp_path / "dump.csv"
+    csv_path.write_text('k1,v1\nk2,"v,2"\n\nk1,v3\n', encoding="utf-8")
+    tsv_path = tmp_path / "dump.tsv"
+    tsv_path.write_text("t1\tv1\nt2\tv1\n", encoding="utf-8")
+
+    db = RAMDatabase()
+    log = AppendOnlyLog(str(tmp_path / "log.aof"), "always")
+    db.add_listener(log)
+    db.set("k1", "old")
+    assert import_file(db, str(csv_path)) == 3
+    assert import_file(db, str(tsv_path)) == 2
+    assert import_items(db, ((f"n{i}", "x") for i in range(25)), batch=10) == 25
+    log.close()
+    expected = {"k1": "v3", "k2": "v,2", "t1": "v1", "t2": "v1"}
+    expected.update((f"n{i}", "x") for i in range(25))
+    assert db.read_database() == expected
+    replayed = RAMDatabase()
+    replay_log(str(tmp_path / "log.aof"), replayed)
+    assert replayed.read_database() == db.read_database()
+
+    bad = tmp_path / "bad.csv"
+    bad.write_text("a,b\nc\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="строка 2"):
+        import_file(db, str(bad))
+    # ключ или значение с пробелом нельзя потом прочитать командами
+    for row in ("a b,1", "a,1 2", "a,\t1"):
+        bad.write_text(f"k,v\n{row}\n", encoding="utf-8")
+        with pytest.raises(ValueError, match="строка 2: ключ и значение не должны содержать пробелов"):
+            import_file(db, str(bad))
+
+
+def test_server_watch_receives_only_committed_changes():
+    import asyncio
+
+    from server import Server, read_reply
+
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(Server(RAMDatabase()).serve("127.0.0.1", 0, ready))
+        host, port = await ready
+        r1, w1 = await asyncio.open_connection(host, port)
+        r2, w2 = await asyncio.open_connection(host, port)
+        w1.write(b"WATCH user:1\nWATCH-PREFIX order:*\nWATCH-VALUE vip\nWATCH\n")
+        watched = [await read_reply(r1) for _ in range(4)]
+
+        # откаченная транзакция не дает событий, зафиксированная - дает в порядке записи
+        w2.write(b"BEGIN\nSET user:1 x\nSET k vip\nROLLBACK\n")
+        w2.write(b"BEGIN\nSET user:1 a\nSET order:7 b\nSET k vip\nSET other 1\nCOMMIT\n")
+        w2.write(b"SET k plain\nUNSET order:7\n")
+        [await read_reply(r2) for _ in range(12)]
+        events = [await read_reply(r1) for _ in range(5)]
+
+        w1.write(b"UNWATCH\n")
+        await read_reply(r1)
+        w2.write(b"SET user:1 z\n")
+        await read_reply(r2)
+        w1.write(b"GET user:1\n")
+        after = await read_reply(r1)
+        w1.close()
+        w2.close()
+        task.cancel()
+        return watched, events, after
+
+    watched, events, after = asyncio.run(scenario())
+    assert watched == [None, None, None, "WATCH требует 1 аргумент."]
+    assert events == [
+        ["set", "user:1", "a"],
+        ["set", "order:7", "b"],
+        ["added", "k", "vip"],
+        # конвейер записей применяется одним слоем: сначала удаления, затем записи
+        ["unset", "order:7", None],
+        ["removed", "k", "vip"],
+    ]
+    assert after == "z"
+
+
+def test_change_feed_backpressure_and_overflow(handler):
+    import asyncio
+
+    from watch import ChangeFeed
+
+    async def scenario():
+        db = RAMDatabase()
+        feed = ChangeFeed(db, limit=2, overflow=4, timeout=0.05)
+        slow, fast = feed.subscribe(), feed.subscribe()
+        feed.watch_prefix(slow, "k")
+        feed.watch_key(fast, "k1")
+        for i in range(3):
+            db.set(f"k{i}", "v")
+        # медленный подписчик превысил limit: запись ждет, пока он разберет очередь
+        waiting = asyncio.create_task(feed.wait_drained())
+        await asyncio.sleep(0)
+        blocked = not waiting.done()
+        first = await slow.get(limit=2)
+        await asyncio.sleep(0.01)
+        released = waiting.done() and not slow.closed
+
+        for i in range(5):
+            db.set(f"k{i}", "w")
+        overflowed = await slow.get()
+        closed = await slow.get()
+        # подписчик, который не читает дольше timeout, отключается
+        feed.watch_key(fast, "k9")
+        for i in range(3):
+            db.set("k9", str(i))
+        await feed.wait_drained()
+        timed_out = [event for event in await fast.get() if event[0] == "overflow"]
+        feed.unsubscribe(fast)
+        db.set("k1", "after")
+        return blocked, first, released, overflowed, closed, timed_out, fast.events
+
+    blocked, first, released, overflowed, closed, timed_out, left = asyncio.run(scenario())
+    assert blocked and released
+    assert first == [("set", "k0", "v"), ("set", "k1", "v")]
+    assert overflowed == [("overflow", "", None)]
+    assert closed == []
+    assert timed_out == [("overflow", "", None)]
+    assert not left
+    assert run(handler, ["WATCH a", "UNWATCH"]) == ["Подписки на изменения доступны только в режиме сервера."]
+
+
+def test_server_readers_do_not_wait_for_lagging_subscribers():
+    import asyncio
+
+    from server import Server, read_reply
+    from watch import ChangeFeed
+
+    async def scenario():
+        db = RAMDatabase()
+        server = Server(db)
+        server.feed = ChangeFeed(db, limit=1, timeout=5.0)
+        lagging = server.feed.subscribe()
+        server.feed.watch_prefix(lagging, "k")
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(server.serve("127.0.0.1", 0, ready))
+        host, port = await ready
+        r1, w1 = await asyncio.open_connection(host, port)
+        r2, w2 = await asyncio.open_connection(host, port)
+        w1.write(b"SET k1 1\nSET k2 2\n")
+        [await read_reply(r1) for _ in range(2)]
+        # очередь подписчика переполнена, но чтения ничего в нее не добавляют и не ждут
+        replies = []
+        for line in (b"GET k1\n", b"GET k2\n"):
+            w2.write(line)
+            replies.append(await asyncio.wait_for(read_reply(r2), 1.0))
+        w1.close()
+        w2.close()
+        task.cancel()
+        return replies
+
+    assert asyncio.run(scenario()) == ["1", "2"]
+
+
+def test_entry_point_loads_optional_modules_lazily(handler):
+    import os
+    import subprocess
+    import sys
+
+    code = "import sys, app; print(' '.join(sorted(sys.modules)))"
+    root = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    loaded = set(output.split())
+    optional = {"asyncio", "typing", "random", "sortedlist", "snapshot", "aof", "metrics", "watch", "server", "bulk"}
+    assert not loaded & optional
+    # таблица команд ключена по верхнему регистру, другие написания приводятся к нему
+    assert run(handler, ["set a 1", "Get a", "gEt a", "NOPE a"]) == [
+        "1", "1", "Ошибка в команде. Введите HELP для справки."
+    ]
+    replica = CommandHandler(WrappedDatabase(RAMDatabase()), read_only=True)
+    assert replica.execute("set", ["a", "1"]) == "Реплика доступна только для чтения."
+    assert list(replica.execute_batch([["SET", "a", "1"], ["GET", "a"]], stream=True)) == [
+        "Реплика доступна только для чтения.", "NULL"
+    ]
+
+
+@pytest.mark.parametrize("engine", ["layers", "savepoint"])
+def test_server_transaction_reads_see_other_connections_changes(engine):
+    import asyncio
+
+    from savepoint import SavepointDatabase
+    from server import Server, read_reply
+
+    transactions = {"layers": WrappedDatabase, "savepoint": SavepointDatabase}[engine]
+
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        server = Server(RAMDatabase(), transactions=transactions)
+        task = asyncio.create_task(server.serve("127.0.0.1", 0, ready))
+        host, port = await ready
+        a = await asyncio.open_connection(host, port)
+        b = await asyncio.open_connection(host, port)
+
+        async def send(connection, lines):
+            reader, writer = connection
+            writer.write("".join(line + "\n" for line in lines).encode())
+            return [await read_reply(reader) for _ in lines]
+
+        # база меняется другим соединением под открытой транзакцией
+        await send(b, ["SET y 2", "SET z 1"])
+        await send(a, ["BEGIN", "SET x 1", "UNSET y", "SET z 7"])
+        await send(b, ["SET x 1", "UNSET y", "SET z 3", "SET w 3"])
+        replies = await send(a, ["COUNTS 1", "COUNTS 2", "COUNTS 3", "FIND 1", "FIND 3", "COUNTRANGE 1 10", "COMMIT"])
+        after = await send(a, ["COUNTS 1", "COUNTS 3", "COUNTS 7"])
+        for _, writer in (a, b):
+            writer.close()
+        task.cancel()
+        return replies, after
+
+    replies, after = asyncio.run(scenario())
+    assert replies == [1, 0, 1, "x", "w", 3, None]
+    assert after == [1, 1, 1]
@@ -1,86 +1,302 @@
-from interfaces import DataBaseAbstractClass
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from heapq import merge
+from itertools import chain, filterfalse
+
+from interfaces import (
+    DataBaseAbstractClass,
+    count_shadowed,
+    count_shadowed_range,
+    exclude,
+    in_number_range,
+    in_range,
+)
+from layer import TOMBSTONE, Layer
 
 
 class WrappedDatabase(DataBaseAbstractClass):
     def __init__(self, database: DataBaseAbstractClass):
         self.database = database
-        self.layers = []
+        self.layers: list[Layer] = []
+        # итоговое значение ключа с учетом всех открытых слоев
+        self.__view: dict[str, object] = {}
+        # счетчик изменений закрепленных ключей базы на момент BEGIN верхнего уровня
+        self.__pinned_changes: int | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self.layers)
 
     def set(self, k: str, v: str) -> None:
         if len(self.layers) == 0:
             self.database.set(k, v)
         else:
-            self.layers[-1][k] = v
+            self.__write(k, v)
 
         return None
 
     def get(self, k: str) -> str:
-        for item in self.layers[::-1]:
-            for key, v in item.items():
-                if key == k:
-                    return v
-        else:
+        v = self.__view.get(k)
+        if v is None:
             return self.database.get(k)
+        if v is TOMBSTONE:
+            return "NULL"
+        return v
+
+    def lookup(self, k: str) -> str | None:
+        v = self.__view.get(k)
+        if v is None:
+            return self.database.lookup(k)
+        if v is TOMBSTONE:
+            return None
+        return v
 
     def unset(self, k: str) -> None:
         if len(self.layers) >= 1:
-            self.layers[-1][k] = "NULL"
+            self.__write(k, TOMBSTONE)
             return None
         else:
             return self.database.unset(k)
 
-    def counts(self, v: str) -> int:
-        _ = 0
-        seen_names = set()
+    def apply(self, layer: Layer) -> None:
+        if len(self.layers) == 0:
+            return self.database.apply(layer)
+        for k in layer.deletes:
+            self.__write(k, TOMBSTONE)
+        for k, v in layer.writes.items():
+            self.__write(k, v)
+        for k, seconds in layer.expires.items():
+            self.expire(k, seconds)
+        return None
+
+    def expire(self, k: str, seconds: float | None) -> str | None:
+        if len(self.layers) == 0:
+            return self.database.expire(k, seconds)
+        if self.lookup(k) is None:
+            return None
+        # время жизни из транзакции начинает отсчитываться при фиксации
+        layer = self.layers[-1]
+        if k not in layer and k not in layer.expires:
+            self.database.pin(k)
+        layer.expire(k, seconds)
+        return None
+
+    def expire_at(self, k: str, deadline: float | None) -> str | None:
+        # абсолютные сроки приходят из снимка при LOAD, который внутри транзакции запрещен
         if len(self.layers) >= 1:
-            for item in self.layers[::-1]:
-                for key, val in item.items():
-                    if key not in seen_names and val == v:
-                        _ += 1
-                    seen_names.add(key)
-            for key, val in self.database.read_database().items():
-                if key not in seen_names and val == v:
-                    _ += 1
-                    seen_names.add(key)
+            return "Абсолютный срок жизни недоступен внутри транзакции."
+        return self.database.expire_at(k, deadline)
+
+    def supports_ttl(self) -> bool:
+        return self.database.supports_ttl()
+
+    def ttl(self, k: str) -> float | None:
+        for layer in reversed(self.layers):
+            if k in layer.expires:
+                return layer.expires[k]
+            if k in layer:
+                return None
+        return self.database.ttl(k)
+
+    def counts(self, v: str) -> int:
+        _ = self.database.counts(v)
+        if self.__base_unchanged():
+            for layer in self.layers:
+                _ += len(layer.added.get(v, ())) - len(layer.removed.get(v, ()))
             return _
-        else:
-            return self.database.counts(v)
+        view = self.__view
+        return _ - count_shadowed(self.database, v, view) + sum(w == v for w in view.values())
 
     def find(self, v: str) -> str:
-        str_ = ""
-        seen_names = set()
-        if len(self.layers) >= 1:
-            for item in self.layers[::-1]:
-                for key, val in item.items():
-                    if key not in seen_names and val == v:
-                        str_ += f"{key} "
-                    seen_names.add(key)
-            for key, val in self.database.read_database().items():
-                if key not in seen_names and val == v:
-                    str_ += f"{key} "
-                    seen_names.add(key)
-            print(seen_names)
-            return str_[:-1]
-        else:
+        if len(self.layers) == 0:
             return self.database.find(v)
+        # порядок как у базы, ключи, получившие значение в транзакции, - следом в порядке записи
+        return " ".join(self.__iter_find(v))
+
+    def find_keys(self, v: str) -> set[str]:
+        keys = self.database.find_keys(v)
+        if self.__base_unchanged():
+            for layer in self.layers:
+                keys.difference_update(layer.removed.get(v, ()))
+                keys.update(layer.added.get(v, ()))
+            return keys
+        view = self.__view
+        keys = exclude(keys, view)
+        keys.update(k for k, w in view.items() if w == v)
+        return keys
+
+    def iter_find(self, v: str) -> Iterator[str]:
+        if len(self.layers) == 0:
+            return self.database.iter_find(v)
+        return self.__iter_find(v)
+
+    def __iter_find(self, v: str) -> Iterator[str]:
+        view = self.__view
+        if not self.__base_unchanged():
+            return chain(
+                filterfalse(view.__contains__, self.database.iter_find(v)),
+                [k for k, w in view.items() if w == v],
+            )
+        keys = self.database.iter_find(v)
+        if len(self.layers) == 1:
+            # в одном слое added/removed - итог по ключу, как в SavepointDatabase
+            layer = self.layers[0]
+            removed = layer.removed.get(v)
+            added = list(layer.added.get(v, ()))
+            return chain(filterfalse(removed.__contains__, keys) if removed else keys, added)
+        # ключи, терявшие v в каком-либо слое, и ключи, получавшие его, в порядке записи
+        lost: set[str] = set()
+        added: dict[str, None] = {}
+        for layer in self.layers:
+            lost.update(layer.removed.get(v, ()))
+            added.update(layer.added.get(v, ()))
+        # потерявшие v ключи скрываются из базы и из ключей транзакции; в одном слое ключ не может
+        # и потерять, и получить значение, поэтому проверяются только ключи, вернувшие его позже
+        back = lost.intersection(added)
+        hidden, skipped = lost, set(lost) if back else lost
+        lookup = self.database.lookup
+        for k in back:
+            if view.get(k) == v:
+                hidden.discard(k)
+                # ключ базы остается на своем месте и не повторяется среди ключей транзакции
+                if lookup(k) != v:
+                    skipped.discard(k)
+        return chain(
+            filterfalse(hidden.__contains__, keys) if hidden else keys,
+            filterfalse(skipped.__contains__, list(added)) if skipped else list(added),
+        )
+
+    def count_range(self, lo: float, hi: float) -> int:
+        _ = self.database.count_range(lo, hi)
+        if self.__base_unchanged():
+            for layer in self.layers:
+                _ += sum(len(keys) for v, keys in layer.added.items() if in_number_range(v, lo, hi))
+                _ -= sum(len(keys) for v, keys in layer.removed.items() if in_number_range(v, lo, hi))
+            return _
+        view = self.__view
+        _ -= count_shadowed_range(self.database, lo, hi, view)
+        return _ + sum(1 for w in view.values() if w is not TOMBSTONE and in_number_range(w, lo, hi))
+
+    def find_range(self, lo: float, hi: float) -> set[str]:
+        keys = self.database.find_range(lo, hi)
+        if self.__base_unchanged():
+            for layer in self.layers:
+                for v, removed in layer.removed.items():
+                    if in_number_range(v, lo, hi):
+                        keys.difference_update(removed)
+                for v, added in layer.added.items():
+                    if in_number_range(v, lo, hi):
+                        keys.update(added)
+            return keys
+        view = self.__view
+        keys = exclude(keys, view)
+        keys.update(k for k, w in view.items() if w is not TOMBSTONE and in_number_range(w, lo, hi))
+        return keys
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        return self.database.items()
+
+    def stats(self) -> dict[str, object]:
+        stats = self.database.stats()
+        if self.__view:
+            # число ключей с учетом незакоммиченных слоев этого соединения
+            lookup = self.database.lookup
+            stats["keys"] += sum((v is not TOMBSTONE) - (lookup(k) is not None) for k, v in self.__view.items())
+        stats["transaction_depth"] = len(self.layers)
+        stats["layer_sizes"] = ",".join(str(len(layer)) for layer in self.layers)
+        return stats
+
+    def key_range(self, lo: str | None = None, hi: str | None = None) -> Iterator[str]:
+        keys = self.database.key_range(lo, hi)
+        if not self.__view:
+            return keys
+        # ключи базы и записанные в слоях ключи сливаются по порядку, удаленные в слоях пропускаются
+        view = self.__view
+        written = sorted(k for k, v in view.items() if v is not TOMBSTONE and in_range(k, lo, hi))
+        return self.__visible(merge(keys, written))
+
+    def __visible(self, keys: Iterator[str]) -> Iterator[str]:
+        view = self.__view
+        last = None
+        for k in keys:
+            if k != last and view.get(k) is not TOMBSTONE:
+                yield k
+            last = k
+
+    def expirations(self) -> Iterator[tuple[str, float]]:
+        return self.database.expirations()
+
+    def load(self, items: Iterable[tuple[str, str]]) -> str | None:
+        if len(self.layers) >= 1:
+            return "LOAD недоступен внутри транзакции."
+        return self.database.load(items)
 
     def begin(self) -> None:
-        self.layers.append({})
+        if len(self.layers) == 0:
+            self.database.begin()
+            self.__pinned_changes = self.database.pinned_changes()
+        self.layers.append(Layer())
         return None
 
     def rollback(self) -> None:
         if len(self.layers) == 1:
-            self.layers.clear()
+            layer = self.layers.pop()
+            self.__view = {}
+            self.database.rollback()
+            self.__unpin(layer.keys())
         elif len(self.layers) >= 2:
-            self.layers.pop()
+            layer = self.layers.pop()
+            self.__restore_view(layer)
+            self.__unpin(layer.keys())
         return None
 
-    def commit(self) -> None:
+    def commit(self) -> str | None:
         if len(self.layers) == 1:
-            self.database.commit(self.layers[0])
-            self.layers.clear()
+            layer = self.layers.pop()
+            self.__view = {}
+            try:
+                return self.database.commit(layer)
+            finally:
+                self.__unpin(layer.keys())
         elif len(self.layers) >= 2:
-            self.layers[-2].update(self.layers[-1])
-            self.layers.pop()
+            top = self.layers.pop()
+            parent = self.layers[-1]
+            # ключи, уже закрепленные родительским слоем, освобождаются от второго закрепления
+            held = parent.keys() & top.keys()
+            for k, v in top.items():
+                parent.put(k, v, top.before[k])
+            parent.expires.update(top.expires)
+            self.__unpin(held)
         else:
             return None
+
+    def __base_unchanged(self) -> bool:
+        # поправки added/removed слоев посчитаны от значений базы на момент записи; они точны, пока
+        # другие соединения не меняли ключи слоев, иначе ключи слоев сверяются с текущей базой
+        if not self.__view:
+            return True
+        changes = self.__pinned_changes
+        return changes is not None and self.database.pinned_changes() == changes
+
+    def __unpin(self, keys: Iterable[str]) -> None:
+        for k in keys:
+            self.database.unpin(k)
+        return None
+
+    def __restore_view(self, layer: Layer) -> None:
+        for k, _ in layer.items():
+            for item in reversed(self.layers):
+                v = item.get(k)
+                if v is not None:
+                    self.__view[k] = v
+                    break
+            else:
+                del self.__view[k]
+
+    def __write(self, k: str, v) -> None:
+        layer = self.layers[-1]
+        if k not in layer and k not in layer.expires:
+            self.database.pin(k)
+        layer.put(k, v, None if k in layer else self.lookup(k))
+        self.__view[k] = v
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+
+from database import RAMDatabase
+from interfaces import ChangeListener, DataBaseAbstractClass
+
+# сколько событий может ждать подписчика, прежде чем пишущие соединения остановятся
+QUEUE_LIMIT = 10_000
+# подписчик, отставший сильнее, отключается, чтобы не держать память без предела
+OVERFLOW_LIMIT = 100_000
+# сколько секунд пишущие соединения ждут отставшего подписчика, прежде чем отключить его
+DRAIN_TIMEOUT = 5.0
+
+# событие: (операция, ключ, значение или None)
+Event = tuple[str, str, str | None]
+
+
+class Subscription:
+    def __init__(self, feed: ChangeFeed):
+        self.feed = feed
+        self.events: deque[Event] = deque()
+        self.keys: set[str] = set()
+        self.values: set[str] = set()
+        self.prefixes: set[str] = set()
+        self.closed = False
+        self.__ready = asyncio.Event()
+
+    def push(self, event: Event) -> None:
+        self.events.append(event)
+        self.__ready.set()
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+        self.__ready.set()
+        return None
+
+    async def get(self, limit: int = 1000) -> list[Event]:
+        # до limit событий по порядку; пустой список - подписка закрыта
+        while not self.events and not self.closed:
+            self.__ready.clear()
+            await self.__ready.wait()
+        count = min(len(self.events), limit)
+        events = [self.events.popleft() for _ in range(count)]
+        self.feed.drained(self)
+        return events
+
+
+class ChangeFeed(ChangeListener):
+    # слушатель базы: получает только изменения, дошедшие до RAMDatabase, то есть зафиксированные;
+    # записи откаченных транзакций до базы не доходят и в подписки не попадают
+    def __init__(
+        self,
+        database: RAMDatabase,
+        limit: int = QUEUE_LIMIT,
+        overflow: int = OVERFLOW_LIMIT,
+        timeout: float = DRAIN_TIMEOUT,
+    ):
+        self.database = database
+        self.limit = limit
+        self.overflow = overflow
+        self.timeout = timeout
+        self.subscriptions: set[Subscription] = set()
+        # сколько событий разослано подписчикам; соединение, пачка которого их не добавила, не ждет очередей
+        self.published = 0
+        self.__keys: dict[str, set[Subscription]] = {}
+        self.__values: dict[str, set[Subscription]] = {}
+        # префиксы сгруппированы по длине: ключ проверяется одним срезом на каждую длину
+        self.__prefixes: dict[int, dict[str, set[Subscription]]] = {}
+        # ключ -> отслеживаемое значение, которое у него сейчас (для событий потери значения)
+        self.__holders: dict[str, str] = {}
+        self.__lagging: set[Subscription] = set()
+        self.__drained = asyncio.Event()
+        self.__drained.set()
+        self.__attached = False
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def watch_key(self, subscription: Subscription, k: str) -> None:
+        subscription.keys.add(k)
+        self.__keys.setdefault(k, set()).add(subscription)
+        return self.__attach()
+
+    def watch_prefix(self, subscription: Subscription, prefix: str) -> None:
+        subscription.prefixes.add(prefix)
+        self.__prefixes.setdefault(len(prefix), {}).setdefault(prefix, set()).add(subscription)
+        return self.__attach()
+
+    def watch_value(self, subscription: Subscription, v: str) -> None:
+        subscription.values.add(v)
+        watchers = self.__values.setdefault(v, set())
+        if not watchers:
+            for k in self.database.iter_find(v):
+                self.__holders[k] = v
+        watchers.add(subscription)
+        return self.__attach()
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.__drop(subscription)
+        if not self.subscriptions and self.__attached:
+            # без подписчиков лента не замедляет запись в базу
+            self.database.remove_listener(self)
+            self.__attached = False
+        return None
+
+    def __drop(self, subscription: Subscription) -> None:
+        if subscription not in self.subscriptions:
+            return None
+        self.subscriptions.discard(subscription)
+        for k in subscription.keys:
+            self.__forget(self.__keys, k, subscription)
+        for prefix in subscription.prefixes:
+            by_length = self.__prefixes[len(prefix)]
+            self.__forget(by_length, prefix, subscription)
+            if not by_length:
+                del self.__prefixes[len(prefix)]
+        for v in subscription.values:
+            if self.__forget(self.__values, v, subscription):
+                self.__holders = {k: held for k, held in self.__holders.items() if held != v}
+        subscription.close()
+        self.drained(subscription)
+        return None
+
+    async def wait_drained(self) -> None:
+        # обратное давление: пишущие соединения ждут, пока подписчики разберут очереди;
+        # подписчик, который не читает дольше timeout, отключается и больше не держит запись
+        if self.__drained.is_set():
+            return None
+        try:
+            await asyncio.wait_for(self.__drained.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            for subscription in list(self.__lagging):
+                self.__overflow(subscription)
+        return None
+
+    def drained(self, subscription: Subscription) -> None:
+        if subscription in self.__lagging and (subscription.closed or len(subscription.events) <= self.limit):
+            self.__lagging.discard(subscription)
+            if not self.__lagging:
+                self.__drained.set()
+        return None
+
+    def on_set(self, k: str, v: str) -> None:
+        held = self.__holders.get(k)
+        if held is not None and held != v:
+            del self.__holders[k]
+            self.__publish(self.__values.get(held), ("removed", k, held))
+        watchers = self.__values.get(v)
+        if watchers and held != v:
+            self.__holders[k] = v
+            self.__publish(watchers, ("added", k, v))
+        self.__publish_key(("set", k, v))
+        return None
+
+    def on_unset(self, k: str) -> None:
+        held = self.__holders.pop(k, None)
+        if held is not None:
+            self.__publish(self.__values.get(held), ("removed", k, held))
+        self.__publish_key(("unset", k, None))
+        return None
+
+    def on_expire(self, k: str, deadline: float | None) -> None:
+        self.__publish_key(("expire", k, None if deadline is None else repr(deadline)))
+        return None
+
+    def on_load(self, database: DataBaseAbstractClass) -> None:
+        # содержимое базы заменено целиком: подписчики перечитывают нужные им данные сами
+        self.__holders = {k: v for v in self.__values for k in self.database.iter_find(v)}
+        self.__publish(self.subscriptions, ("load", "", None))
+        return None
+
+    def __publish_key(self, event: Event) -> None:
+        k = event[1]
+        self.__publish(self.__keys.get(k), event)
+        for length, prefixes in list(self.__prefixes.items()):
+            self.__publish(prefixes.get(k[:length]), event)
+        return None
+
+    def __publish(self, subscriptions: set[Subscription] | None, event: Event) -> None:
+        if not subscriptions:
+            return None
+        self.published += 1
+        for subscription in list(subscriptions):
+            subscription.push(event)
+            size = len(subscription.events)
+            if size > self.overflow:
+                self.__overflow(subscription)
+            elif size > self.limit:
+                self.__lagging.add(subscription)
+                self.__drained.clear()
+        return None
+
+    def __overflow(self, subscription: Subscription) -> None:
+        # отставший подписчик получает последнее событие о переполнении и отключается;
+        # слушатель базы не снимается здесь: база может обходить список слушателей
+        subscription.events.clear()
+        subscription.push(("overflow", "", None))
+        self.__drop(subscription)
+        return None
+
+    def __attach(self) -> None:
+        if not self.__attached:
+            self.database.add_listener(self)
+            self.__attached = True
+        return None
+
+    @staticmethod
+    def __forget(index: dict[str, set[Subscription]], name: str, subscription: Subscription) -> bool:
+        # True, если у имени не осталось подписчиков
+        subscriptions = index.get(name)
+        if subscriptions is None:
+            return False
+        subscriptions.discard(subscription)
+        if subscriptions:
+            return False
+        del index[name]
+        return True